@@ -0,0 +1,316 @@
+import json
+import time
+import random
+import socket
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+# 可以重试的 HTTP 状态码：限流和服务端错误
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# 连接层面的错误，发生在收到响应之前时可以安全重试
+_CONNECTION_ERRORS = (ConnectionError, socket.timeout, http.client.HTTPException, OSError)
+
+
+class APIError(Exception):
+    """接口返回错误或多次重试后仍然失败"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class CancelEvent(threading.Event):
+    """取消请求用的事件：设置时立即中断登记过的连接，不必等到下一次读取返回
+
+    作为 cancel_event 传给 APIClient 的请求方法时，等待响应头或数据块的请求随即以 APIError 结束。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def add_callback(self, callback):
+        """登记设置事件时调用的回调，事件已经设置时直接调用"""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._callbacks_lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def set(self):
+        with self._callbacks_lock:
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+def _watch_cancel(cancel_event, conn):
+    """cancel_event 为 CancelEvent 时登记取消时中断连接的回调并返回，否则返回 None"""
+    if not isinstance(cancel_event, CancelEvent):
+        return None
+
+    # 响应要求关闭连接时 getresponse() 会把 conn.sock 置为 None，套接字交给响应继续读取，所以先取出来
+    sock = conn.sock
+
+    def abort():
+        # 关闭套接字不会唤醒正在读取的线程，shutdown 会，服务端也随即看到连接断开
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    cancel_event.add_callback(abort)
+    return abort
+
+
+def _unwatch_cancel(cancel_event, abort):
+    if abort is not None:
+        cancel_event.remove_callback(abort)
+
+
+def _estimate_tokens(payload):
+    """请求消耗的 token 数上限：提示的估计长度加上 max_tokens"""
+    from token_budget import approx_tokens
+
+    prompt = "".join(str(message.get("content") or "") for message in payload.get("messages", ()))
+    return approx_tokens(prompt) + (payload.get("max_tokens") or 0)
+
+
+def _cancelled(cancel_event):
+    return cancel_event is not None and cancel_event.is_set()
+
+
+class _ConnectionPool:
+    """同一主机的 keep-alive 连接池，线程安全"""
+
+    def __init__(self, scheme, host, port, connect_timeout, read_timeout, max_idle):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self):
+        """取出一个空闲连接，没有时新建；返回 (连接, 是否复用)"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        if self.scheme == "https":
+            conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.connect_timeout)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        # 连接建立后改用读取超时
+        conn.sock.settimeout(self.read_timeout)
+        return conn, False
+
+    def release(self, conn, reusable=True):
+        """归还连接，响应未读完或服务端要求关闭的连接直接关闭"""
+        with self._lock:
+            if reusable and not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class APIClient:
+    """OpenAI 兼容接口的客户端
+
+    每个实例持有自己的 api_key、base_url 和 keep-alive 连接池，不修改任何全局状态，
+    可以在多个线程中同时使用。请求有连接超时和读取超时；遇到限流（429）、服务端错误（5xx）
+    或连接错误时按指数退避重试，服务端返回 Retry-After 时按其等待。
+    提供 rate_limiter（job_queue.RateLimiter）时每次发出请求（包括重试）前都先取得配额，
+    token 数按提示长度加 max_tokens 估计。
+    """
+
+    def __init__(self, api_key, base_url, timeout=60, connect_timeout=10, max_retries=3,
+                 backoff_base=1.0, backoff_max=30.0, pool_size=8, rate_limiter=None):
+        parts = urlsplit(base_url.rstrip("/"))
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"无效的 Base URL: {base_url}")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.path_prefix = parts.path
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self._pool = _ConnectionPool(parts.scheme, parts.hostname, parts.port, connect_timeout, timeout, pool_size)
+
+    def close(self):
+        """关闭空闲连接"""
+        self._pool.close()
+
+    def _headers(self, stream):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream" if stream else "application/json",
+        }
+
+    def _retry_delay(self, attempt, retry_after=None):
+        """第 attempt 次重试前等待的秒数"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # 加入随机抖动，避免并发请求同时重试
+        return delay * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    def _error_message(status, body):
+        try:
+            error = json.loads(body.decode("utf-8")).get("error")
+            message = error.get("message") if isinstance(error, dict) else error
+        except (ValueError, AttributeError):
+            message = None
+        return f"接口请求失败 (HTTP {status}): {message or body[:200].decode('utf-8', 'replace')}"
+
+    def _send(self, path, payload, stream, cancel_event=None):
+        """发送请求并返回 (连接, 响应, 取消回调)，状态码为 200 时才返回，必要时重试
+
+        取消回调由调用方在读完响应后用 _unwatch_cancel 解除登记。
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        tokens = _estimate_tokens(payload) if self.rate_limiter is not None else 0
+        attempt = 0
+        while True:
+            if _cancelled(cancel_event):
+                raise APIError("请求已取消")
+            if self.rate_limiter is not None and not self.rate_limiter.acquire(tokens, cancel_event):
+                raise APIError("请求已取消")
+            conn = None
+            abort = None
+            retry_after = None
+            try:
+                conn, reused = self._pool.acquire()
+                abort = _watch_cancel(cancel_event, conn)
+                conn.request("POST", self.path_prefix + path, body=body, headers=self._headers(stream))
+                response = conn.getresponse()
+            except _CONNECTION_ERRORS as e:
+                _unwatch_cancel(cancel_event, abort)
+                if conn is not None:
+                    conn.close()
+                if _cancelled(cancel_event):
+                    raise APIError("请求已取消")
+                if conn is not None and reused:
+                    # 复用的连接可能已被服务端关闭，换一个连接立即重试，不计入重试次数
+                    continue
+                if attempt >= self.max_retries:
+                    raise APIError(f"连接接口失败: {str(e)}")
+                error = e
+            else:
+                if response.status == 200:
+                    return conn, response, abort
+                _unwatch_cancel(cancel_event, abort)
+                try:
+                    data = response.read()
+                except _CONNECTION_ERRORS as e:
+                    conn.close()
+                    if _cancelled(cancel_event):
+                        raise APIError("请求已取消")
+                    raise APIError(f"读取响应失败: {str(e)}")
+                self._pool.release(conn, not response.will_close and not _cancelled(cancel_event))
+                if response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    raise APIError(self._error_message(response.status, data), response.status)
+                retry_after = response.getheader("Retry-After")
+                error = self._error_message(response.status, data)
+
+            delay = self._retry_delay(attempt, retry_after)
+            print(f"请求失败，{delay:.1f} 秒后重试: {str(error)}")
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    raise APIError("请求已取消")
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+    def chat_completion(self, messages, model, max_tokens, cancel_event=None, **params):
+        """非流式请求，返回解析后的响应"""
+        payload = dict(params, model=model, messages=messages, max_tokens=max_tokens)
+        conn, response, abort = self._send("/chat/completions", payload, False, cancel_event)
+        try:
+            data = response.read()
+        except _CONNECTION_ERRORS as e:
+            conn.close()
+            raise APIError(f"读取响应失败: {str(e)}")
+        finally:
+            _unwatch_cancel(cancel_event, abort)
+        # 取消时连接已被中断，不能再复用
+        self._pool.release(conn, not response.will_close and not _cancelled(cancel_event))
+        try:
+            return json.loads(data.decode("utf-8"))
+        except ValueError:
+            raise APIError("接口返回的不是有效的 JSON")
+
+    def stream_chat_completion(self, messages, model, max_tokens, cancel_event=None, **params):
+        """流式请求，逐个返回 SSE 数据块（已解析的字典）
+
+        只在收到响应之前重试；生成器提前关闭时连接被丢弃，服务端随即停止生成。
+        cancel_event 为 CancelEvent 时，设置后正在等待的读取立即中断并抛出 APIError。
+        """
+        payload = dict(params, model=model, messages=messages, max_tokens=max_tokens, stream=True)
+        conn, response, abort = self._send("/chat/completions", payload, True, cancel_event)
+        finished = False
+        try:
+            data_lines = []
+            while True:
+                line = response.readline()
+                if not line:
+                    if _cancelled(cancel_event):
+                        raise APIError("请求已取消")
+                    break
+                line = line.rstrip(b"\r\n")
+                if line:
+                    if line.startswith(b"data:"):
+                        data_lines.append(line[5:].strip())
+                    continue
+                # 空行表示一个事件结束
+                if not data_lines:
+                    continue
+                data = b"\n".join(data_lines)
+                data_lines = []
+                if data == b"[DONE]":
+                    finished = True
+                    break
+                try:
+                    yield json.loads(data.decode("utf-8"))
+                except ValueError:
+                    raise APIError("接口返回的数据块无法解析")
+        except _CONNECTION_ERRORS as e:
+            if _cancelled(cancel_event):
+                raise APIError("请求已取消")
+            raise APIError(f"读取流式响应失败: {str(e)}")
+        finally:
+            _unwatch_cancel(cancel_event, abort)
+            if finished and not _cancelled(cancel_event):
+                # 读完剩余内容后连接才能复用
+                try:
+                    response.read()
+                    self._pool.release(conn, not response.will_close)
+                except _CONNECTION_ERRORS:
+                    conn.close()
+            else:
+                conn.close()
@@ -0,0 +1,218 @@
+"""批量运行工具：对目录中的每个文件或 JSONL 中的每条输入各运行一次工具
+
+每次运行都是独立的子进程（或预热池中 fork 出的进程），最多同时运行 workers 个；
+输入通过标准输入传给工具，工具结尾的阻塞语句自动失效（见 tool_runner.disable_pauses）。
+每条输入的标准输出、标准错误和退出码按完成顺序追加到结果文件（JSON Lines）。
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from process_manager import TOOL_RUNNER, RUN_EXITED, RUN_TIMEOUT
+from tool_runner import BATCH_ENV_VAR
+
+# 每条输入保存的输出上限（字节），超出部分截断
+OUTPUT_LIMIT = 1024 * 1024
+
+# 目录输入：把文件路径（path）或文件内容（content）作为工具的标准输入
+STDIN_PATH = "path"
+STDIN_CONTENT = "content"
+
+# 运行状态：除 process_manager 中的已退出和超时外，还有无法启动
+RUN_ERROR = "error"
+
+
+def inputs_from_directory(directory, stdin_mode=STDIN_PATH, recursive=False):
+    """目录中的每个文件（忽略隐藏文件）对应一条输入，按路径排序"""
+    directory = os.path.abspath(directory)
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".")) if recursive else []
+        paths.extend(os.path.join(root, name) for name in files if not name.startswith("."))
+    inputs = []
+    for path in sorted(paths):
+        item = {"id": os.path.relpath(path, directory)}
+        if stdin_mode == STDIN_CONTENT:
+            item["file"] = path
+        else:
+            item["stdin"] = path + "\n"
+        inputs.append(item)
+    return inputs
+
+
+def inputs_from_jsonl(path):
+    """JSONL 中的每一行对应一条输入
+
+    一行可以是字符串（作为标准输入），或者 {"id", "stdin", "file", "args"} 形式的对象：
+    stdin 为标准输入文本，file 为作为标准输入的文件，args 为命令行参数；id 默认为行号。
+    """
+    inputs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path} 第 {line_number} 行不是有效的 JSON: {str(e)}")
+            if isinstance(entry, str):
+                entry = {"stdin": entry}
+            if not isinstance(entry, dict):
+                raise ValueError(f"{path} 第 {line_number} 行应为字符串或对象")
+            item = {"id": str(entry.get("id", line_number))}
+            for key in ("stdin", "file", "args"):
+                if entry.get(key) is not None:
+                    item[key] = entry[key]
+            inputs.append(item)
+    return inputs
+
+
+def load_inputs(source, stdin_mode=STDIN_PATH, recursive=False):
+    """source 为目录或 JSONL 文件"""
+    if os.path.isdir(source):
+        return inputs_from_directory(source, stdin_mode, recursive)
+    return inputs_from_jsonl(source)
+
+
+def _stdin_bytes(item):
+    if "file" in item:
+        with open(item["file"], "rb") as f:
+            return f.read()
+    text = item.get("stdin", "")
+    if text and not text.endswith("\n"):
+        text += "\n"
+    return text.encode("utf-8")
+
+
+def _read_output(f):
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    text = f.read(OUTPUT_LIMIT).decode("utf-8", errors="replace")
+    if size > OUTPUT_LIMIT:
+        text += f"\n...（输出过长，已截断 {size - OUTPUT_LIMIT} 字节）"
+    return text
+
+
+def summarize(results, elapsed):
+    """汇总批量运行的结果：成功、失败、超时的数量，吞吐量以及单次耗时的分布"""
+    durations = sorted(result["duration"] for result in results)
+    succeeded = sum(1 for result in results if result["status"] == RUN_EXITED and result["returncode"] == 0)
+    timed_out = sum(1 for result in results if result["status"] == RUN_TIMEOUT)
+    summary = {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded - timed_out,
+        "timed_out": timed_out,
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    if durations:
+        summary.update({
+            "mean": round(statistics.mean(durations), 3),
+            "p50": durations[len(durations) // 2],
+            "p95": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "max": durations[-1],
+        })
+    return summary
+
+
+class BatchRunner:
+    """对多条输入各运行一次工具，最多同时运行 workers 个进程
+
+    env 为额外传给工具的环境变量；提供 warm_pool（warm_pool.WarmPool）时从预热解释器池启动，
+    失败时退回普通子进程。输出先写入临时文件，避免大量输出时管道阻塞。
+    """
+
+    def __init__(self, tool_path, workers=None, timeout=None, env=None, warm_pool=None, cwd=None):
+        self.tool_path = os.path.abspath(tool_path)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.timeout = timeout or None
+        self.env = dict(os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8", **(env or {}))
+        self.env[BATCH_ENV_VAR] = "1"
+        self.warm_pool = warm_pool
+        self.cwd = cwd
+        self._lock = threading.Lock()
+
+    def _start(self, args, stdin, stdout, stderr):
+        if self.warm_pool is not None:
+            try:
+                return self.warm_pool.spawn(self.tool_path, args, cwd=self.cwd, env=self.env,
+                                            stdin=stdin.fileno(), stdout=stdout.fileno(), stderr=stderr.fileno())
+            except (OSError, RuntimeError) as e:
+                print(f"预热池启动工具失败，改用普通方式: {str(e)}")
+        kwargs = {}
+        if sys.platform == "win32":
+            kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+        return subprocess.Popen([sys.executable, "-u", TOOL_RUNNER, self.tool_path, *args],
+                                stdin=stdin, stdout=stdout, stderr=stderr, cwd=self.cwd, env=self.env, **kwargs)
+
+    def run_one(self, item):
+        """运行一条输入，返回结果记录 {"id", "status", "returncode", "duration", "stdout", "stderr"}"""
+        result = {"id": item["id"], "status": RUN_EXITED, "returncode": None, "duration": 0.0,
+                  "stdout": "", "stderr": ""}
+        started = time.perf_counter()
+        try:
+            with tempfile.TemporaryFile() as stdin, tempfile.TemporaryFile() as stdout, \
+                    tempfile.TemporaryFile() as stderr:
+                stdin.write(_stdin_bytes(item))
+                stdin.seek(0)
+                process = self._start([str(arg) for arg in item.get("args", ())], stdin, stdout, stderr)
+                try:
+                    result["returncode"] = process.wait(timeout=self.timeout)
+                except subprocess.TimeoutExpired:
+                    result["status"] = RUN_TIMEOUT
+                    process.kill()
+                    result["returncode"] = process.wait()
+                result["stdout"] = _read_output(stdout)
+                result["stderr"] = _read_output(stderr)
+        except (OSError, RuntimeError) as e:
+            result["status"] = RUN_ERROR
+            result["stderr"] = str(e)
+        result["duration"] = round(time.perf_counter() - started, 3)
+        return result
+
+    def run(self, inputs, results_file=None, on_result=None, cancel_event=None):
+        """运行全部输入，返回 (结果列表, 汇总)
+
+        每条结果完成时追加到 results_file 并调用 on_result(result)（在工作线程中调用）；
+        cancel_event 被设置（或按 Ctrl+C 中断）后不再启动新的运行，已在运行的照常完成。
+        """
+        results = []
+        stop = threading.Event()
+        output = open(results_file, "w", encoding="utf-8") if results_file else None
+
+        def run_item(item):
+            if stop.is_set() or (cancel_event is not None and cancel_event.is_set()):
+                return
+            result = self.run_one(item)
+            with self._lock:
+                results.append(result)
+                if output is not None:
+                    output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    output.flush()
+            if on_result:
+                try:
+                    on_result(result)
+                except Exception as e:
+                    print(f"处理运行结果失败: {str(e)}")
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch-run") as executor:
+                try:
+                    for future in [executor.submit(run_item, item) for item in inputs]:
+                        future.result()
+                except BaseException:
+                    stop.set()
+                    raise
+        finally:
+            if output is not None:
+                output.close()
+        return results, summarize(results, time.perf_counter() - started)
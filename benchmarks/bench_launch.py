@@ -0,0 +1,107 @@
+"""比较工具的冷启动与预热解释器池启动的延迟
+
+示例：
+    python benchmarks/bench_launch.py
+    python benchmarks/bench_launch.py -n 50 --output launch.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from warm_pool import WarmPool, is_supported
+
+# 与生成的工具类似：导入几个常用模块，输出一行后退出
+SAMPLE_TOOL = '''import os
+import re
+import json
+import shutil
+import datetime
+
+
+def main():
+    print(json.dumps({"cwd": os.getcwd(), "now": datetime.datetime.now().isoformat()}))
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+
+def summarize(samples):
+    """返回以毫秒为单位的统计结果"""
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "min_ms": round(ordered[0] * 1000, 2),
+    }
+
+
+def bench_cold(tool_path, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-u", tool_path], stdout=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_warm(tool_path, runs):
+    pool = WarmPool()
+    pool.start()
+    try:
+        samples = []
+        with open(os.devnull, "wb") as devnull:
+            for _ in range(runs):
+                start = time.perf_counter()
+                process = pool.spawn(tool_path, stdout=devnull.fileno())
+                if process.wait() != 0:
+                    raise RuntimeError(f"工具退出码为 {process.returncode}")
+                samples.append(time.perf_counter() - start)
+        return samples
+    finally:
+        pool.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较冷启动与预热池启动工具的延迟")
+    parser.add_argument("-n", "--runs", type=int, default=20, help="每种方式运行的次数")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    if not is_supported():
+        print("当前系统不支持预热解释器池", file=sys.stderr)
+        return 1
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tool_path = os.path.join(tmpdir, "sample_tool.py")
+        with open(tool_path, "w", encoding="utf-8") as f:
+            f.write(SAMPLE_TOOL)
+        results = {
+            "python": sys.version.split()[0],
+            "cold": summarize(bench_cold(tool_path, args.runs)),
+            "warm": summarize(bench_warm(tool_path, args.runs)),
+        }
+    results["speedup"] = round(results["cold"]["p50_ms"] / max(results["warm"]["p50_ms"], 0.001), 1)
+
+    for mode in ("cold", "warm"):
+        stats = results[mode]
+        print(f"{mode}\tp50 {stats['p50_ms']} ms\tp95 {stats['p95_ms']} ms\tmean {stats['mean_ms']} ms")
+    print(f"speedup\t{results['speedup']}x")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""元数据提取的基准测试：比较旧的整文件 find+eval+正则 方式与头部读取的新方式
+
+示例：
+    python benchmarks/bench_metadata.py
+    python benchmarks/bench_metadata.py -n 5000 --lines 600 --output metadata.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import ToolCatalog, read_tool_metadata
+from synthetic import make_tools
+
+
+def legacy_parse(tool_path):
+    """改进前的提取逻辑（整文件读取 + eval + 三次正则扫描），仅作对照"""
+    with open(tool_path, "r", encoding="utf-8") as f:
+        content = f.read()
+        metadata_start = content.find('#  metadata = {')
+        if metadata_start != -1:
+            metadata_end = content.find('}', metadata_start)
+            if metadata_end != -1:
+                try:
+                    metadata = eval(content[metadata_start:metadata_end + 1].replace('=  ', ': ', 1))
+                    if isinstance(metadata, dict):
+                        return metadata
+                except Exception:
+                    pass
+        metadata = {}
+        for field in ("name", "description", "created"):
+            match = re.search(r'"%s":\s*"([^"]+)"' % field, content)
+            if match:
+                metadata[field] = match.group(1)
+        return metadata
+
+
+def time_parser(parse, paths):
+    start = time.perf_counter()
+    for path in paths:
+        parse(path)
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 4), "files_per_second": round(len(paths) / elapsed, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="元数据提取基准测试")
+    parser.add_argument("-n", "--files", type=int, default=2000, help="工具文件数量")
+    parser.add_argument("--lines", type=int, default=600, help="每个工具的代码行数")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="toolbox-bench-")
+    try:
+        paths = make_tools(directory, args.files, args.lines)
+
+        # 先各读一遍，让两种方式都在页缓存命中的条件下比较
+        for path in paths:
+            read_tool_metadata(path)
+        results = {
+            "files": args.files,
+            "lines": args.lines,
+            "legacy": time_parser(legacy_parse, paths),
+            "header": time_parser(read_tool_metadata, paths),
+        }
+
+        start = time.perf_counter()
+        ToolCatalog(directory).scan()
+        results["catalog_cold_scan_seconds"] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        ToolCatalog(directory).scan()
+        results["catalog_warm_scan_seconds"] = round(time.perf_counter() - start, 4)
+    finally:
+        shutil.rmtree(directory)
+
+    results["speedup"] = round(results["legacy"]["seconds"] / max(results["header"]["seconds"], 1e-9), 1)
+    for key in ("legacy", "header"):
+        print(f"{key}\t{results[key]['seconds']} s\t{results[key]['files_per_second']} files/s")
+    print(f"speedup\t{results['speedup']}x")
+    print(f"catalog scan\tcold {results['catalog_cold_scan_seconds']} s\twarm {results['catalog_warm_scan_seconds']} s")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
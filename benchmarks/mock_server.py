@@ -0,0 +1,203 @@
+"""本地的 OpenAI 兼容模拟服务，用于在没有网络和 API Key 的情况下测量生成链路
+
+支持 POST {base}/chat/completions 的普通和流式（SSE）请求，可以配置首字节延迟、
+数据块间隔和数据块大小，也可以让前若干个请求返回 429 以测试重试。
+示例：
+    python benchmarks/mock_server.py --port 8765 --latency 0.5 --chunk-delay 0.01
+    （然后把 Base URL 配置为 http://127.0.0.1:8765/v1）
+"""
+import sys
+import json
+import socket
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_RESPONSE = '''```python
+# metadata = {"name": "示例工具", "description": "模拟服务生成的示例工具", "created": "2024-01-01 00:00:00"}
+import os
+
+
+def main():
+    """示例工具
+    打印当前目录下的文件"""
+    for name in sorted(os.listdir(".")):
+        print(name)
+
+
+if __name__ == "__main__":
+    main()
+```'''
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # 响应头和正文分两次写出，关闭 Nagle 算法以免被延迟确认拖慢约 40 毫秒
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        server = self.server.mock
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json"}})
+            return
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        if server.take_failure():
+            self._send_json(429, {"error": {"message": "rate limited"}}, {"Retry-After": str(server.retry_after)})
+            return
+
+        time.sleep(server.latency)
+        text = server.response_text
+        prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", [])) // 4
+        completion_tokens = len(text) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        model = request.get("model", "mock")
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": "mock",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i in range(0, len(text), server.chunk_size):
+                chunk = {
+                    "id": "mock",
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": text[i:i + server.chunk_size]}, "finish_reason": None}],
+                }
+                self._write_chunk(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                if server.chunk_delay:
+                    time.sleep(server.chunk_delay)
+            final = {
+                "id": "mock",
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            self._write_chunk(b"data: " + json.dumps(final).encode("utf-8") + b"\n\n")
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消了生成
+            self.close_connection = True
+
+
+class MockLLMServer:
+    """在后台线程中运行的模拟服务"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, chunk_delay=0.0, chunk_size=16,
+                 response_text=DEFAULT_RESPONSE, fail_first=0, retry_after=0.1):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.response_text = response_text
+        self.retry_after = retry_after
+        self.requests = 0
+        self._failures = fail_first
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def take_failure(self):
+        """统计请求数，前 fail_first 个请求返回 True（应答 429）"""
+        with self._lock:
+            self.requests += 1
+            if self._failures > 0:
+                self._failures -= 1
+                return True
+            return False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """在当前线程中运行，直到被中断"""
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="返回第一个字节前的延迟（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="流式数据块之间的间隔（秒）")
+    parser.add_argument("--chunk-size", type=int, default=16, help="每个流式数据块的字符数")
+    parser.add_argument("--fail-first", type=int, default=0, help="前 N 个请求返回 429")
+    args = parser.parse_args(argv)
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.chunk_delay, args.chunk_size,
+                           fail_first=args.fail_first)
+    print(f"模拟服务已启动: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""运行全部基准测试，把结果写成 JSON，便于在版本之间比较
+
+测试项：
+    generation  通过本地模拟服务走完整的生成链路（请求、去除代码块标记、缓存、保存），
+                与图形界面 _generate_tool_in_thread 调用的 ToolBoxCore.generate_tool 相同
+    catalog     不同规模的工具目录上 load_tools 的冷/热扫描、增量更新和列表渲染
+    search      搜索索引的建立、从磁盘加载、增量更新和查询延迟
+    metadata    元数据提取（旧方式对照）
+    launch      工具启动延迟（冷启动与预热池）
+示例：
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 100,1000,10000,50000 --output v2.json
+    python benchmarks/run_benchmarks.py --only generation --latency 0.2 --compare v1.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import ToolBoxCore
+from tool_tree import ToolTreeView
+from catalog import read_tool_metadata
+from synthetic import make_tools
+from mock_server import MockLLMServer
+import bench_launch
+import bench_metadata
+
+SUITES = ["generation", "catalog", "search", "metadata", "launch"]
+
+summarize = bench_launch.summarize
+
+
+class _NullTree:
+    """记录调用次数的 Treeview 替身，用于在没有显示器时测量列表渲染的开销"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def insert(self, *args, **kwargs):
+        self.calls += 1
+
+    def delete(self, *items):
+        self.calls += 1
+
+    def item(self, *args, **kwargs):
+        self.calls += 1
+
+    def move(self, *args):
+        self.calls += 1
+
+    def after_idle(self, func):
+        func()
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def _make_core(directory, base_url=""):
+    config_file = os.path.join(directory, "toolbox_config.json")
+    with open(config_file, "w", encoding="utf-8") as f:
+        # 基准测试的需求彼此相似，关闭相似工具检查以免请求被拦截
+        json.dump({"api_key": "benchmark", "base_url": base_url, "watch_tools_dir": False,
+                   "duplicate_threshold": 0}, f)
+    return ToolBoxCore(config_file=config_file, tools_dir=os.path.join(directory, "tools"))
+
+
+def bench_generation(args):
+    """生成链路：普通请求、流式请求（含首个数据块延迟）、缓存命中和批量并发"""
+    results = {"latency_s": args.latency, "chunk_delay_s": args.chunk_delay}
+    directory = tempfile.mkdtemp(prefix="toolbox-bench-")
+    try:
+        with MockLLMServer(latency=args.latency, chunk_delay=args.chunk_delay) as server:
+            core = _make_core(directory, server.base_url)
+
+            samples = []
+            for i in range(args.generations):
+                elapsed, _ = _timed(lambda: core.generate_tool(f"基准测试需求 {i}", bypass_cache=True))
+                samples.append(elapsed)
+            results["request"] = summarize(samples)
+
+            samples, first_delta = [], []
+            for i in range(args.generations):
+                start = time.perf_counter()
+                first = []
+
+                def on_delta(text):
+                    if not first:
+                        first.append(time.perf_counter() - start)
+
+                core.generate_tool(f"基准测试需求 {i}", stream=True, bypass_cache=True, on_delta=on_delta)
+                samples.append(time.perf_counter() - start)
+                first_delta.append(first[0])
+            results["stream"] = summarize(samples)
+            results["stream_first_delta"] = summarize(first_delta)
+
+            core.generate_tool("缓存命中", bypass_cache=True)
+            samples = [_timed(lambda: core.generate_tool("缓存命中"))[0] for _ in range(args.generations)]
+            results["cache_hit"] = summarize(samples)
+
+            core.concurrency = args.concurrency
+            queue = core.create_generation_queue()
+            elapsed, jobs = _timed(lambda: (
+                queue.submit_many([f"批量需求 {i}" for i in range(args.batch)]), queue.shutdown(wait=True)
+            )[0])
+            results["batch"] = {
+                "jobs": args.batch,
+                "concurrency": args.concurrency,
+                "failed": sum(1 for job in jobs if not job.result),
+                "seconds": round(elapsed, 4),
+                "jobs_per_second": round(args.batch / elapsed, 2),
+            }
+            results["server_requests"] = server.requests
+            core.api_client.close()
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def bench_catalog(args):
+    """工具目录：冷扫描（无索引）、热扫描（有索引）、单文件增量更新和列表渲染"""
+    results = {}
+    for size in args.sizes:
+        directory = tempfile.mkdtemp(prefix="toolbox-bench-")
+        try:
+            core = _make_core(directory)
+            make_tools(core.tools_dir, size, args.lines)
+
+            cold, tools = _timed(core.load_tools)
+            warm, _ = _timed(_make_core(directory).load_tools)
+
+            # 修改一个文件后增量更新
+            changed = "tool_0.py"
+            with open(os.path.join(core.tools_dir, changed), "a", encoding="utf-8") as f:
+                f.write("# changed\n")
+            incremental, _ = _timed(lambda: core.apply_file_changes([changed]))
+
+            tree = _NullTree()
+            view = ToolTreeView(tree)
+            first_render, _ = _timed(lambda: view.update(dict(tools)))
+            first_calls = tree.calls
+            tree.calls = 0
+            rerender, _ = _timed(lambda: view.update(dict(core.tools)))
+
+            results[str(size)] = {
+                "files": size,
+                "tools": len(tools),
+                "load_cold_ms": round(cold * 1000, 2),
+                "load_warm_ms": round(warm * 1000, 2),
+                "incremental_update_ms": round(incremental * 1000, 3),
+                "render_first_page_ms": round(first_render * 1000, 3),
+                "render_first_page_tree_calls": first_calls,
+                "rerender_ms": round(rerender * 1000, 3),
+                "rerender_tree_calls": tree.calls,
+            }
+        finally:
+            shutil.rmtree(directory)
+    return results
+
+
+SEARCH_QUERIES = ["工具", "示例工具 12", "工具1", "tool", "tool_12", "示例 工具 3", "不存在的工具"]
+
+
+def bench_search(args):
+    """搜索索引：首次建立、从磁盘加载、单文件增量更新和查询延迟"""
+    results = {}
+    for size in args.sizes:
+        directory = tempfile.mkdtemp(prefix="toolbox-bench-")
+        try:
+            core = _make_core(directory)
+            make_tools(core.tools_dir, size, args.lines)
+            core.load_tools()
+
+            build, _ = _timed(lambda: core.search_index)
+            reloaded = _make_core(directory)
+            reloaded.load_tools()
+            load, _ = _timed(lambda: reloaded.search_index)
+
+            changed = "tool_0.py"
+            with open(os.path.join(core.tools_dir, changed), "a", encoding="utf-8") as f:
+                f.write("# changed\n")
+            incremental, _ = _timed(lambda: core.apply_file_changes([changed]))
+
+            samples = []
+            for _ in range(args.queries):
+                for query in SEARCH_QUERIES:
+                    samples.append(_timed(lambda: core.search_tools(query))[0])
+            results[str(size)] = {
+                "tools": size,
+                "build_ms": round(build * 1000, 2),
+                "load_ms": round(load * 1000, 2),
+                "incremental_update_ms": round(incremental * 1000, 3),
+                "query": summarize(samples),
+            }
+        finally:
+            shutil.rmtree(directory)
+    return results
+
+
+def bench_metadata_suite(args):
+    """元数据提取：旧的整文件方式与头部读取方式"""
+    directory = tempfile.mkdtemp(prefix="toolbox-bench-")
+    try:
+        paths = make_tools(directory, args.metadata_files, 600)
+        for path in paths:
+            read_tool_metadata(path)
+        return {
+            "files": len(paths),
+            "legacy": bench_metadata.time_parser(bench_metadata.legacy_parse, paths),
+            "header": bench_metadata.time_parser(read_tool_metadata, paths),
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_launch_suite(args):
+    """工具启动：冷启动与预热解释器池"""
+    with tempfile.TemporaryDirectory() as directory:
+        tool_path = os.path.join(directory, "sample_tool.py")
+        with open(tool_path, "w", encoding="utf-8") as f:
+            f.write(bench_launch.SAMPLE_TOOL)
+        results = {"cold": summarize(bench_launch.bench_cold(tool_path, args.launches))}
+        if bench_launch.is_supported():
+            results["warm"] = summarize(bench_launch.bench_warm(tool_path, args.launches))
+    return results
+
+
+BENCHMARKS = {
+    "generation": bench_generation,
+    "catalog": bench_catalog,
+    "search": bench_search,
+    "metadata": bench_metadata_suite,
+    "launch": bench_launch_suite,
+}
+
+
+def _flatten(data, prefix=""):
+    items = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            items.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            items[name] = value
+    return items
+
+
+def compare(baseline, current, threshold):
+    """与基线比较，返回变慢超过 threshold（比例）的指标 [(指标, 基线值, 当前值)]"""
+    old = _flatten(baseline.get("results", {}))
+    new = _flatten(current.get("results", {}))
+    regressions = []
+    for name, value in new.items():
+        before = old.get(name)
+        if not before:
+            continue
+        if name.endswith("per_second"):
+            worse = value < before / (1 + threshold)
+        elif name.endswith(("_ms", "seconds")):
+            worse = value > before * (1 + threshold)
+        else:
+            continue
+        if worse:
+            regressions.append((name, before, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="运行基准测试并输出 JSON 结果")
+    parser.add_argument("--only", help=f"只运行指定的测试，逗号分隔（{','.join(SUITES)}）")
+    parser.add_argument("--sizes", default="100,1000,10000", help="工具目录规模，逗号分隔")
+    parser.add_argument("--lines", type=int, default=50, help="catalog 测试中每个工具的代码行数")
+    parser.add_argument("--generations", type=int, default=10, help="每种生成方式的请求次数")
+    parser.add_argument("--batch", type=int, default=20, help="批量生成的任务数")
+    parser.add_argument("--concurrency", type=int, default=4, help="批量生成的并发数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务的首字节延迟（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.001, help="模拟服务流式数据块间隔（秒）")
+    parser.add_argument("--queries", type=int, default=5, help="search 测试中每个查询的重复次数")
+    parser.add_argument("--metadata-files", type=int, default=2000, help="metadata 测试的文件数")
+    parser.add_argument("--launches", type=int, default=20, help="launch 测试的启动次数")
+    parser.add_argument("--output", default="benchmark-results.json", help="结果文件")
+    parser.add_argument("--compare", help="与之前的结果文件比较，发现变慢时返回非零退出码")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定变慢的比例")
+    args = parser.parse_args(argv)
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    suites = args.only.split(",") if args.only else SUITES
+    unknown = [name for name in suites if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的测试: {', '.join(unknown)}")
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {},
+    }
+    for name in suites:
+        print(f"运行 {name} ...", file=sys.stderr)
+        elapsed, report["results"][name] = _timed(lambda: BENCHMARKS[name](args))
+        print(f"  完成，用时 {elapsed:.1f} 秒", file=sys.stderr)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report["results"], ensure_ascii=False, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        for name, before, value in regressions:
+            print(f"变慢: {name} {before} -> {value}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""生成基准测试用的工具目录"""
+import os
+
+# 三种常见的元数据写法：系统提示要求的一个空格、旧版的两个空格、只有散落的字段
+HEADERS = [
+    '# metadata = {{"name": "工具{i}", "description": "示例工具 {i}", "created": "2024-01-01 12:{m:02d}:00"}}\n',
+    '#  metadata = {{"name": "工具{i}", "description": "示例工具 {i}", "created": "2024-01-01 12:{m:02d}:00"}}\n',
+    '"""\n"name": "工具{i}"\n"description": "示例工具 {i}"\n"created": "2024-01-01 12:{m:02d}:00"\n"""\n',
+]
+
+
+def make_tools(directory, count, lines=100, start=0):
+    """在 directory 中生成 count 个约 lines 行的工具文件，返回文件路径列表"""
+    os.makedirs(directory, exist_ok=True)
+    body = "".join(f"    value_{n} = compute({n}, 'padding text for a realistic line length')\n" for n in range(lines))
+    paths = []
+    for i in range(start, start + count):
+        path = os.path.join(directory, f"tool_{i}.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(HEADERS[i % len(HEADERS)].format(i=i, m=i % 60))
+            f.write("import os\n\n\ndef main():\n    \"\"\"示例工具\"\"\"\n")
+            f.write(body)
+            f.write("\n\nif __name__ == \"__main__\":\n    main()\n")
+        paths.append(path)
+    return paths
@@ -0,0 +1,187 @@
+import os
+import json
+import hashlib
+import zipfile
+from datetime import datetime
+
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+TOOLS_PREFIX = "tools/"
+
+# 导入时遇到同名工具的处理方式
+CONFLICT_SKIP = "skip"
+CONFLICT_OVERWRITE = "overwrite"
+CONFLICT_RENAME = "rename"
+CONFLICT_POLICIES = (CONFLICT_SKIP, CONFLICT_OVERWRITE, CONFLICT_RENAME)
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class BundleError(Exception):
+    """工具包格式错误或内容损坏"""
+    pass
+
+
+def _copy_stream(src, dst):
+    """分块复制并计算 sha256，返回 (字节数, 摘要)"""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = src.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        dst.write(chunk)
+        size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def _valid_tool_name(tool_name):
+    """工具名称不能包含路径，防止解包时写到工具目录之外"""
+    return bool(tool_name) and tool_name == os.path.basename(tool_name) and tool_name not in (".", "..") \
+        and "/" not in tool_name and "\\" not in tool_name
+
+
+def export_bundle(tools, bundle_path):
+    """把工具打包为压缩包，tools 为 {工具名称: 工具记录}，返回导出的工具数
+
+    压缩包中 tools/<名称>.py 为工具文件，manifest.json 记录每个工具的元数据、大小和 sha256。
+    """
+    entries = []
+    tmp_path = bundle_path + ".tmp"
+    try:
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for tool_name in sorted(tools):
+                tool_info = tools[tool_name]
+                arcname = f"{TOOLS_PREFIX}{tool_name}.py"
+                info = zipfile.ZipInfo.from_file(tool_info["path"], arcname)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                with open(tool_info["path"], "rb") as src, zf.open(info, "w") as dst:
+                    size, sha256 = _copy_stream(src, dst)
+                entries.append({
+                    "name": tool_name,
+                    "file": arcname,
+                    "description": tool_info.get("description"),
+                    "created": tool_info.get("created"),
+                    "size": size,
+                    "sha256": sha256,
+                })
+            manifest = {
+                "format": BUNDLE_FORMAT,
+                "exported": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "tools": entries,
+            }
+            zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+        os.replace(tmp_path, bundle_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(entries)
+
+
+def read_manifest(zf):
+    """读取并检查工具包清单"""
+    try:
+        manifest = json.loads(zf.read(MANIFEST_NAME).decode("utf-8"))
+    except KeyError:
+        raise BundleError("工具包缺少 manifest.json")
+    except ValueError:
+        raise BundleError("工具包的 manifest.json 无法解析")
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"不支持的工具包格式: {manifest.get('format')}")
+    for entry in manifest.get("tools", []):
+        if not _valid_tool_name(entry.get("name", "")):
+            raise BundleError(f"工具包中有无效的工具名称: {entry.get('name')}")
+    return manifest
+
+
+def bundle_tool_names(bundle_path):
+    """返回工具包中的工具名称"""
+    with zipfile.ZipFile(bundle_path) as zf:
+        return [entry["name"] for entry in read_manifest(zf)["tools"]]
+
+
+def _open_target(tools_dir, tool_name, policy, exists=None):
+    """按冲突策略打开目标文件，返回 (实际名称, 文件对象, 临时文件路径)；跳过时返回 None
+
+    覆盖时先写临时文件，完成后再替换；其余情况以独占方式创建，不会覆盖已有文件。
+    exists(名称) 用于判断不在工具目录根部的工具（例如分片存放的工具）是否已存在。
+    """
+    if policy == CONFLICT_OVERWRITE:
+        tmp_path = os.path.join(tools_dir, f".{tool_name}.py.import")
+        return tool_name, open(tmp_path, "wb"), tmp_path
+
+    name = tool_name
+    suffix = 2
+    while True:
+        try:
+            if exists is not None and exists(name):
+                raise FileExistsError(name)
+            fd = os.open(os.path.join(tools_dir, f"{name}.py"), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            return name, os.fdopen(fd, "wb"), None
+        except FileExistsError:
+            if policy == CONFLICT_SKIP:
+                return None
+            name = f"{tool_name}_{suffix}"
+            suffix += 1
+
+
+def copy_into(src, tools_dir, tool_name, policy, expected_sha256=None, exists=None):
+    """把 src（可读的二进制流）按冲突策略写入工具目录，返回实际的工具名称，跳过时返回 None"""
+    target = _open_target(tools_dir, tool_name, policy, exists)
+    if target is None:
+        return None
+    name, dst, tmp_path = target
+    final_path = os.path.join(tools_dir, f"{name}.py")
+    try:
+        with dst:
+            _, sha256 = _copy_stream(src, dst)
+        if expected_sha256 and sha256 != expected_sha256:
+            raise BundleError(f"工具 '{tool_name}' 的内容校验失败")
+        if tmp_path:
+            os.replace(tmp_path, final_path)
+    except BaseException:
+        os.remove(tmp_path or final_path)
+        raise
+    return name
+
+
+def import_bundle(bundle_path, tools_dir, policy=CONFLICT_SKIP, exists=None):
+    """解包工具包到工具目录
+
+    返回 {"imported": [...], "skipped": [...], "renamed": {原名称: 新名称}, "failed": {名称: 原因}}，
+    单个工具损坏时记录到 failed 并继续导入其余工具。
+    """
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"未知的冲突处理方式: {policy}")
+    result = {"imported": [], "skipped": [], "renamed": {}, "failed": {}}
+    with zipfile.ZipFile(bundle_path) as zf:
+        manifest = read_manifest(zf)
+        for entry in manifest["tools"]:
+            tool_name = entry["name"]
+            try:
+                with zf.open(entry.get("file") or f"{TOOLS_PREFIX}{tool_name}.py") as src:
+                    name = copy_into(src, tools_dir, tool_name, policy, entry.get("sha256"), exists)
+            except KeyError:
+                result["failed"][tool_name] = "工具包中缺少工具文件"
+                continue
+            except (BundleError, zipfile.BadZipFile) as e:
+                result["failed"][tool_name] = str(e)
+                continue
+            if name is None:
+                result["skipped"].append(tool_name)
+                continue
+            result["imported"].append(name)
+            if name != tool_name:
+                result["renamed"][tool_name] = name
+    return result
+
+
+def import_file(import_path, tools_dir, policy=CONFLICT_SKIP, exists=None):
+    """导入单个 .py 工具文件，返回实际的工具名称，跳过时返回 None"""
+    tool_name = os.path.basename(import_path)[:-3]
+    if not _valid_tool_name(tool_name):
+        raise ValueError("无效的文件名")
+    with open(import_path, "rb") as src:
+        return copy_into(src, tools_dir, tool_name, policy, exists=exists)
@@ -0,0 +1,293 @@
+import os
+import re
+import ast
+import json
+import threading
+from collections import namedtuple
+
+# 索引格式版本，解析逻辑变化时递增以使旧索引失效
+CATALOG_VERSION = 2
+CATALOG_FILENAME = ".catalog.json"
+
+# 只在文件开头这么多字节内查找元数据
+HEADER_BYTES = 8 * 1024
+
+# 工具列表可用的排序方式，参数为 (工具名称, 记录)；名称不区分大小写
+SORT_KEYS = {
+    "name": lambda item: (item[0].lower(), item[0]),
+    "created": lambda item: (item[1]["created"], item[0].lower(), item[0]),
+}
+
+_METADATA_LINE = re.compile(r"[ \t]*#[ \t]*metadata[ \t]*=[ \t]*(\{.*\})[ \t\r]*$")
+_LEGACY_FIELD = re.compile(r'"(name|description|created)":\s*"([^"]+)"')
+
+ToolMetadata = namedtuple("ToolMetadata", ["name", "description", "created"])
+ToolMetadata.__new__.__defaults__ = (None, None, None)
+
+
+def _find_metadata_comment(text):
+    """查找元数据注释，返回 (行首位置, 字典结束位置, 字典文本)，找不到时返回 None"""
+    # 先用 str.find 定位关键字，只对候选行做正则匹配
+    index = text.find("metadata")
+    while index != -1:
+        line_start = text.rfind("\n", 0, index) + 1
+        line_end = text.find("\n", index)
+        if line_end == -1:
+            line_end = len(text)
+        match = _METADATA_LINE.match(text, line_start, line_end)
+        if match:
+            return line_start, match.end(1), match.group(1)
+        index = text.find("metadata", line_end)
+    return None
+
+
+def _literal_dict(text):
+    """安全地解析字典字面量（先按 JSON，再按 Python 字面量），失败时返回 None"""
+    try:
+        value = json.loads(text)
+    except ValueError:
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    return value if isinstance(value, dict) else None
+
+
+def read_tool_metadata(tool_path, header_bytes=HEADER_BYTES):
+    """只读取文件头部并一次性解析元数据，返回 ToolMetadata，找不到元数据时返回 None"""
+    with open(tool_path, "rb") as f:
+        header = f.read(header_bytes).decode("utf-8-sig", "replace")
+    return metadata_from_text(header)
+
+
+def metadata_from_text(header):
+    """从文件头部的文本中解析元数据，返回 ToolMetadata，找不到元数据时返回 None"""
+    # 元数据注释，例如 # metadata = {"name": ..., "description": ..., "created": ...}
+    found = _find_metadata_comment(header)
+    if found:
+        metadata = _literal_dict(found[2])
+        if metadata is not None:
+            return ToolMetadata(*(
+                None if metadata.get(field) is None else str(metadata[field])
+                for field in ToolMetadata._fields
+            ))
+
+    # 如果标准元数据格式不存在，尝试兼容旧版格式（同样只在头部查找）
+    fields = {}
+    for field, value in _LEGACY_FIELD.findall(header):
+        fields.setdefault(field, value)
+    return ToolMetadata(**fields) if fields else None
+
+
+def parse_tool_metadata(tool_path):
+    """从工具文件中提取元数据，返回可写入索引的字典，读取失败时返回 None"""
+    try:
+        metadata = read_tool_metadata(tool_path)
+    except Exception as e:
+        print(f"读取工具元数据失败: {str(e)}")
+        return None
+    if metadata is None:
+        return {}
+    return {field: value for field, value in metadata._asdict().items() if value is not None}
+
+
+def format_metadata_comment(name, description, created):
+    """生成元数据注释行"""
+    metadata = {"name": name, "description": description, "created": created}
+    return f"# metadata = {json.dumps(metadata, ensure_ascii=False)}"
+
+
+def replace_metadata_comment(content, comment):
+    """用新的元数据注释替换原有的注释，没有时插入到文件开头（shebang 和编码声明之后）"""
+    found = _find_metadata_comment(content)
+    if found:
+        return content[:found[0]] + comment + content[found[1]:]
+    lines = content.splitlines(keepends=True)
+    index = 0
+    while index < len(lines) and index < 2 and re.match(r"#!|#.*coding[:=]", lines[index]):
+        index += 1
+    return "".join(lines[:index]) + comment + "\n" + "".join(lines[index:])
+
+
+def make_tool_record(tool_name, tool_path, metadata):
+    """根据元数据构造工具记录"""
+    return {
+        "path": tool_path,
+        "name": metadata.get("name", tool_name),
+        "description": metadata.get("description", "无描述"),
+        "created": metadata.get("created", "未知")
+    }
+
+
+class ToolCatalog:
+    """工具目录的持久化元数据索引
+
+    索引按文件名记录 mtime 和 size，只有新增或发生变化的文件才会重新解析。
+    """
+
+    def __init__(self, tools_dir, index_file=None):
+        self.tools_dir = tools_dir
+        self.index_file = index_file or os.path.join(tools_dir, CATALOG_FILENAME)
+        # 文件名 -> {"mtime": ..., "size": ..., "metadata": {...} 或 None}
+        self.entries = {}
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._dirty = False
+
+    def load(self):
+        """从磁盘加载索引"""
+        with self._lock:
+            self._loaded = True
+            if not os.path.exists(self.index_file):
+                return
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取工具索引失败: {str(e)}")
+                return
+            if data.get("version") != CATALOG_VERSION:
+                # 旧版本的索引直接丢弃，下一次扫描时全部重建
+                self._dirty = True
+                return
+            self.entries = data.get("entries", {})
+
+    def save(self):
+        """将索引写回磁盘（先写临时文件再替换，避免索引损坏）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": CATALOG_VERSION, "entries": self.entries}
+            tmp_file = self.index_file + ".tmp"
+            try:
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_file, self.index_file)
+                self._dirty = False
+            except OSError as e:
+                print(f"保存工具索引失败: {str(e)}")
+
+    def scan(self):
+        """扫描工具目录，仅重新解析新增或修改过的文件，返回全部工具记录"""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+
+            seen = set()
+            if os.path.exists(self.tools_dir):
+                with os.scandir(self.tools_dir) as it:
+                    for entry in it:
+                        if not entry.name.endswith(".py") or not entry.is_file():
+                            continue
+                        seen.add(entry.name)
+                        self._refresh_entry(entry.name, entry.stat())
+
+            # 删除已经不存在的文件
+            for filename in list(self.entries):
+                if filename not in seen:
+                    del self.entries[filename]
+                    self._dirty = True
+
+            self.save()
+            return self.records()
+
+    def _refresh_entry(self, filename, st):
+        """文件的 mtime 或 size 变化时重新解析元数据"""
+        cached = self.entries.get(filename)
+        if cached and cached["mtime"] == st.st_mtime_ns and cached["size"] == st.st_size:
+            return False
+        tool_path = os.path.join(self.tools_dir, filename)
+        self.entries[filename] = {
+            "mtime": st.st_mtime_ns,
+            "size": st.st_size,
+            "metadata": parse_tool_metadata(tool_path)
+        }
+        self._dirty = True
+        return True
+
+    def update_files(self, filenames):
+        """只更新指定文件的索引条目（文件已删除时移除条目），返回索引发生变化的文件名"""
+        changed = []
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            for filename in filenames:
+                if not filename.endswith(".py"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.tools_dir, filename))
+                except FileNotFoundError:
+                    if self.entries.pop(filename, None) is not None:
+                        self._dirty = True
+                        changed.append(filename)
+                    continue
+                if self._refresh_entry(filename, st):
+                    changed.append(filename)
+            self.save()
+        return changed
+
+    def snapshot(self, filenames=None):
+        """返回索引条目的副本 {文件名: 条目}，指定 filenames 时不存在的文件对应 None"""
+        with self._lock:
+            if filenames is None:
+                return dict(self.entries)
+            return {filename: self.entries.get(filename) for filename in filenames}
+
+    def record(self, filename):
+        """返回单个文件对应的工具记录，不存在或没有元数据时返回 None"""
+        with self._lock:
+            entry = self.entries.get(filename)
+            if not entry or not entry["metadata"]:
+                return None
+            tool_name = filename[:-3]
+            return make_tool_record(tool_name, os.path.join(self.tools_dir, filename), entry["metadata"])
+
+    def tool_path(self, tool_name):
+        return os.path.join(self.tools_dir, f"{tool_name}.py")
+
+    def reserve(self, base_name):
+        """以独占方式创建空的工具文件，返回 (工具名称, 文件路径)
+
+        名称已存在时依次尝试 base_name_2、base_name_3……，并发生成的同名工具不会互相覆盖。
+        """
+        tool_name = base_name
+        suffix = 2
+        while True:
+            tool_path = self.tool_path(tool_name)
+            try:
+                with open(tool_path, "x", encoding="utf-8"):
+                    return tool_name, tool_path
+            except FileExistsError:
+                tool_name = f"{base_name}_{suffix}"
+                suffix += 1
+
+    def rename(self, tool_name, new_name):
+        """重命名工具文件，返回 (原路径, 新路径)"""
+        old_path, new_path = self.tool_path(tool_name), self.tool_path(new_name)
+        if os.path.exists(new_path):
+            raise FileExistsError(f"工具 '{new_name}' 已存在")
+        os.rename(old_path, new_path)
+        return old_path, new_path
+
+    def count(self):
+        return len(self.records())
+
+    def page(self, offset=0, limit=None, sort="name", descending=False):
+        """按 sort 排序后返回第 offset 个起的至多 limit 条工具记录 [(工具名称, 记录)]"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        items = sorted(self.records().items(), key=SORT_KEYS[sort], reverse=descending)
+        return items[offset:None if limit is None else offset + limit]
+
+    def records(self):
+        """返回索引中的工具记录，不访问任何工具文件"""
+        with self._lock:
+            tools = {}
+            for filename, entry in self.entries.items():
+                metadata = entry["metadata"]
+                if not metadata:
+                    continue
+                tool_name = filename[:-3]
+                tool_path = os.path.join(self.tools_dir, filename)
+                tools[tool_name] = make_tool_record(tool_name, tool_path, metadata)
+            return tools
@@ -0,0 +1,401 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from catalog import make_tool_record, parse_tool_metadata
+from validation import remove_bytecode
+
+DB_FILENAME = ".catalog.db"
+SHARDS_DIRNAME = "shards"
+
+# 每个分片目录最多存放的工具数，工具按 ID 分片：ID 为 0-999 的在 shards/000，1000-1999 的在 shards/001……
+SHARD_SIZE = 1000
+
+# 数据库结构版本（PRAGMA user_version）
+SCHEMA_VERSION = 2
+
+# 可用于排序的列，与 catalog.SORT_KEYS 一致（名称不区分大小写，NOCASE 只折叠 ASCII 字母）
+SORT_COLUMNS = ("name", "created")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tools (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    file TEXT UNIQUE,
+    title TEXT,
+    description TEXT,
+    created TEXT,
+    parsed INTEGER NOT NULL DEFAULT 0,
+    sha256 TEXT,
+    size INTEGER,
+    mtime INTEGER
+);
+"""
+
+# 有元数据、会出现在工具列表中的行（与 ToolCatalog.records() 的过滤一致）
+_LISTED = "parsed = 1 AND (title IS NOT NULL OR description IS NOT NULL OR created IS NOT NULL)"
+
+# 只包含列表中的行的部分索引，分页时跳过的行只需遍历索引
+_INDEXES = f"""
+DROP INDEX IF EXISTS tools_listed_name;
+DROP INDEX IF EXISTS tools_listed_created;
+CREATE INDEX IF NOT EXISTS tools_listed_name_nocase ON tools (name COLLATE NOCASE, name) WHERE {_LISTED};
+CREATE INDEX IF NOT EXISTS tools_listed_created_nocase ON tools (created, name COLLATE NOCASE, name) WHERE {_LISTED};
+"""
+
+
+def shard_file(tool_id, tool_name):
+    """工具文件相对于工具目录的路径（以 / 分隔）"""
+    return f"{SHARDS_DIRNAME}/{tool_id // SHARD_SIZE:03d}/{tool_name}.py"
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _row_metadata(row):
+    """把行还原为 parse_tool_metadata() 的返回值：读取失败为 None，没有元数据为 {}"""
+    if not row["parsed"]:
+        return None
+    fields = (("name", row["title"]), ("description", row["description"]), ("created", row["created"]))
+    return {field: value for field, value in fields if value is not None}
+
+
+class SqliteCatalog:
+    """工具目录的 SQLite 索引，工具文件按 ID 分片存放，适合数万个以上的工具
+
+    工具记录（ID、名称、元数据、sha256、大小、mtime）保存在工具目录下的 .catalog.db，
+    名称唯一且有索引，按名称查找、排序和分页都不需要遍历目录。工具文件位于
+    shards/<ID // SHARD_SIZE>/<名称>.py，每个目录中的文件数有上限。
+    新工具的名称和 ID 在同一个写事务中分配（BEGIN IMMEDIATE），多个线程或进程同时生成
+    同名的工具也不会互相覆盖。工具目录根部的 .py 文件（旧的平铺布局、导入或直接放入的文件）
+    在扫描或更新时移入分片，已有同名工具时覆盖它的文件。
+
+    接口与 ToolCatalog 一致：条目和记录仍以 "<名称>.py" 为键，条目额外带有文件的实际路径 "path"。
+    可以在多个线程中使用。
+    """
+
+    def __init__(self, tools_dir, db_file=None):
+        self.tools_dir = tools_dir
+        self.db_file = db_file or os.path.join(tools_dir, DB_FILENAME)
+        self._conn = None
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self):
+        with self._lock:
+            if self._conn is None:
+                # 自动提交模式，写操作都在 _transaction() 中显式开启事务
+                conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None, check_same_thread=False)
+                conn.row_factory = sqlite3.Row
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executescript(_SCHEMA + _INDEXES)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                self._conn = conn
+            return self._conn
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：开始时立即取得数据库的写锁，其他进程的写事务会等待（最多 30 秒）"""
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def load(self):
+        """打开数据库（第一次使用时创建）"""
+        self.conn
+
+    def save(self):
+        """每次修改都已提交，不需要另外保存"""
+        pass
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _path(self, file):
+        return os.path.join(self.tools_dir, *file.split("/"))
+
+    def _entry(self, row):
+        return {
+            "mtime": row["mtime"],
+            "size": row["size"],
+            "metadata": _row_metadata(row),
+            "path": self._path(row["file"]),
+        }
+
+    # ---- 写入 ----
+
+    def _refresh(self, conn, row, st, force=False):
+        """文件的 mtime 或 size 变化时重新解析元数据并计算 sha256"""
+        if not force and row["mtime"] == st.st_mtime_ns and row["size"] == st.st_size:
+            return False
+        tool_path = self._path(row["file"])
+        metadata = parse_tool_metadata(tool_path)
+        try:
+            sha256 = file_sha256(tool_path)
+        except OSError:
+            sha256 = None
+        metadata_values = (None, None, None) if not metadata else \
+            (metadata.get("name"), metadata.get("description"), metadata.get("created"))
+        conn.execute(
+            "UPDATE tools SET title = ?, description = ?, created = ?, parsed = ?, sha256 = ?, size = ?, mtime = ? "
+            "WHERE id = ?",
+            (*metadata_values, int(metadata is not None), sha256, st.st_size, st.st_mtime_ns, row["id"])
+        )
+        return True
+
+    def _insert(self, conn, tool_name, file=None):
+        """插入新工具，返回 (ID, 相对路径)；没有给出路径时按分配到的 ID 放入分片"""
+        tool_id = conn.execute("INSERT INTO tools (name, file) VALUES (?, ?)", (tool_name, file)).lastrowid
+        if file is None:
+            file = shard_file(tool_id, tool_name)
+            conn.execute("UPDATE tools SET file = ? WHERE id = ?", (file, tool_id))
+        return tool_id, file
+
+    def _adopt(self, conn, filename):
+        """把工具目录根部的文件移入分片：已有同名工具时覆盖它的文件，否则分配新的 ID。返回是否成功"""
+        src = os.path.join(self.tools_dir, filename)
+        tool_name = filename[:-3]
+        conn.execute("SAVEPOINT adopt")
+        try:
+            row = conn.execute("SELECT * FROM tools WHERE name = ?", (tool_name,)).fetchone()
+            if row is None:
+                self._insert(conn, tool_name)
+                row = conn.execute("SELECT * FROM tools WHERE name = ?", (tool_name,)).fetchone()
+            target = self._path(row["file"])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(src, target)
+            remove_bytecode(src)
+            remove_bytecode(target)
+            self._refresh(conn, row, os.stat(target), force=True)
+        except OSError as e:
+            # 例如文件仍被其他程序打开（Windows），下一次扫描时再移动
+            conn.execute("ROLLBACK TO adopt")
+            conn.execute("RELEASE adopt")
+            print(f"移动工具文件 {filename} 失败: {str(e)}")
+            return False
+        conn.execute("RELEASE adopt")
+        return True
+
+    def _adopt_root(self, conn):
+        adopted = []
+        if os.path.exists(self.tools_dir):
+            with os.scandir(self.tools_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".py") and entry.is_file() and self._adopt(conn, entry.name):
+                        adopted.append(entry.name)
+        return adopted
+
+    def _shard_files(self):
+        """分片目录中的全部工具文件 {相对路径: stat}"""
+        files = {}
+        shards_dir = os.path.join(self.tools_dir, SHARDS_DIRNAME)
+        if not os.path.isdir(shards_dir):
+            return files
+        with os.scandir(shards_dir) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as it:
+                    for entry in it:
+                        if entry.name.endswith(".py") and entry.is_file():
+                            files[f"{SHARDS_DIRNAME}/{shard.name}/{entry.name}"] = entry.stat()
+        return files
+
+    def _find_in_shards(self, filename):
+        """在各分片目录中查找文件，返回找到的相对路径（按分片排序），没有时返回 None"""
+        shards_dir = os.path.join(self.tools_dir, SHARDS_DIRNAME)
+        if not os.path.isdir(shards_dir):
+            return None
+        for shard in sorted(os.listdir(shards_dir)):
+            if os.path.isfile(os.path.join(shards_dir, shard, filename)):
+                return f"{SHARDS_DIRNAME}/{shard}/{filename}"
+        return None
+
+    def scan(self):
+        """与工具目录全量同步，返回全部工具记录
+
+        根部的 .py 文件移入分片；分片中文件的 mtime 或 size 变化时重新解析，文件已删除时删除记录，
+        不在数据库中的文件（例如从备份恢复的）按文件名补充记录。
+        """
+        with self._transaction() as conn:
+            self._adopt_root(conn)
+            files = self._shard_files()
+            known = set()
+            for row in conn.execute("SELECT * FROM tools").fetchall():
+                st = files.get(row["file"])
+                if st is None:
+                    conn.execute("DELETE FROM tools WHERE id = ?", (row["id"],))
+                    continue
+                known.add(row["file"])
+                self._refresh(conn, row, st)
+            for file, st in files.items():
+                if file in known:
+                    continue
+                tool_name = file.rsplit("/", 1)[1][:-3]
+                if conn.execute("SELECT 1 FROM tools WHERE name = ?", (tool_name,)).fetchone():
+                    print(f"忽略与已有工具重名的文件: {file}")
+                    continue
+                tool_id, _ = self._insert(conn, tool_name, file)
+                self._refresh(conn, conn.execute("SELECT * FROM tools WHERE id = ?", (tool_id,)).fetchone(), st)
+        return self.records()
+
+    def migrate(self):
+        """从平铺布局迁移：把工具目录根部的全部工具移入分片并建立索引，返回迁移的工具数"""
+        with self._transaction() as conn:
+            adopted = self._adopt_root(conn)
+        self.scan()
+        return len(adopted)
+
+    def update_files(self, filenames):
+        """只更新指定的工具（"<名称>.py"），返回发生变化的文件名
+
+        根部存在该文件时移入分片；否则按名称找到分片中的文件，文件已删除时删除记录；
+        数据库中没有的工具在分片目录中查找（例如直接复制到分片中的文件），找到时补充记录。
+        """
+        changed = []
+        with self._transaction() as conn:
+            for filename in filenames:
+                if not filename.endswith(".py") or os.path.basename(filename) != filename:
+                    continue
+                if os.path.isfile(os.path.join(self.tools_dir, filename)):
+                    if self._adopt(conn, filename):
+                        changed.append(filename)
+                    continue
+                row = conn.execute("SELECT * FROM tools WHERE name = ?", (filename[:-3],)).fetchone()
+                if row is None:
+                    file = self._find_in_shards(filename)
+                    if file is None:
+                        continue
+                    tool_id, _ = self._insert(conn, filename[:-3], file)
+                    row = conn.execute("SELECT * FROM tools WHERE id = ?", (tool_id,)).fetchone()
+                    self._refresh(conn, row, os.stat(self._path(file)))
+                    changed.append(filename)
+                    continue
+                try:
+                    st = os.stat(self._path(row["file"]))
+                except FileNotFoundError:
+                    conn.execute("DELETE FROM tools WHERE id = ?", (row["id"],))
+                    changed.append(filename)
+                    continue
+                if self._refresh(conn, row, st):
+                    changed.append(filename)
+        return changed
+
+    def reserve(self, base_name):
+        """分配不重复的工具名称和 ID 并以独占方式创建空的工具文件，返回 (工具名称, 文件路径)
+
+        名称已被占用时依次尝试 base_name_2、base_name_3……，整个过程在一个写事务中完成。
+        """
+        with self._transaction() as conn:
+            tool_name = base_name
+            suffix = 2
+            while True:
+                if not conn.execute("SELECT 1 FROM tools WHERE name = ?", (tool_name,)).fetchone() \
+                        and not os.path.exists(os.path.join(self.tools_dir, f"{tool_name}.py")):
+                    conn.execute("SAVEPOINT reserve")
+                    _, file = self._insert(conn, tool_name)
+                    tool_path = self._path(file)
+                    os.makedirs(os.path.dirname(tool_path), exist_ok=True)
+                    try:
+                        with open(tool_path, "x", encoding="utf-8"):
+                            pass
+                    except FileExistsError:
+                        # 分片中已有数据库里没有的同名文件（例如直接复制进来的），保留它并换一个名称
+                        conn.execute("ROLLBACK TO reserve")
+                        conn.execute("RELEASE reserve")
+                    else:
+                        conn.execute("RELEASE reserve")
+                        return tool_name, tool_path
+                tool_name = f"{base_name}_{suffix}"
+                suffix += 1
+
+    def rename(self, tool_name, new_name):
+        """重命名工具（文件留在原来的分片中），返回 (原路径, 新路径)"""
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM tools WHERE name = ?", (new_name,)).fetchone():
+                raise FileExistsError(f"工具 '{new_name}' 已存在")
+            row = conn.execute("SELECT * FROM tools WHERE name = ?", (tool_name,)).fetchone()
+            if row is None:
+                raise FileNotFoundError(f"工具 '{tool_name}' 不存在")
+            new_file = f"{row['file'].rsplit('/', 1)[0]}/{new_name}.py"
+            old_path, new_path = self._path(row["file"]), self._path(new_file)
+            # 分片中可能有数据库里没有的同名文件，不能被覆盖
+            if os.path.exists(new_path):
+                raise FileExistsError(f"工具 '{new_name}' 已存在")
+            conn.execute("UPDATE tools SET name = ?, file = ? WHERE id = ?", (new_name, new_file, row["id"]))
+            os.rename(old_path, new_path)
+        return old_path, new_path
+
+    # ---- 查询 ----
+
+    def tool_path(self, tool_name):
+        """工具文件的路径；还没有记录的工具返回根部的路径，放在那里的文件会在下次更新时移入分片"""
+        with self._lock:
+            row = self.conn.execute("SELECT file FROM tools WHERE name = ?", (tool_name,)).fetchone()
+        if row is None or row["file"] is None:
+            return os.path.join(self.tools_dir, f"{tool_name}.py")
+        return self._path(row["file"])
+
+    def snapshot(self, filenames=None):
+        """返回索引条目 {文件名: 条目}，指定 filenames 时不存在的工具对应 None"""
+        with self._lock:
+            if filenames is None:
+                rows = self.conn.execute("SELECT * FROM tools").fetchall()
+                return {f"{row['name']}.py": self._entry(row) for row in rows}
+            entries = {}
+            for filename in filenames:
+                row = self.conn.execute("SELECT * FROM tools WHERE name = ?", (filename[:-3],)).fetchone()
+                entries[filename] = None if row is None else self._entry(row)
+            return entries
+
+    def record(self, filename):
+        """返回单个工具的记录，不存在或没有元数据时返回 None"""
+        with self._lock:
+            row = self.conn.execute(f"SELECT * FROM tools WHERE name = ? AND {_LISTED}", (filename[:-3],)).fetchone()
+        if row is None:
+            return None
+        return make_tool_record(row["name"], self._path(row["file"]), _row_metadata(row))
+
+    def records(self):
+        """返回全部工具记录，不访问任何工具文件"""
+        with self._lock:
+            rows = self.conn.execute(f"SELECT * FROM tools WHERE {_LISTED}").fetchall()
+        return {row["name"]: make_tool_record(row["name"], self._path(row["file"]), _row_metadata(row))
+                for row in rows}
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM tools WHERE {_LISTED}").fetchone()[0]
+
+    def page(self, offset=0, limit=None, sort="name", descending=False):
+        """按 sort 排序后返回第 offset 个起的至多 limit 条工具记录 [(工具名称, 记录)]，由索引完成排序和分页"""
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"不支持的排序方式: {sort}")
+        order = "DESC" if descending else "ASC"
+        order_by = f"name COLLATE NOCASE {order}, name {order}"
+        if sort != "name":
+            order_by = f"{sort} {order}, {order_by}"
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM tools WHERE {_LISTED} ORDER BY {order_by} LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset)
+            ).fetchall()
+        return [(row["name"], make_tool_record(row["name"], self._path(row["file"]), _row_metadata(row)))
+                for row in rows]
@@ -0,0 +1,356 @@
+"""智能工具箱命令行入口
+
+不依赖图形界面，可以在无显示器的环境中生成、列出、运行和管理工具。
+示例：
+    python cli.py list
+    python cli.py search 重命名
+    python cli.py generate "批量重命名文件夹中的图片"
+    python cli.py generate -f requests.txt
+    python cli.py run rename_images
+    python cli.py batch convert_images photos/ --workers 8
+"""
+import sys
+import json
+import argparse
+
+from core import ToolBoxCore
+from dedup import SimilarToolExists
+
+
+def cmd_list(core, args):
+    """列出工具，可以排序和分页"""
+    items = core.list_tools(args.offset, args.limit or None, sort=args.sort, descending=args.desc)
+    if args.json:
+        print(json.dumps(dict(items), ensure_ascii=False, indent=2))
+        return 0
+    for tool_name, tool_info in items:
+        print(f"{tool_name}\t{tool_info['description']}\t{tool_info['created']}")
+    return 0
+
+
+def _read_requests(path):
+    """从文件读取工具需求，每行一个"""
+    stream = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    with stream:
+        return [line.strip() for line in stream if line.strip()]
+
+
+def cmd_generate(core, args):
+    """生成工具，支持单个需求或从文件批量生成"""
+    if not core.api_key:
+        print("错误: 请先配置API Key", file=sys.stderr)
+        return 1
+
+    if args.candidates:
+        core.hedge_candidates = args.candidates
+
+    if args.file:
+        return _generate_batch(core, args, _read_requests(args.file))
+
+    if not args.request:
+        print("错误: 请输入工具需求描述", file=sys.stderr)
+        return 1
+
+    # 流式模式下把代码实时输出到标准错误，标准输出只留工具名称
+    on_delta = (lambda text: sys.stderr.write(text) or sys.stderr.flush()) if args.stream else None
+    try:
+        tool_name = core.generate_tool(
+            args.request, args.max_tokens,
+            stream=args.stream,
+            bypass_cache=args.no_cache,
+            on_delta=on_delta,
+            allow_duplicate=args.allow_duplicate
+        )
+    except SimilarToolExists as e:
+        # 标准输出列出相似的工具，可以直接运行或修改
+        print("已有相似的工具（使用 --allow-duplicate 仍然生成）:", file=sys.stderr)
+        for tool_name, score in e.matches:
+            print(f"{tool_name}\t{score:.2f}")
+        return 1
+    if args.stream:
+        sys.stderr.write("\n")
+    print(tool_name)
+    return 0
+
+
+def _generate_batch(core, args, request_texts):
+    """通过批量生成队列并发生成多个工具"""
+    if args.concurrency:
+        core.concurrency = args.concurrency
+
+    def on_update(job):
+        print(f"[{job.job_id}] {job.status_label} {job.result or job.error or ''}", file=sys.stderr)
+
+    queue = core.create_generation_queue(on_update=on_update, allow_duplicate=args.allow_duplicate)
+    jobs = queue.submit_many(request_texts)
+    queue.shutdown(wait=True)
+
+    failed = 0
+    for job in jobs:
+        if job.result:
+            print(job.result)
+        else:
+            failed += 1
+    return 1 if failed else 0
+
+
+def cmd_modify(core, args):
+    """根据修改提示修改工具"""
+    if not core.api_key:
+        print("错误: 请先配置API Key", file=sys.stderr)
+        return 1
+    if args.mode:
+        core.modify_mode = args.mode
+    core.modify_tool(args.tool, args.prompt)
+    print(args.tool)
+    return 0
+
+
+def cmd_validate(core, args):
+    """校验已保存的工具（编译、main() 和元数据），并预编译通过校验的工具"""
+    results = core.validate_tools(args.tools or None)
+    failed = 0
+    for tool_name, problems in results.items():
+        if problems:
+            failed += 1
+            print(f"{tool_name}\t{'；'.join(problems)}")
+    print(f"已校验 {len(results)} 个工具，{failed} 个未通过", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def cmd_search(core, args):
+    """按名称、描述和源代码搜索工具"""
+    tools = core.load_tools()
+    for tool_name in core.search_tools(args.query, args.limit):
+        print(f"{tool_name}\t{tools[tool_name]['description']}")
+    return 0
+
+
+def cmd_history(core, args):
+    """列出工具的历史版本，--compact 时清理所有工具的历史"""
+    if args.compact:
+        revisions, objects = core.compact_history()
+        print(f"已裁掉 {revisions} 个版本，删除 {objects} 个对象", file=sys.stderr)
+        return 0
+    if not args.tool:
+        print("错误: 请指定工具名称或使用 --compact", file=sys.stderr)
+        return 1
+    for revision in core.tool_revisions(args.tool):
+        prompt = (revision.get("prompt") or "").replace("\n", " ")
+        print(f"{revision['rev']}\t{revision['time']}\t{revision['action']}\t{revision.get('model') or ''}\t{prompt}")
+    return 0
+
+
+def cmd_diff(core, args):
+    """显示两个历史版本之间（或某个版本与当前代码）的差异"""
+    sys.stdout.write(core.diff_revision(args.tool, args.rev, args.other_rev))
+    return 0
+
+
+def cmd_restore(core, args):
+    """把工具恢复到某个历史版本"""
+    core.restore_revision(args.tool, args.rev)
+    print(args.tool)
+    return 0
+
+
+def cmd_deps(core, args):
+    """列出工具缺少的第三方包，--install 时统一安装到共享目录"""
+    tool_names = args.tools or None
+    if not args.install:
+        missing = core.missing_dependencies(tool_names, include_failed=True, recheck=True)
+        for package in sorted(missing):
+            reason = "（安装失败）" if package in core.dependencies.failed else ""
+            print(f"{package}\t{', '.join(sorted(set(missing[package])))}{reason}")
+        return 0
+    result = core.install_dependencies(tool_names, retry_failed=args.retry, offline=args.offline)
+    for package in result["installed"]:
+        print(package)
+    for package, reason in result["failed"].items():
+        print(f"安装 {package} 失败: {reason}", file=sys.stderr)
+    return 1 if result["failed"] else 0
+
+
+def cmd_run(core, args):
+    """运行工具"""
+    returncode = core.run_tool(args.tool)
+    return returncode or 0
+
+
+def cmd_batch(core, args):
+    """对目录中的每个文件或 JSONL 中的每条输入各运行一次工具，输出汇总统计"""
+    from batch_run import load_inputs, RUN_EXITED, STDIN_CONTENT, STDIN_PATH
+
+    inputs = load_inputs(args.inputs, STDIN_CONTENT if args.content else STDIN_PATH, recursive=args.recursive)
+    if not inputs:
+        print("错误: 没有找到输入", file=sys.stderr)
+        return 1
+
+    def on_result(result):
+        if result["status"] != RUN_EXITED or result["returncode"] != 0:
+            print(f"[{result['id']}] {result['status']} {result['returncode']}", file=sys.stderr)
+
+    results, summary, results_file = core.run_batch(args.tool, inputs, workers=args.workers, timeout=args.timeout,
+                                                    results_file=args.output, on_result=on_result)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    print(f"结果已保存到 {results_file}", file=sys.stderr)
+    return 0 if summary["succeeded"] == summary["total"] == len(inputs) else 1
+
+
+def cmd_migrate(core, args):
+    """把工具目录迁移到 SQLite 索引和分片目录"""
+    migrated = core.migrate_catalog()
+    print(f"已迁移 {migrated} 个工具，共 {core.catalog.count()} 个工具", file=sys.stderr)
+    return 0
+
+
+def cmd_delete(core, args):
+    """删除工具"""
+    core.delete_tool(args.tool)
+    return 0
+
+
+def cmd_export(core, args):
+    """导出工具，多个工具或导出路径为 .zip 时导出为工具包"""
+    tool_names = sorted(core.load_tools()) if args.all else args.tools
+    if not tool_names:
+        print("错误: 请指定要导出的工具或使用 --all", file=sys.stderr)
+        return 1
+    if len(tool_names) == 1 and not args.path.lower().endswith(".zip"):
+        core.export_tool(tool_names[0], args.path)
+        return 0
+    if not args.path.lower().endswith(".zip"):
+        print("错误: 导出多个工具时路径必须以 .zip 结尾", file=sys.stderr)
+        return 1
+    print(f"已导出 {core.export_tools(tool_names, args.path)} 个工具", file=sys.stderr)
+    return 0
+
+
+def cmd_import(core, args):
+    """导入 .py 文件或工具包，输出导入后的工具名称"""
+    policy = "overwrite" if args.overwrite else args.on_conflict
+    result = core.import_tools(args.paths, policy=policy)
+    for tool_name in result["imported"]:
+        print(tool_name)
+    for tool_name in result["skipped"]:
+        print(f"跳过: 工具 '{tool_name}' 已存在", file=sys.stderr)
+    for tool_name, reason in result["failed"].items():
+        print(f"导入 '{tool_name}' 失败: {reason}", file=sys.stderr)
+    return 1 if result["failed"] else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="toolbox", description="智能工具箱命令行")
+    parser.add_argument("--config", default="toolbox_config.json", help="配置文件路径")
+    parser.add_argument("--tools-dir", default="tools", help="工具目录")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("list", help="列出所有工具")
+    p.add_argument("--json", action="store_true", help="以JSON格式输出")
+    p.add_argument("--sort", choices=["name", "created"], default="name", help="排序方式（默认按名称）")
+    p.add_argument("--desc", action="store_true", help="倒序排列")
+    p.add_argument("--offset", type=int, default=0, help="跳过前面的工具数")
+    p.add_argument("--limit", type=int, default=0, help="最多列出的工具数，0 表示不限")
+    p.set_defaults(func=cmd_list)
+
+    p = subparsers.add_parser("search", help="搜索工具")
+    p.add_argument("query", help="关键词，中英文均可")
+    p.add_argument("--limit", type=int, default=20, help="最多显示的结果数，0 表示不限")
+    p.set_defaults(func=cmd_search)
+
+    p = subparsers.add_parser("generate", help="生成工具")
+    p.add_argument("request", nargs="?", help="工具需求描述")
+    p.add_argument("-f", "--file", help="从文件批量读取需求（每行一个，- 表示标准输入）")
+    p.add_argument("--max-tokens", type=int, default=None, help="固定本次请求的 max_tokens（默认按历史自动估计）")
+    p.add_argument("--stream", action="store_true", help="流式输出生成的代码")
+    p.add_argument("--no-cache", action="store_true", help="忽略缓存，强制请求模型")
+    p.add_argument("--concurrency", type=int, default=None, help="批量生成的并发数")
+    p.add_argument("--allow-duplicate", action="store_true", help="已有相似的工具时仍然生成")
+    p.add_argument("--candidates", type=int, default=None, help="同时请求的候选数，第一个通过校验的胜出（默认取自配置）")
+    p.set_defaults(func=cmd_generate)
+
+    p = subparsers.add_parser("modify", help="修改工具")
+    p.add_argument("tool", help="工具名称")
+    p.add_argument("prompt", help="修改提示")
+    p.add_argument("--mode", choices=["patch", "full"], default=None,
+                   help="patch 只让模型返回修改块，full 重新生成整个文件（默认取自配置）")
+    p.set_defaults(func=cmd_modify)
+
+    p = subparsers.add_parser("validate", help="校验并预编译已保存的工具")
+    p.add_argument("tools", nargs="*", help="工具名称，默认校验全部工具")
+    p.set_defaults(func=cmd_validate)
+
+    p = subparsers.add_parser("history", help="列出工具的历史版本")
+    p.add_argument("tool", nargs="?", help="工具名称")
+    p.add_argument("--compact", action="store_true", help="清理历史：裁掉超出上限的版本并删除不再引用的对象")
+    p.set_defaults(func=cmd_history)
+
+    p = subparsers.add_parser("diff", help="比较工具的历史版本")
+    p.add_argument("tool", help="工具名称")
+    p.add_argument("rev", type=int, help="版本号")
+    p.add_argument("other_rev", type=int, nargs="?", default=None, help="另一个版本号，默认与当前代码比较")
+    p.set_defaults(func=cmd_diff)
+
+    p = subparsers.add_parser("restore", help="把工具恢复到历史版本")
+    p.add_argument("tool", help="工具名称")
+    p.add_argument("rev", type=int, help="版本号")
+    p.set_defaults(func=cmd_restore)
+
+    p = subparsers.add_parser("deps", help="查看或安装工具的第三方依赖")
+    p.add_argument("tools", nargs="*", help="工具名称，默认全部工具")
+    p.add_argument("--install", action="store_true", help="一次性安装缺少的包")
+    p.add_argument("--retry", action="store_true", help="重新尝试之前安装失败的包")
+    p.add_argument("--offline", action="store_true", help="只使用本地 wheel 缓存，不联网")
+    p.set_defaults(func=cmd_deps)
+
+    p = subparsers.add_parser("run", help="运行工具")
+    p.add_argument("tool", help="工具名称")
+    p.set_defaults(func=cmd_run)
+
+    p = subparsers.add_parser("batch", help="对多条输入批量运行工具")
+    p.add_argument("tool", help="工具名称")
+    p.add_argument("inputs", help="输入目录（每个文件一次）或 JSONL 文件（每行一次）")
+    p.add_argument("--content", action="store_true", help="把文件内容而不是文件路径作为工具的标准输入")
+    p.add_argument("-r", "--recursive", action="store_true", help="包括子目录中的文件")
+    p.add_argument("--workers", type=int, default=None, help="同时运行的进程数（默认取自配置）")
+    p.add_argument("--timeout", type=float, default=None, help="每次运行的超时（秒，默认取自配置）")
+    p.add_argument("-o", "--output", default=None, help="结果文件路径（JSON Lines）")
+    p.set_defaults(func=cmd_batch)
+
+    p = subparsers.add_parser("migrate", help="把工具迁移到 SQLite 索引和分片目录（适合大量工具）")
+    p.set_defaults(func=cmd_migrate)
+
+    p = subparsers.add_parser("delete", help="删除工具")
+    p.add_argument("tool", help="工具名称")
+    p.set_defaults(func=cmd_delete)
+
+    p = subparsers.add_parser("export", help="导出工具")
+    p.add_argument("tools", nargs="*", help="工具名称，可以有多个")
+    p.add_argument("path", help="导出路径，多个工具时为 .zip 工具包")
+    p.add_argument("--all", action="store_true", help="导出全部工具")
+    p.set_defaults(func=cmd_export)
+
+    p = subparsers.add_parser("import", help="导入工具")
+    p.add_argument("paths", nargs="+", help="工具文件或 .zip 工具包路径")
+    p.add_argument("--on-conflict", choices=["skip", "overwrite", "rename"], default="skip",
+                   help="已存在同名工具时跳过、覆盖或重命名（默认跳过）")
+    p.add_argument("--overwrite", action="store_true", help="覆盖同名工具（同 --on-conflict overwrite）")
+    p.set_defaults(func=cmd_import)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    core = ToolBoxCore(config_file=args.config, tools_dir=args.tools_dir)
+    try:
+        return args.func(core, args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        print(f"错误: {str(e)}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1024 @@
+import os
+import re
+import sys
+import json
+import shutil
+import threading
+from datetime import datetime
+
+from catalog import ToolCatalog, format_metadata_comment, parse_tool_metadata, replace_metadata_comment
+from generation import MODEL, request_completion
+from instrumentation import (
+    SPAN_CATALOG_SCAN, SPAN_FILE_WRITE, SPAN_NAME_EXTRACT, SPAN_SEARCH_INDEX, SPAN_SEARCH_QUERY, SPAN_VALIDATE,
+    SPAN_DUPLICATE_CHECK, SPAN_HEDGE,
+    Instrumentation
+)
+from validation import ToolValidationError, build_fix_messages, precompile, remove_bytecode, validate_tool_code
+
+# 生成缓存、批量队列和子进程相关模块只在用到时才导入，保证 list/run 等命令启动足够快
+
+
+class ToolBoxCore:
+    """工具箱的核心逻辑（不依赖图形界面）
+
+    负责配置、工具目录、生成、修改、运行以及导入导出，图形界面和命令行共用。
+    """
+
+    def __init__(self, config_file="toolbox_config.json", tools_dir="tools"):
+        # 配置
+        self.config_file = config_file
+        self.tools_dir = tools_dir
+        self.api_key = ""
+        self.base_url = "https://api.deepseek.com"
+        self.max_tokens = 2000  # 默认值
+        self.stream = True  # 流式生成，实时预览模型输出
+        self.model = MODEL
+        self.cache_max_entries = 200  # 生成结果缓存的最大条目数
+        self.cache_max_bytes = 20 * 1024 * 1024  # 生成结果缓存的最大总大小
+        self.concurrency = 3  # 批量生成的最大并发数
+        self.requests_per_minute = 0  # 每分钟最大请求数，0 表示不限
+        self.tokens_per_minute = 0  # 每分钟最大token数，0 表示不限
+        self.watch_tools_dir = True  # 监视工具目录，自动反映外部的增删改
+        self.run_timeout = 0  # 工具运行超时（秒），0 表示不限
+        self.warm_pool = False  # 通过预热解释器池运行工具（仅 POSIX）
+        self.modify_mode = "patch"  # 修改工具的方式："patch" 只让模型返回修改块，"full" 重新生成整个文件
+        self.request_timeout = 120  # 等待接口响应的超时（秒）
+        self.max_retries = 3  # 限流或服务端错误时的最大重试次数
+        self.perf_log = False  # 把耗时统计追加到配置文件所在目录的 perf_log.jsonl
+        self.validation_retries = 2  # 生成的代码未通过校验时，把问题反馈给模型重新生成的次数
+        self.max_continuations = 3  # 回复因 max_tokens 被截断时最多续写的次数
+        self.adaptive_max_tokens = True  # 根据请求大小和历史输出估计 max_tokens（不超过配置的 max_tokens）
+        self.few_shot_tools = []  # 作为示例附在系统提示之后的工具名称，顺序固定以便命中前缀缓存
+        self.duplicate_threshold = 0.5  # 需求与已有工具的相似度达到此值时先提示使用已有工具，为 0 时不检查
+        self.history_max_revisions = 100  # 每个工具最多保留的历史版本数
+        self.auto_install_dependencies = True  # 第一次运行工具前自动安装它缺少的第三方库
+        self.hedge_candidates = 1  # 大于 1 时同时请求多个候选，第一个通过校验的候选胜出
+        self.hedge_models = []  # 候选依次使用的模型（同一个 base_url），为空时都使用 model
+        self.hedge_temperatures = []  # 候选依次使用的 temperature，为空时使用接口默认值
+        self.hedge_delay = 0.0  # 第 i 个候选延迟 i * hedge_delay 秒发出，期间已有候选通过时不再发出
+        self.batch_workers = 0  # 批量运行工具时同时运行的进程数，0 表示 CPU 核数
+        self.catalog_backend = "json"  # 工具目录索引："json" 为平铺目录，"sqlite" 为分片目录加 SQLite 数据库（适合大量工具）
+
+        # 创建工具目录
+        if not os.path.exists(self.tools_dir):
+            os.makedirs(self.tools_dir)
+
+        # 加载配置
+        self.load_config()
+
+        # 热点路径的耗时统计
+        log_file = None
+        if self.perf_log:
+            log_file = os.path.join(os.path.dirname(os.path.abspath(self.config_file)), "perf_log.jsonl")
+        self.instrumentation = Instrumentation(log_file=log_file)
+
+        self._response_cache = None
+        self._search_index = None
+        self._token_budget = None
+        self._request_store = None
+        self._history = None
+        self._dependencies = None
+        self._duplicate_index = None
+        self._duplicate_index_lock = threading.Lock()
+        self._search_index_lock = threading.Lock()
+        self._api_client = None
+        self._api_client_config = None
+        self._api_client_lock = threading.Lock()
+        self.rate_limiter = None
+
+        # 初始化工具列表
+        self.catalog = self._open_catalog()
+        self.tools = {}
+
+    def _open_catalog(self):
+        if self.catalog_backend == "sqlite":
+            from catalog_db import SqliteCatalog
+
+            return SqliteCatalog(self.tools_dir)
+        return ToolCatalog(self.tools_dir)
+
+    def load_config(self):
+        """加载配置文件"""
+        if os.path.exists(self.config_file):
+            with open(self.config_file, "r") as f:
+                config = json.load(f)
+                self.api_key = config.get("api_key", "")
+                self.base_url = config.get("base_url", self.base_url)
+                self.max_tokens = config.get("max_tokens", 2000)  # 加载max_tokens
+                self.stream = config.get("stream", True)
+                self.model = config.get("model", MODEL)
+                self.cache_max_entries = config.get("cache_max_entries", self.cache_max_entries)
+                self.cache_max_bytes = config.get("cache_max_bytes", self.cache_max_bytes)
+                self.concurrency = config.get("concurrency", self.concurrency)
+                self.requests_per_minute = config.get("requests_per_minute", self.requests_per_minute)
+                self.tokens_per_minute = config.get("tokens_per_minute", self.tokens_per_minute)
+                self.watch_tools_dir = config.get("watch_tools_dir", self.watch_tools_dir)
+                self.run_timeout = config.get("run_timeout", self.run_timeout)
+                self.warm_pool = config.get("warm_pool", self.warm_pool)
+                self.modify_mode = config.get("modify_mode", self.modify_mode)
+                self.request_timeout = config.get("request_timeout", self.request_timeout)
+                self.max_retries = config.get("max_retries", self.max_retries)
+                self.perf_log = config.get("perf_log", self.perf_log)
+                self.validation_retries = config.get("validation_retries", self.validation_retries)
+                self.max_continuations = config.get("max_continuations", self.max_continuations)
+                self.adaptive_max_tokens = config.get("adaptive_max_tokens", self.adaptive_max_tokens)
+                self.few_shot_tools = config.get("few_shot_tools", self.few_shot_tools)
+                self.duplicate_threshold = config.get("duplicate_threshold", self.duplicate_threshold)
+                self.history_max_revisions = config.get("history_max_revisions", self.history_max_revisions)
+                self.auto_install_dependencies = config.get("auto_install_dependencies", self.auto_install_dependencies)
+                self.hedge_candidates = config.get("hedge_candidates", self.hedge_candidates)
+                self.hedge_models = config.get("hedge_models", self.hedge_models)
+                self.hedge_temperatures = config.get("hedge_temperatures", self.hedge_temperatures)
+                self.hedge_delay = config.get("hedge_delay", self.hedge_delay)
+                self.batch_workers = config.get("batch_workers", self.batch_workers)
+                self.catalog_backend = config.get("catalog_backend", self.catalog_backend)
+
+    def save_config(self):
+        """保存配置文件"""
+        config = {
+            "api_key": self.api_key,
+            "base_url": self.base_url,
+            "max_tokens": self.max_tokens,  # 保存max_tokens
+            "stream": self.stream,
+            "model": self.model,
+            "cache_max_entries": self.cache_max_entries,
+            "cache_max_bytes": self.cache_max_bytes,
+            "concurrency": self.concurrency,
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "watch_tools_dir": self.watch_tools_dir,
+            "run_timeout": self.run_timeout,
+            "warm_pool": self.warm_pool,
+            "modify_mode": self.modify_mode,
+            "request_timeout": self.request_timeout,
+            "max_retries": self.max_retries,
+            "perf_log": self.perf_log,
+            "validation_retries": self.validation_retries,
+            "max_continuations": self.max_continuations,
+            "adaptive_max_tokens": self.adaptive_max_tokens,
+            "few_shot_tools": self.few_shot_tools,
+            "duplicate_threshold": self.duplicate_threshold,
+            "history_max_revisions": self.history_max_revisions,
+            "auto_install_dependencies": self.auto_install_dependencies,
+            "hedge_candidates": self.hedge_candidates,
+            "hedge_models": self.hedge_models,
+            "hedge_temperatures": self.hedge_temperatures,
+            "hedge_delay": self.hedge_delay,
+            "batch_workers": self.batch_workers,
+            "catalog_backend": self.catalog_backend
+        }
+        with open(self.config_file, "w") as f:
+            json.dump(config, f, indent=4)
+
+    @property
+    def response_cache(self):
+        """生成结果缓存，保存在配置文件所在目录（首次使用时创建）"""
+        if self._response_cache is None:
+            from response_cache import CACHE_DIRNAME, ResponseCache
+
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(self.config_file)), CACHE_DIRNAME)
+            self._response_cache = ResponseCache(cache_dir, self.cache_max_entries, self.cache_max_bytes)
+        return self._response_cache
+
+    @property
+    def token_budget(self):
+        """max_tokens 的估计器，历史记录保存在配置文件所在目录（首次使用时加载）"""
+        if self._token_budget is None:
+            from token_budget import BUDGET_FILENAME, TokenBudget
+
+            budget_file = os.path.join(os.path.dirname(os.path.abspath(self.config_file)), BUDGET_FILENAME)
+            self._token_budget = TokenBudget(budget_file)
+        return self._token_budget
+
+    def estimate_max_tokens(self, kind, input_text):
+        """本次请求使用的 max_tokens：开启 adaptive_max_tokens 时按历史估计，不超过配置的 max_tokens"""
+        if not self.adaptive_max_tokens:
+            return self.max_tokens
+        from token_budget import approx_tokens
+
+        return self.token_budget.estimate(kind, approx_tokens(input_text), self.max_tokens)
+
+    def _record_tokens(self, kind, input_text, finish_reason, completion_tokens):
+        """记录完整回复实际输出的 token 数，供之后估计 max_tokens"""
+        if not self.adaptive_max_tokens or finish_reason == "length":
+            return
+        from token_budget import approx_tokens
+
+        self.token_budget.record(kind, approx_tokens(input_text), completion_tokens)
+
+    @property
+    def api_client(self):
+        """按当前配置创建的接口客户端，配置变化后自动重建
+
+        所有请求（包括校验重试、续写和多个候选）共用 rate_limiter，按配置的每分钟请求数和 token 数限速。
+        """
+        config = (self.api_key, self.base_url, self.request_timeout, self.max_retries)
+        with self._api_client_lock:
+            if self.rate_limiter is None:
+                from job_queue import RateLimiter
+
+                self.rate_limiter = RateLimiter()
+            self.rate_limiter.requests_per_minute = self.requests_per_minute
+            self.rate_limiter.tokens_per_minute = self.tokens_per_minute
+            if self._api_client is None or self._api_client_config != config:
+                from api_client import APIClient
+
+                if self._api_client is not None:
+                    self._api_client.close()
+                self._api_client = APIClient(
+                    self.api_key, self.base_url,
+                    timeout=self.request_timeout,
+                    max_retries=self.max_retries,
+                    rate_limiter=self.rate_limiter
+                )
+                self._api_client_config = config
+            return self._api_client
+
+    # ---- 工具目录 ----
+
+    def load_tools(self):
+        """加载所有工具"""
+        # 通过持久化索引加载，只有新增或修改过的文件才会重新解析
+        with self.instrumentation.span(SPAN_CATALOG_SCAN):
+            self.tools = self.catalog.scan()
+        if self._search_index is not None:
+            self._search_index.sync(self.catalog.snapshot())
+        if self._duplicate_index is not None:
+            self._duplicate_index.sync(self._duplicate_texts())
+        return self.tools
+
+    def list_tools(self, offset=0, limit=None, sort="name", descending=False):
+        """按名称或创建时间排序并分页返回工具记录 [(工具名称, 记录)]，SQLite 索引时由数据库完成"""
+        if not self.tools:
+            self.load_tools()
+        return self.catalog.page(offset, limit, sort=sort, descending=descending)
+
+    def migrate_catalog(self):
+        """把工具目录迁移到 SQLite 索引和分片目录并保存配置，返回迁移的工具数"""
+        from catalog_db import SqliteCatalog
+
+        catalog = SqliteCatalog(self.tools_dir)
+        with self.instrumentation.span(SPAN_CATALOG_SCAN):
+            migrated = catalog.migrate()
+        self.catalog = catalog
+        self.catalog_backend = "sqlite"
+        self.save_config()
+        self.load_tools()
+        return migrated
+
+    def apply_file_changes(self, filenames):
+        """根据工具目录中变化的文件增量更新工具列表，返回是否有变化"""
+        changed = self.catalog.update_files(filenames)
+        self._apply_catalog_changes(changed)
+        return bool(changed)
+
+    def _apply_catalog_changes(self, changed):
+        """把目录中变化的工具同步到工具列表、搜索索引和相似工具索引"""
+        if changed and self._search_index is not None:
+            self._search_index.update(self.catalog.snapshot(changed))
+        for filename in changed:
+            tool_name = filename[:-3]
+            record = self.catalog.record(filename)
+            if record is None:
+                self.tools.pop(tool_name, None)
+            else:
+                self.tools[tool_name] = record
+            if self._duplicate_index is not None:
+                if record is None:
+                    self._duplicate_index.remove_tool(tool_name)
+                else:
+                    self._duplicate_index.set_tool(tool_name, self._tool_texts(tool_name, record))
+
+    @property
+    def search_index(self):
+        """工具的全文搜索索引，首次使用时加载并与工具目录同步，之后随工具列表增量更新"""
+        with self._search_index_lock:
+            if self._search_index is None:
+                from search_index import SearchIndex
+
+                if not self.tools:
+                    self.load_tools()
+                search_index = SearchIndex(self.tools_dir)
+                with self.instrumentation.span(SPAN_SEARCH_INDEX):
+                    search_index.sync(self.catalog.snapshot())
+                self._search_index = search_index
+                # 建立索引期间工具目录可能又有变化
+                search_index.sync(self.catalog.snapshot())
+            return self._search_index
+
+    def search_tools(self, query, limit=None):
+        """按名称、描述和源代码搜索工具，返回按相关度排序的工具名称"""
+        search_index = self.search_index
+        with self.instrumentation.span(SPAN_SEARCH_QUERY):
+            return search_index.search(query, limit)
+
+    @property
+    def request_store(self):
+        """生成每个工具时的原始需求文本（首次使用时加载）"""
+        if self._request_store is None:
+            from dedup import RequestStore
+
+            self._request_store = RequestStore(self.tools_dir)
+        return self._request_store
+
+    def _tool_texts(self, tool_name, tool_info):
+        """用于查找相似工具的文本：工具描述（没有描述时为名称）和生成时的需求"""
+        return [tool_info.get("description") or tool_name] + self.request_store.get(tool_name)
+
+    def _duplicate_texts(self):
+        return {tool_name: self._tool_texts(tool_name, tool_info) for tool_name, tool_info in list(self.tools.items())}
+
+    @property
+    def duplicate_index(self):
+        """相似需求的检测索引，首次使用时建立，之后随工具列表增量更新"""
+        with self._duplicate_index_lock:
+            if self._duplicate_index is None:
+                from dedup import DuplicateIndex
+
+                if not self.tools:
+                    self.load_tools()
+                duplicate_index = DuplicateIndex()
+                duplicate_index.sync(self._duplicate_texts())
+                self._duplicate_index = duplicate_index
+            return self._duplicate_index
+
+    def find_similar_tools(self, request_text, limit=5):
+        """返回与需求相似的已有工具 [(工具名称, 相似度)]，按相似度从高到低排列"""
+        duplicate_index = self.duplicate_index
+        with self.instrumentation.span(SPAN_DUPLICATE_CHECK):
+            return duplicate_index.query(request_text, self.duplicate_threshold, limit)
+
+    def watch_tools(self, on_change, **kwargs):
+        """启动工具目录监视，目录变化时在后台线程中调用 on_change(changes)
+
+        changes 交给 apply_file_changes() 增量更新；为 None 时需要调用 load_tools() 重新扫描。
+        """
+        from watcher import ToolsWatcher
+
+        if self.catalog_backend == "sqlite":
+            from catalog_db import SHARDS_DIRNAME
+
+            # 分片存放的工具文件位于 shards 的各个子目录中
+            kwargs.setdefault("shard_dir", os.path.join(self.tools_dir, SHARDS_DIRNAME))
+        watcher = ToolsWatcher(self.tools_dir, on_change, **kwargs)
+        watcher.start()
+        return watcher
+
+    def get_tool_metadata(self, tool_path):
+        """从工具文件中提取元数据"""
+        return parse_tool_metadata(tool_path)
+
+    def tool_path(self, tool_name):
+        """返回工具文件路径"""
+        return self.catalog.tool_path(tool_name)
+
+    def tool_exists(self, tool_name):
+        """工具是否已存在"""
+        return os.path.exists(self.tool_path(tool_name))
+
+    def get_tool(self, tool_name):
+        """返回工具记录，不存在时抛出 KeyError"""
+        tool_info = self.tools.get(tool_name)
+        if tool_info is None:
+            self.load_tools()
+            tool_info = self.tools.get(tool_name)
+        if tool_info is None:
+            raise KeyError(f"工具 '{tool_name}' 不存在")
+        return tool_info
+
+    # ---- 生成与修改 ----
+
+    def prompt_examples(self):
+        """按 few_shot_tools 的顺序读取示例工具，已不存在的工具被忽略"""
+        from prompts import load_examples
+
+        tools = []
+        for tool_name in self.few_shot_tools:
+            try:
+                tools.append(self.get_tool(tool_name))
+            except KeyError:
+                print(f"示例工具 '{tool_name}' 不存在，已忽略")
+        return load_examples(tools)
+
+    def generate_tool_code(self, request_text, max_tokens=None, stream=False, bypass_cache=False, on_delta=None, cancel_event=None,
+                           on_retry=None):
+        """请求模型生成工具代码（优先使用缓存），返回去除代码块标记并通过校验的代码
+
+        max_tokens 为空时按 estimate_max_tokens() 估计。
+        """
+        from prompts import build_generate_messages
+        from response_cache import make_cache_key
+        from token_budget import KIND_GENERATE
+
+        # 相同的需求直接使用缓存的代码（缓存键使用 max_tokens 上限，与每次估计的预算无关）
+        cache_key = make_cache_key(request_text, self.model, self.base_url, max_tokens or self.max_tokens)
+        tool_code = None if bypass_cache else self.response_cache.get(cache_key)
+        if tool_code is not None and not validate_tool_code(tool_code):
+            if on_delta:
+                on_delta(tool_code)
+            return tool_code
+
+        messages = build_generate_messages(request_text, self.prompt_examples())
+        tool_code = self.request_valid_code(
+            messages, KIND_GENERATE, request_text,
+            max_tokens=max_tokens,
+            stream=stream,
+            on_delta=on_delta,
+            cancel_event=cancel_event,
+            on_retry=on_retry
+        )
+        self.response_cache.put(cache_key, tool_code)
+        return tool_code
+
+    def request_valid_code(self, messages, kind, input_text, max_tokens=None, stream=False, on_delta=None,
+                           cancel_event=None, on_retry=None):
+        """请求模型生成代码并在保存前校验
+
+        kind 和 input_text（需求或现有代码）用于估计 max_tokens 并记录实际用量；
+        回复被截断时先自动续写（最多 max_continuations 次）。
+        hedge_candidates 大于 1 时每次同时请求多个候选（见 request_hedged_code）。
+        未通过校验（被截断、无法编译、缺少 main() 或元数据）时调用 on_retry(问题列表)，
+        把代码和问题反馈给模型重新生成，最多 validation_retries 次，仍未通过时抛出 ToolValidationError。
+        """
+        max_tokens = max_tokens or self.estimate_max_tokens(kind, input_text)
+        for attempt in range(self.validation_retries + 1):
+            if self.hedge_candidates > 1:
+                tool_code, finish, problems = self.request_hedged_code(messages, max_tokens, on_delta, cancel_event)
+            else:
+                tool_code, finish, problems = self._request_candidate(
+                    messages, max_tokens, self.model, None, stream, on_delta, cancel_event
+                )
+            self._record_tokens(kind, input_text, finish.get("reason"), finish.get("tokens"))
+            if not problems:
+                return tool_code
+            if attempt == self.validation_retries:
+                raise ToolValidationError(problems, tool_code)
+            print(f"生成的代码未通过校验，重新生成: {'；'.join(problems)}")
+            if on_retry:
+                on_retry(problems)
+            messages = build_fix_messages(messages, tool_code, problems)
+
+    def _request_candidate(self, messages, max_tokens, model, params, stream, on_delta, cancel_event):
+        """请求一次代码并校验，返回 (代码, {"reason", "tokens"}, 问题列表)"""
+        finish = {}
+        tool_code = request_completion(
+            self.api_client, messages, max_tokens,
+            model=model,
+            stream=stream,
+            on_delta=on_delta,
+            cancel_event=cancel_event,
+            instrumentation=self.instrumentation,
+            on_finish=lambda reason, tokens: finish.update(reason=reason, tokens=tokens),
+            max_continuations=self.max_continuations,
+            params=params
+        )
+        with self.instrumentation.span(SPAN_VALIDATE):
+            problems = validate_tool_code(tool_code, finish.get("reason"))
+        return tool_code, finish, problems
+
+    def request_hedged_code(self, messages, max_tokens, on_delta=None, cancel_event=None):
+        """同时请求 hedge_candidates 个候选，每个候选完成后立即校验，第一个通过的胜出，其余被取消
+
+        候选按 hedge_models 和 hedge_temperatures 依次使用不同的模型和温度。候选都以流式请求，
+        取消时连接立即关闭；多个候选的输出无法交错显示，胜出的代码完成后一次性交给 on_delta。
+        全部未通过时返回最先完成的候选，由调用方反馈问题后重新生成。
+        """
+        from hedging import candidate_settings, first_valid
+
+        settings = candidate_settings(self.hedge_candidates, self.model, self.hedge_models, self.hedge_temperatures)
+
+        def make_task(model, params):
+            def task(stop):
+                tool_code, finish, problems = self._request_candidate(
+                    messages, max_tokens, model, params, True, None, stop
+                )
+                return (tool_code, finish), problems
+            return task
+
+        with self.instrumentation.span(SPAN_HEDGE, candidates=len(settings)):
+            index, (tool_code, finish), problems = first_valid(
+                [make_task(model, params) for model, params in settings],
+                cancel_event=cancel_event,
+                delay=self.hedge_delay
+            )
+        if not problems:
+            model, params = settings[index]
+            print(f"候选 {index + 1}（{model}{'，' + str(params) if params else ''}）最先通过校验")
+        if on_delta:
+            on_delta(tool_code)
+        return tool_code, finish, problems
+
+    def save_generated_tool(self, tool_code, request_text=None):
+        """保存生成的工具代码，返回工具名称（名称已存在时自动追加序号）
+
+        提供 request_text 时同时记录需求文本，之后相似的需求可以找到这个工具。
+        """
+        # 提取工具名称
+        with self.instrumentation.span(SPAN_NAME_EXTRACT):
+            base_name = self.extract_tool_name(tool_code)
+        if not base_name:
+            base_name = f"tool_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+        # 以独占方式分配名称并创建文件，避免并发生成的同名工具互相覆盖
+        tool_name, tool_path = self.catalog.reserve(base_name)
+        with self.instrumentation.span(SPAN_FILE_WRITE), open(tool_path, "w", encoding="utf-8") as f:
+            f.write(tool_code)
+        precompile(tool_path)
+        if request_text:
+            self.request_store.add(tool_name, request_text)
+        # 在工具箱之外删除的同名工具可能留下了版本历史，新工具从第一个版本开始
+        self.history.remove(tool_name)
+        self.scan_dependencies(tool_name, resolve=True)
+        self.record_revision(tool_name, tool_code, "generate", prompt=request_text, model=self.model)
+        return tool_name
+
+    def generate_tool(self, request_text, max_tokens=None, stream=False, bypass_cache=False, on_delta=None, cancel_event=None,
+                      on_retry=None, allow_duplicate=False):
+        """生成并保存新工具，返回工具名称
+
+        请求模型之前先查找相似的已有工具，找到时抛出 SimilarToolExists（allow_duplicate 为 True 时不检查）。
+        """
+        if not allow_duplicate and self.duplicate_threshold:
+            from dedup import SimilarToolExists
+
+            matches = self.find_similar_tools(request_text)
+            if matches:
+                raise SimilarToolExists(matches)
+
+        tool_code = self.generate_tool_code(
+            request_text, max_tokens,
+            stream=stream,
+            bypass_cache=bypass_cache,
+            on_delta=on_delta,
+            cancel_event=cancel_event,
+            on_retry=on_retry
+        )
+        tool_name = self.save_generated_tool(tool_code, request_text)
+        # 立即加入工具列表和索引，紧接着提交的相似需求也能找到它
+        self.apply_file_changes([f"{tool_name}.py"])
+        return tool_name
+
+    def modify_tool(self, tool_name, modify_prompt, current_code=None, stream=False, on_delta=None, cancel_event=None,
+                    on_fallback=None, on_retry=None):
+        """根据修改提示修改工具代码并保存，返回修改后的代码
+
+        modify_mode 为 "patch" 时先让模型只返回修改块并在本地应用，修改块无法应用或
+        应用后未通过校验时调用 on_fallback(原因)，然后退回完整重新生成。
+        完整重新生成的代码同样先校验，未通过时调用 on_retry(问题列表) 并重新生成。
+        """
+        tool_info = self.get_tool(tool_name)
+
+        # 读取当前工具代码
+        if current_code is None:
+            with open(tool_info["path"], "r", encoding="utf-8") as f:
+                current_code = f.read()
+
+        from token_budget import KIND_MODIFY, KIND_PATCH
+
+        if self.modify_mode == "patch":
+            from patching import PatchError, apply_patch, build_patch_messages
+
+            finish = {}
+            response = request_completion(
+                self.api_client, build_patch_messages(modify_prompt, current_code),
+                self.estimate_max_tokens(KIND_PATCH, current_code),
+                model=self.model,
+                stream=stream,
+                on_delta=on_delta,
+                cancel_event=cancel_event,
+                raw=True,
+                instrumentation=self.instrumentation,
+                on_finish=lambda reason, tokens: finish.update(reason=reason, tokens=tokens),
+                max_continuations=self.max_continuations
+            )
+            self._record_tokens(KIND_PATCH, current_code, finish.get("reason"), finish.get("tokens"))
+            try:
+                modified_code = apply_patch(current_code, response)
+                with self.instrumentation.span(SPAN_VALIDATE):
+                    problems = validate_tool_code(modified_code, finish.get("reason"))
+                if problems:
+                    raise PatchError("；".join(problems))
+            except PatchError as e:
+                print(f"应用修改块失败，改为完整重新生成: {str(e)}")
+                if on_fallback:
+                    on_fallback(str(e))
+            else:
+                self._write_tool(tool_info["path"], modified_code)
+                self.record_revision(tool_name, modified_code, "patch", prompt=modify_prompt, model=self.model,
+                                     previous_code=current_code)
+                return modified_code
+
+        # 构造修改请求
+        from prompts import build_modify_messages
+
+        messages = build_modify_messages(modify_prompt, current_code, self.prompt_examples())
+        modified_code = self.request_valid_code(
+            messages, KIND_MODIFY, current_code,
+            stream=stream,
+            on_delta=on_delta,
+            cancel_event=cancel_event,
+            on_retry=on_retry
+        )
+
+        # 保存修改后的代码
+        self._write_tool(tool_info["path"], modified_code)
+        self.record_revision(tool_name, modified_code, "modify", prompt=modify_prompt, model=self.model,
+                             previous_code=current_code)
+        return modified_code
+
+    def _write_tool(self, tool_path, tool_code):
+        """覆盖已有工具的代码，更新字节码缓存和依赖记录"""
+        with self.instrumentation.span(SPAN_FILE_WRITE), open(tool_path, "w", encoding="utf-8") as f:
+            f.write(tool_code)
+        precompile(tool_path)
+        self.scan_dependencies(os.path.basename(tool_path)[:-3], resolve=True)
+
+    # ---- 第三方依赖 ----
+
+    @property
+    def dependencies(self):
+        """工具共用的第三方库环境，位于配置文件所在目录的 tool_env（首次使用时加载）"""
+        if self._dependencies is None:
+            from dependencies import ENV_DIRNAME, DependencyManager
+
+            env_dir = os.path.join(os.path.dirname(os.path.abspath(self.config_file)), ENV_DIRNAME)
+            self._dependencies = DependencyManager(env_dir)
+        return self._dependencies
+
+    def scan_dependencies(self, tool_name, resolve=False):
+        """静态扫描工具导入的第三方模块（文件没有变化时使用记录），返回模块列表
+
+        resolve 为 True 时（保存或导入工具时）同时检查这些模块是否可用并记录，之后运行工具时不再检查。
+        """
+        try:
+            modules = self.dependencies.scan_file(tool_name, self.tool_path(tool_name), local_names=self.tools)
+        except OSError as e:
+            print(f"扫描工具依赖失败: {str(e)}")
+            return []
+        if resolve:
+            self.dependencies.missing([tool_name])
+        return modules
+
+    def missing_dependencies(self, tool_names=None, include_failed=False, recheck=False):
+        """返回工具（默认全部）缺少的第三方包 {包名: [工具名称]}
+
+        之前安装失败的包默认不再列出；依赖已记录为全部可用、代码也没有变化的工具不再检查，recheck 为 True 时重新检查。
+        """
+        if tool_names is None:
+            tool_names = sorted(self.load_tools())
+        for tool_name in tool_names:
+            self.scan_dependencies(tool_name)
+        return self.dependencies.missing(tool_names, include_failed=include_failed, recheck=recheck)
+
+    def install_dependencies(self, tool_names=None, retry_failed=False, offline=False):
+        """一次性安装工具（默认全部）缺少的第三方包，返回 {"installed", "failed"}"""
+        missing = self.missing_dependencies(tool_names, include_failed=retry_failed, recheck=retry_failed)
+        if missing:
+            print(f"正在安装工具依赖: {', '.join(sorted(missing))}")
+        result = self.dependencies.install(missing, offline=offline)
+        if result["installed"]:
+            # 确认刚安装过依赖的工具已全部可用并记录下来
+            self.dependencies.missing(sorted({tool for package in result["installed"] for tool in missing[package]}))
+        return result
+
+    def _tool_env(self):
+        """运行工具时额外的环境变量：共享的第三方库目录，以及分片存放时用于工具互相导入的目录数据库"""
+        from tool_runner import SITE_ENV_VAR, CATALOG_ENV_VAR
+
+        env = {SITE_ENV_VAR: self.dependencies.site_dir}
+        if self.catalog_backend == "sqlite":
+            env[CATALOG_ENV_VAR] = self.catalog.db_file
+        return env
+
+    def _prepare_run(self, tool_name):
+        """运行工具前安装它缺少的依赖
+
+        依赖已记录为全部可用且代码没有变化时只需比较文件的 mtime 和大小，不再检查模块。
+        """
+        if not self.auto_install_dependencies:
+            return
+        result = self.install_dependencies([tool_name])
+        for package, reason in result["failed"].items():
+            print(f"安装 {package} 失败: {reason}")
+
+    # ---- 版本历史 ----
+
+    @property
+    def history(self):
+        """工具代码的版本历史，位于工具目录下的 .history（首次使用时创建）"""
+        if self._history is None:
+            from history import ToolHistory
+
+            self._history = ToolHistory(self.tools_dir, max_revisions=self.history_max_revisions)
+        return self._history
+
+    def record_revision(self, tool_name, tool_code, action, prompt=None, model=None, previous_code=None):
+        """记录工具的新版本，返回版本记录
+
+        工具还没有历史时先把 previous_code（修改前的代码）记录为原始版本，之后可以恢复到它。
+        记录失败只打印错误，不影响工具的保存。
+        """
+        from history import HistoryError
+
+        try:
+            if previous_code is not None and not self.history.revisions(tool_name):
+                self.history.record(tool_name, previous_code, "original")
+            return self.history.record(tool_name, tool_code, action, prompt=prompt, model=model)
+        except (OSError, HistoryError) as e:
+            print(f"记录历史版本失败: {str(e)}")
+            return None
+
+    def tool_revisions(self, tool_name):
+        """返回工具的历史版本（从旧到新）"""
+        return self.history.revisions(tool_name)
+
+    def diff_revision(self, tool_name, rev, other_rev=None):
+        """返回两个版本之间的差异，other_rev 为空时与当前代码比较"""
+        if other_rev is not None:
+            return self.history.diff(tool_name, rev, other_rev)
+        with open(self.get_tool(tool_name)["path"], "r", encoding="utf-8") as f:
+            current_code = f.read()
+        return self.history.diff(tool_name, rev, current_code, new_label=f"{tool_name} 当前代码")
+
+    def restore_revision(self, tool_name, rev):
+        """把工具恢复到某个历史版本（恢复本身也记录为新版本），返回恢复后的代码"""
+        tool_info = self.get_tool(tool_name)
+        tool_code = self.history.read_revision(tool_name, rev)
+        with open(tool_info["path"], "r", encoding="utf-8") as f:
+            current_code = f.read()
+        self._write_tool(tool_info["path"], tool_code)
+        self.record_revision(tool_name, tool_code, "restore", prompt=f"恢复到版本 {rev}", previous_code=current_code)
+        self.apply_file_changes([f"{tool_name}.py"])
+        return tool_code
+
+    def compact_history(self):
+        """清理历史版本，返回 (裁掉的版本数, 删除的对象数)"""
+        self.history.max_revisions = self.history_max_revisions
+        return self.history.compact()
+
+    def create_generation_queue(self, on_update=None, allow_duplicate=False):
+        """创建批量生成队列，并发数和限速取自配置
+
+        allow_duplicate 为 False 时（任务本身也没有设置 allow_duplicate），与已有工具相似的需求不请求模型，
+        任务以 SimilarToolExists 的信息失败。
+        """
+        from job_queue import GenerationQueue
+
+        return GenerationQueue(
+            lambda job: self.generate_tool(job.request_text, allow_duplicate=allow_duplicate or job.allow_duplicate),
+            concurrency=self.concurrency,
+            on_update=on_update
+        )
+
+    def set_batch_limits(self, queue, concurrency, requests_per_minute, tokens_per_minute):
+        """修改批量生成的并发数和限速并保存配置"""
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        queue.set_concurrency(concurrency)
+        self.save_config()
+
+    def extract_tool_name(self, code):
+        """从代码中提取工具名称"""
+        try:
+            # 优先尝试从main函数的docstring中提取
+            main_func_match = re.search(r'def\s+main\s*\(\s*\):\s*\"\"\"\s*(.*?)\s*\"\"\"', code, re.DOTALL)
+            if main_func_match:
+                docstring = main_func_match.group(1).strip()
+                first_line = docstring.split('\n')[0].strip()
+                if first_line:
+                    return re.sub(r'[^a-zA-Z0-9_]', '', first_line.replace('  ', '_')).lower() or f"tool_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+            # 尝试从描述中提取
+            desc_match = re.search(r'"description":\s*"([^"]+)"', code)
+            if desc_match:
+                desc = desc_match.group(1).strip()
+                if desc:
+                    return re.sub(r'[^a-zA-Z0-9_]', '', desc.split()[0].replace('  ', '_')).lower()
+
+            # 如果以上方法都失败，使用随机名称
+            return f"tool_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        except:
+            return f"tool_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    # ---- 运行与管理 ----
+
+    def run_tool(self, tool_name):
+        """运行工具，非 Windows 系统上等待工具退出并返回退出码"""
+        tool_path = self.tool_path(tool_name)
+        if not os.path.exists(tool_path):
+            raise FileNotFoundError(f"工具 '{tool_name}' 不存在")
+        self._prepare_run(tool_name)
+
+        import subprocess
+        from process_manager import TOOL_RUNNER
+        command = [sys.executable, TOOL_RUNNER, tool_path]
+        env = dict(os.environ, **self._tool_env())
+        if sys.platform == "win32":
+            # 在新的控制台窗口中运行，与双击脚本一致
+            subprocess.Popen(command, env=env, creationflags=subprocess.CREATE_NEW_CONSOLE)
+            return None
+        return subprocess.run(command, env=env).returncode
+
+    def create_process_manager(self, on_output=None, on_exit=None):
+        """创建后台运行工具的进程管理器，运行记录保存在配置文件所在目录"""
+        from process_manager import ProcessManager
+
+        pool = None
+        if self.warm_pool:
+            import warm_pool
+
+            if warm_pool.is_supported():
+                pool = warm_pool.WarmPool()
+                # 在后台预热，第一次运行工具时无需等待
+                threading.Thread(target=self._start_warm_pool, args=(pool,), daemon=True).start()
+            else:
+                print("当前系统不支持预热解释器池，改用普通方式运行工具")
+
+        history_file = os.path.join(os.path.dirname(os.path.abspath(self.config_file)), "run_history.jsonl")
+        return ProcessManager(history_file, on_output=on_output, on_exit=on_exit, warm_pool=pool, env=self._tool_env())
+
+    @staticmethod
+    def _start_warm_pool(pool):
+        try:
+            pool.start()
+        except (OSError, RuntimeError) as e:
+            print(f"启动预热解释器池失败: {str(e)}")
+
+    def start_tool(self, process_manager, tool_name, timeout=None):
+        """在后台启动工具，返回 ToolRun"""
+        tool_path = self.tool_path(tool_name)
+        if not os.path.exists(tool_path):
+            raise FileNotFoundError(f"工具 '{tool_name}' 不存在")
+        if timeout is None:
+            timeout = self.run_timeout or None
+        self._prepare_run(tool_name)
+        return process_manager.start(tool_name, tool_path, timeout=timeout)
+
+    def run_batch(self, tool_name, inputs, workers=None, timeout=None, results_file=None, on_result=None,
+                  cancel_event=None):
+        """对每条输入（见 batch_run.load_inputs）各运行一次工具，返回 (结果列表, 汇总, 结果文件路径)
+
+        工具结尾的阻塞语句自动失效；并发数和超时默认取自配置，结果默认保存到配置文件所在目录的 batch_results。
+        """
+        from batch_run import BatchRunner
+
+        tool_path = self.tool_path(tool_name)
+        if not os.path.exists(tool_path):
+            raise FileNotFoundError(f"工具 '{tool_name}' 不存在")
+        if results_file is None:
+            results_dir = os.path.join(os.path.dirname(os.path.abspath(self.config_file)), "batch_results")
+            os.makedirs(results_dir, exist_ok=True)
+            results_file = os.path.join(results_dir, f"{tool_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+        self._prepare_run(tool_name)
+
+        pool = None
+        if self.warm_pool:
+            import warm_pool
+
+            if warm_pool.is_supported():
+                pool = warm_pool.WarmPool()
+                try:
+                    pool.start()
+                except (OSError, RuntimeError) as e:
+                    print(f"启动预热解释器池失败: {str(e)}")
+                    pool = None
+        runner = BatchRunner(tool_path, workers=workers or self.batch_workers,
+                             timeout=timeout if timeout is not None else self.run_timeout,
+                             env=self._tool_env(), warm_pool=pool)
+        try:
+            results, summary = runner.run(inputs, results_file, on_result=on_result, cancel_event=cancel_event)
+        finally:
+            if pool is not None:
+                pool.close()
+        return results, summary, results_file
+
+    def delete_tool(self, tool_name):
+        """删除工具"""
+        tool_path = self.tool_path(tool_name)
+        os.remove(tool_path)
+        remove_bytecode(tool_path)
+        self.apply_file_changes([f"{tool_name}.py"])
+        self.request_store.remove(tool_name)
+        self.dependencies.remove(tool_name)
+        self.history.remove(tool_name)
+        if self._duplicate_index is not None:
+            self._duplicate_index.remove_tool(tool_name)
+
+    def validate_tools(self, tool_names=None):
+        """校验已保存的工具（默认全部）并预编译通过的工具，返回 {工具名称: 问题列表}"""
+        from validation import validate_files
+
+        if tool_names is None:
+            tool_names = sorted(self.load_tools())
+        results = validate_files([self.tool_path(tool_name) for tool_name in tool_names])
+        return {tool_name: results[self.tool_path(tool_name)] for tool_name in tool_names}
+
+    def export_tool(self, tool_name, export_path):
+        """导出工具到指定路径"""
+        shutil.copyfile(self.tool_path(tool_name), export_path)
+
+    def import_tool(self, import_path, overwrite=False):
+        """导入工具，返回工具名称；已存在且不允许覆盖时抛出 FileExistsError"""
+        # 获取工具名称
+        tool_name = os.path.basename(import_path)[:-3]
+        if not tool_name:
+            raise ValueError("无效的文件名")
+
+        # 检查是否已存在
+        tool_path = self.tool_path(tool_name)
+        if os.path.exists(tool_path) and not overwrite:
+            raise FileExistsError(f"工具 '{tool_name}' 已存在")
+
+        # 复制文件
+        shutil.copyfile(import_path, tool_path)
+        return tool_name
+
+    def export_tools(self, tool_names, bundle_path):
+        """把多个工具导出为一个压缩工具包（包含元数据清单），返回导出的工具数"""
+        from bundle import export_bundle
+
+        return export_bundle({tool_name: self.get_tool(tool_name) for tool_name in tool_names}, bundle_path)
+
+    def find_import_conflicts(self, import_paths):
+        """返回待导入的文件或工具包中与现有工具同名的工具名称"""
+        from bundle import bundle_tool_names
+
+        names = []
+        for import_path in import_paths:
+            if import_path.lower().endswith(".zip"):
+                names.extend(bundle_tool_names(import_path))
+            else:
+                names.append(os.path.basename(import_path)[:-3])
+        return [tool_name for tool_name in names if self.tool_exists(tool_name)]
+
+    def import_tools(self, import_paths, policy="skip"):
+        """批量导入 .py 文件和工具包（.zip），policy 为同名时的处理方式 skip/overwrite/rename
+
+        全部导入后一次性更新工具列表，返回 {"imported", "skipped", "renamed", "failed"}。
+        """
+        from bundle import import_bundle, import_file
+
+        result = {"imported": [], "skipped": [], "renamed": {}, "failed": {}}
+        try:
+            for import_path in import_paths:
+                if import_path.lower().endswith(".zip"):
+                    part = import_bundle(import_path, self.tools_dir, policy, exists=self.tool_exists)
+                    for key in ("imported", "skipped"):
+                        result[key].extend(part[key])
+                    result["renamed"].update(part["renamed"])
+                    result["failed"].update(part["failed"])
+                    continue
+                tool_name = os.path.basename(import_path)[:-3]
+                name = import_file(import_path, self.tools_dir, policy, exists=self.tool_exists)
+                if name is None:
+                    result["skipped"].append(tool_name)
+                    continue
+                result["imported"].append(name)
+                if name != tool_name:
+                    result["renamed"][tool_name] = name
+        finally:
+            # 中途出错时已经导入的工具也要反映到工具列表
+            self.apply_file_changes([f"{tool_name}.py" for tool_name in result["imported"]])
+            for tool_name in result["imported"]:
+                self.scan_dependencies(tool_name, resolve=True)
+        return result
+
+    def update_tool_info(self, tool_name, new_name, new_desc):
+        """修改工具名称和描述"""
+        if not new_name:
+            raise ValueError("工具名称不能为空")
+        tool_info = self.get_tool(tool_name)
+
+        # 如果名称改变了，需要重命名文件
+        if new_name != tool_name:
+            # 已删除的同名工具留下的版本历史不能被覆盖，也不应该接到这个工具上
+            if self.history.exists(new_name):
+                raise FileExistsError(f"工具 '{new_name}' 已有版本历史（属于之前同名的工具），请换一个名称")
+            # 新名称已存在时抛出 FileExistsError
+            old_path, _ = self.catalog.rename(tool_name, new_name)
+            remove_bytecode(old_path)
+            self.request_store.rename(tool_name, new_name)
+            self.history.rename(tool_name, new_name)
+            self.dependencies.rename(tool_name, new_name)
+
+        # 更新元数据
+        tool_path = self.tool_path(new_name)
+        with open(tool_path, "r", encoding="utf-8") as f:
+            content = f.read()
+
+        # 查找并更新元数据（没有元数据注释时插入到文件开头）
+        new_metadata = format_metadata_comment(new_name, new_desc, tool_info["created"])
+        new_content = replace_metadata_comment(content, new_metadata)
+
+        # 与生成和修改相同的保存流程：更新字节码缓存和依赖记录，再更新工具列表和搜索索引
+        self._write_tool(tool_path, new_content)
+        self.record_revision(new_name, new_content, "edit_info", previous_code=content)
+        if new_name == tool_name:
+            self.apply_file_changes([f"{tool_name}.py"])
+            return
+        changed = self.catalog.update_files([f"{tool_name}.py", f"{new_name}.py"])
+        if f"{tool_name}.py" not in changed:
+            # SqliteCatalog 改名时已经更新了记录，旧名称不会出现在变化中
+            changed.insert(0, f"{tool_name}.py")
+        self._apply_catalog_changes(changed)
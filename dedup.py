@@ -0,0 +1,223 @@
+import os
+import re
+import json
+import hashlib
+import threading
+
+REQUESTS_FILENAME = ".tool_requests.json"
+
+# 每个工具最多保存的需求文本数
+MAX_REQUESTS_PER_TOOL = 10
+
+# 按字符切分的片段长度，中文需求通常很短，3 个字符已足够区分
+SHINGLE_SIZE = 3
+
+# 签名分成 BANDS 段、每段 ROWS 个值，任意一段完全相同即成为候选；相似度为 s 时成为候选的概率为
+# 1 - (1 - s ** ROWS) ** BANDS，拐点约在 (1 / BANDS) ** (1 / ROWS) = 0.25，远低于 SIMILARITY_THRESHOLD，
+# 相似度 0.4 时约 94%、0.5 时约 99% 的文本成为候选，再由精确的 Jaccard 相似度筛选
+BANDS = 16
+ROWS = 2
+NUM_BINS = BANDS * ROWS
+
+# 候选与需求的 Jaccard 相似度达到这个值时视为重复
+SIMILARITY_THRESHOLD = 0.5
+
+_HASH_SPAN = 1 << 64
+_BIN_SPAN = _HASH_SPAN // NUM_BINS
+_WORD = re.compile(r"\w+")
+
+
+class SimilarToolExists(Exception):
+    """已有与需求相似的工具，matches 为 [(工具名称, 相似度)]，按相似度从高到低排列"""
+
+    def __init__(self, matches):
+        shown = "、".join(f"'{tool_name}'（相似度 {score:.0%}）" for tool_name, score in matches[:3])
+        super().__init__(f"已有相似的工具: {shown}")
+        self.matches = matches
+
+
+def shingles(text):
+    """把文本规范化（小写、去掉标点、合并空白）后按字符切分为重叠的片段"""
+    text = " ".join(_WORD.findall(text.lower()))
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _hash(shingle):
+    # 内置 hash() 每个进程的种子不同，这里需要稳定的哈希值
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def signature(shingle_set):
+    """单次哈希的 MinHash 签名
+
+    每个片段只计算一次哈希，按哈希值的高位分到 NUM_BINS 个区间并取区间内的最小值；
+    空区间借用右侧最近的非空区间的值（加上距离区分），两个签名对应位置相等的概率
+    近似于两个集合的 Jaccard 相似度。没有片段时返回 None。
+    """
+    if not shingle_set:
+        return None
+    bins = [None] * NUM_BINS
+    for shingle in shingle_set:
+        index, value = divmod(_hash(shingle), _BIN_SPAN)
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    filled = list(bins)
+    for index in range(NUM_BINS):
+        if bins[index] is not None:
+            continue
+        distance = 1
+        while bins[(index + distance) % NUM_BINS] is None:
+            distance += 1
+        filled[index] = bins[(index + distance) % NUM_BINS] + distance * _BIN_SPAN
+    return tuple(filled)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class DuplicateIndex:
+    """工具描述和生成需求的近似重复检测（MinHash + LSH）
+
+    每个工具可以有多段文本（名称和描述、历次的需求文本），每段文本计算一个签名，
+    签名按段放入哈希表；查询时只和至少有一段签名相同的文本计算精确的 Jaccard 相似度。
+    可以在多个线程中使用。
+    """
+
+    def __init__(self):
+        self._texts = {}     # 工具名称 -> [(片段集合, 签名)]
+        self._sources = {}   # 工具名称 -> 原始文本，文本没有变化时不必重新计算
+        self._buckets = [{} for _ in range(BANDS)]  # 第几段 -> {签名片段: {工具名称}}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._texts)
+
+    @staticmethod
+    def _bands(sig):
+        return [sig[band * ROWS:(band + 1) * ROWS] for band in range(BANDS)]
+
+    def set_tool(self, tool_name, texts):
+        """设置（替换）工具的文本"""
+        texts = tuple(texts)
+        with self._lock:
+            if self._sources.get(tool_name) == texts:
+                return
+        # 计算签名时不持有锁，写入前再检查一次
+        entries = []
+        for text in texts:
+            shingle_set = shingles(text or "")
+            sig = signature(shingle_set)
+            if sig is not None:
+                entries.append((shingle_set, sig))
+        with self._lock:
+            if self._sources.get(tool_name) == texts:
+                return
+            self._remove(tool_name)
+            self._sources[tool_name] = texts
+            if not entries:
+                return
+            self._texts[tool_name] = entries
+            for _, sig in entries:
+                for band, key in enumerate(self._bands(sig)):
+                    self._buckets[band].setdefault(key, set()).add(tool_name)
+
+    def sync(self, texts_by_tool):
+        """与 {工具名称: 文本列表} 全量同步，只重新计算文本发生变化的工具"""
+        with self._lock:
+            removed = [tool_name for tool_name in self._sources if tool_name not in texts_by_tool]
+        for tool_name in removed:
+            self.remove_tool(tool_name)
+        for tool_name, texts in texts_by_tool.items():
+            self.set_tool(tool_name, texts)
+
+    def remove_tool(self, tool_name):
+        with self._lock:
+            self._remove(tool_name)
+            self._sources.pop(tool_name, None)
+
+    def _remove(self, tool_name):
+        for _, sig in self._texts.pop(tool_name, ()):
+            for band, key in enumerate(self._bands(sig)):
+                bucket = self._buckets[band].get(key)
+                if bucket is None:
+                    continue
+                bucket.discard(tool_name)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def query(self, text, threshold=SIMILARITY_THRESHOLD, limit=5):
+        """返回与文本相似度不低于 threshold 的工具 [(工具名称, 相似度)]，按相似度从高到低排列"""
+        shingle_set = shingles(text)
+        sig = signature(shingle_set)
+        if sig is None:
+            return []
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(self._bands(sig)):
+                candidates.update(self._buckets[band].get(key, ()))
+            scores = {}
+            for tool_name in candidates:
+                score = max(jaccard(shingle_set, entry) for entry, _ in self._texts[tool_name])
+                if score >= threshold:
+                    scores[tool_name] = score
+        matches = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return matches[:limit]
+
+
+class RequestStore:
+    """保存生成每个工具时的原始需求文本，位于工具目录下的 .tool_requests.json"""
+
+    def __init__(self, tools_dir):
+        self.path = os.path.join(tools_dir, REQUESTS_FILENAME)
+        self.requests = {}  # 工具名称 -> [需求文本]
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.requests = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取工具需求记录失败: {str(e)}")
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.requests, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"保存工具需求记录失败: {str(e)}")
+
+    def get(self, tool_name):
+        with self._lock:
+            return list(self.requests.get(tool_name, ()))
+
+    def add(self, tool_name, request_text):
+        """记录工具的一条需求文本（重复的文本只保存一次）"""
+        with self._lock:
+            texts = self.requests.setdefault(tool_name, [])
+            if request_text in texts:
+                return
+            texts.append(request_text)
+            del texts[:-MAX_REQUESTS_PER_TOOL]
+            self._save()
+
+    def rename(self, tool_name, new_name):
+        with self._lock:
+            if tool_name not in self.requests:
+                return
+            self.requests[new_name] = self.requests.pop(tool_name)
+            self._save()
+
+    def remove(self, tool_name):
+        with self._lock:
+            if self.requests.pop(tool_name, None) is not None:
+                self._save()
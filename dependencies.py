@@ -0,0 +1,271 @@
+import os
+import ast
+import sys
+import json
+import threading
+import subprocess
+import importlib.util
+import importlib.machinery
+
+ENV_DIRNAME = "tool_env"
+MANIFEST_NAME = "manifest.json"
+
+# 导入名称与 pip 包名不同的常见第三方库
+IMPORT_PACKAGES = {
+    "PIL": "Pillow",
+    "cv2": "opencv-python",
+    "yaml": "PyYAML",
+    "bs4": "beautifulsoup4",
+    "sklearn": "scikit-learn",
+    "skimage": "scikit-image",
+    "docx": "python-docx",
+    "pptx": "python-pptx",
+    "dateutil": "python-dateutil",
+    "dotenv": "python-dotenv",
+    "magic": "python-magic",
+    "fitz": "PyMuPDF",
+    "Crypto": "pycryptodome",
+    "serial": "pyserial",
+    "usb": "pyusb",
+    "jwt": "PyJWT",
+    "OpenSSL": "pyOpenSSL",
+    "attr": "attrs",
+    "win32api": "pywin32",
+    "win32con": "pywin32",
+    "win32gui": "pywin32",
+    "win32clipboard": "pywin32",
+    "win32com": "pywin32",
+    "pythoncom": "pywin32",
+    "pywintypes": "pywin32",
+}
+
+# pip 报错时只保留最后这么多个字符
+_ERROR_CHARS = 500
+
+
+def _stdlib_modules():
+    names = set(sys.builtin_module_names)
+    if hasattr(sys, "stdlib_module_names"):
+        return names | set(sys.stdlib_module_names)
+    # Python 3.9 及更早的版本：列出标准库目录
+    import sysconfig
+
+    stdlib_dir = sysconfig.get_paths()["stdlib"]
+    for directory in (stdlib_dir, os.path.join(stdlib_dir, "lib-dynload")):
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.listdir(directory):
+            name = entry.split(".")[0]
+            if name.isidentifier() and entry != "site-packages":
+                names.add(name)
+    return names
+
+
+STDLIB_MODULES = _stdlib_modules() | {"__future__", "__main__"}
+
+
+def scan_imports(code):
+    """用 AST 找出代码导入的顶层模块名，包括 __import__("x") 和 importlib.import_module("x")
+
+    只做静态分析，不执行代码；代码有语法错误时抛出 SyntaxError。
+    """
+    modules = set()
+    for node in ast.walk(ast.parse(code)):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level == 0 and node.module:
+                modules.add(node.module.split(".")[0])
+        elif isinstance(node, ast.Call) and node.args and isinstance(node.args[0], ast.Constant) \
+                and isinstance(node.args[0].value, str):
+            func = node.func
+            name = func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+            if name in ("__import__", "import_module"):
+                modules.add(node.args[0].value.split(".")[0])
+    return sorted(module for module in modules if module.isidentifier())
+
+
+def third_party_modules(modules, local_names=()):
+    """去掉标准库和工具目录中的模块（其他工具），剩下需要安装的第三方模块"""
+    return [module for module in modules if module not in STDLIB_MODULES and module not in local_names]
+
+
+def package_for(module):
+    """模块对应的 pip 包名"""
+    return IMPORT_PACKAGES.get(module, module)
+
+
+class DependencyManager:
+    """工具的第三方依赖：静态扫描导入并统一安装到共享的目录
+
+    env_dir 下的 wheels/ 缓存下载或构建好的 wheel，site-packages/ 是所有工具共用的安装目录，
+    运行工具时加入模块搜索路径（见 tool_runner.SITE_ENV_VAR）。manifest.json 记录每个工具
+    扫描到的模块（按文件 mtime 和大小判断是否需要重新扫描）、依赖是否已全部可用，以及安装失败的包。
+    依赖已全部可用的工具在代码变化之前不再逐个检查模块。
+    安装时合并所有工具缺少的包，只调用一次 pip；wheel 缓存中已有的包安装时不需要联网。
+    """
+
+    def __init__(self, env_dir, python=None):
+        self.env_dir = env_dir
+        self.site_dir = os.path.join(env_dir, "site-packages")
+        self.wheel_dir = os.path.join(env_dir, "wheels")
+        self.manifest_file = os.path.join(env_dir, MANIFEST_NAME)
+        self.python = python or sys.executable
+        self.tools = {}   # 工具名称 -> {"mtime", "size", "modules": [第三方模块], "resolved": 依赖是否已全部可用}
+        self.failed = {}  # 包名 -> 安装失败的原因
+        self._lock = threading.RLock()
+        self._install_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_file):
+            return
+        try:
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.tools = manifest.get("tools", {})
+            self.failed = manifest.get("failed", {})
+        except (OSError, ValueError) as e:
+            print(f"读取依赖记录失败: {str(e)}")
+
+    def _save(self):
+        os.makedirs(self.env_dir, exist_ok=True)
+        tmp_file = self.manifest_file + ".tmp"
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"tools": self.tools, "failed": self.failed}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_file, self.manifest_file)
+        except OSError as e:
+            print(f"保存依赖记录失败: {str(e)}")
+
+    # ---- 扫描 ----
+
+    def scan_file(self, tool_name, tool_path, local_names=()):
+        """扫描工具文件导入的第三方模块（文件没有变化时直接使用记录），返回模块列表"""
+        stat = os.stat(tool_path)
+        with self._lock:
+            entry = self.tools.get(tool_name)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                return entry["modules"]
+        with open(tool_path, "r", encoding="utf-8-sig", errors="replace") as f:
+            code = f.read()
+        try:
+            modules = third_party_modules(scan_imports(code), local_names)
+        except SyntaxError:
+            # 无法解析的工具运行时也会失败，不需要安装依赖
+            modules = []
+        with self._lock:
+            self.tools[tool_name] = {"mtime": stat.st_mtime, "size": stat.st_size, "modules": modules}
+            self._save()
+        return modules
+
+    def rename(self, tool_name, new_name):
+        with self._lock:
+            if tool_name in self.tools:
+                self.tools[new_name] = self.tools.pop(tool_name)
+                self._save()
+
+    def remove(self, tool_name):
+        with self._lock:
+            if self.tools.pop(tool_name, None) is not None:
+                self._save()
+
+    # ---- 安装 ----
+
+    def is_available(self, module):
+        """模块能否在运行工具时导入：已安装在共享目录，或者运行环境中本来就有"""
+        if importlib.machinery.PathFinder.find_spec(module, [self.site_dir]) is not None:
+            return True
+        try:
+            return importlib.util.find_spec(module) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def missing(self, tool_names=None, include_failed=False, recheck=False):
+        """返回给定工具（默认全部已扫描的工具）缺少的包：{包名: [需要它的工具]}，多个工具需要的包只出现一次
+
+        已记录为依赖全部可用的工具直接跳过，recheck 为 True 时重新检查；检查后依赖全部可用的工具记录下来。
+        """
+        with self._lock:
+            names = list(self.tools) if tool_names is None else [name for name in tool_names if name in self.tools]
+            if not recheck:
+                names = [name for name in names if not self.tools[name].get("resolved")]
+            entries = {name: self.tools[name] for name in names}
+            modules = {}
+            for tool_name in names:
+                for module in self.tools[tool_name]["modules"]:
+                    modules.setdefault(module, []).append(tool_name)
+        packages = {}
+        unresolved = set()
+        for module, tools in modules.items():
+            package = package_for(module)
+            if package in self.failed and not include_failed:
+                unresolved.update(tools)
+                continue
+            if not self.is_available(module):
+                packages.setdefault(package, []).extend(tools)
+                unresolved.update(tools)
+        self._set_resolved(entries, unresolved)
+        return packages
+
+    def _set_resolved(self, entries, unresolved):
+        with self._lock:
+            changed = False
+            for tool_name, entry in entries.items():
+                resolved = tool_name not in unresolved
+                # 检查期间重新扫描过的工具（代码已变化）不更新
+                if self.tools.get(tool_name) is entry and entry.get("resolved", False) != resolved:
+                    entry["resolved"] = resolved
+                    changed = True
+            if changed:
+                self._save()
+
+    def _pip(self, *args):
+        """运行 pip，返回 (是否成功, 错误输出)"""
+        command = [self.python, "-m", "pip", "--disable-pip-version-check", *args]
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                encoding="utf-8", errors="replace")
+        return result.returncode == 0, result.stderr.strip()[-_ERROR_CHARS:]
+
+    def _build_wheels(self, packages, offline):
+        """把包及其依赖下载或构建为 wheel 放入缓存；离线时只使用缓存"""
+        args = ["wheel", "--wheel-dir", self.wheel_dir, "--find-links", self.wheel_dir]
+        if offline:
+            args.append("--no-index")
+        return self._pip(*args, *packages)
+
+    def install(self, packages, offline=False):
+        """把包统一安装到共享目录，返回 {"installed": [...], "failed": {包名: 原因}}
+
+        先把全部包一次性构建到 wheel 缓存再从缓存安装；整体失败时逐个重试，找出失败的包。
+        """
+        packages = sorted(set(packages))
+        result = {"installed": [], "failed": {}}
+        if not packages:
+            return result
+        with self._install_lock:
+            os.makedirs(self.wheel_dir, exist_ok=True)
+            ok, error = self._build_wheels(packages, offline)
+            ready = packages
+            if not ok:
+                ready = []
+                for package in packages:
+                    ok, error = self._build_wheels([package], offline)
+                    if ok:
+                        ready.append(package)
+                    else:
+                        result["failed"][package] = error
+            if ready:
+                ok, error = self._pip("install", "--no-index", "--find-links", self.wheel_dir,
+                                      "--target", self.site_dir, "--upgrade", *ready)
+                if ok:
+                    result["installed"] = ready
+                else:
+                    result["failed"].update({package: error for package in ready})
+            with self._lock:
+                for package in result["installed"]:
+                    self.failed.pop(package, None)
+                self.failed.update(result["failed"])
+                self._save()
+            importlib.invalidate_caches()
+        return result
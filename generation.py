@@ -0,0 +1,253 @@
+import time
+
+MODEL = "deepseek-chat"
+
+
+class GenerationCancelled(Exception):
+    """生成被用户取消"""
+
+
+class CodeFenceStripper:
+    """增量去除代码块标记
+
+    流式输出时逐段喂入文本，返回可以立即显示的部分：开头的 ```python 行被丢弃，
+    可能是结束标记的行会暂存到确认为止，结束标记之后的内容全部忽略。
+    """
+
+    def __init__(self):
+        self.parts = []
+        self._line = ""       # 当前未完成的行
+        self._emitted = 0     # 当前行已经输出的字符数
+        self._started = False
+        self._closed = False
+
+    @staticmethod
+    def _maybe_fence(line):
+        stripped = line.strip()
+        return stripped.startswith("```") or "```".startswith(stripped)
+
+    def _emit(self, text, out):
+        if text:
+            self._started = True
+            self.parts.append(text)
+            out.append(text)
+
+    def feed(self, chunk):
+        """喂入一段文本，返回可以立即显示的内容"""
+        out = []
+        if self._closed:
+            return ""
+        self._line += chunk
+        while "\n" in self._line:
+            line, self._line = self._line.split("\n", 1)
+            emitted, self._emitted = self._emitted, 0
+            if line.strip().startswith("```"):
+                if self._started:
+                    # 结束标记，之后的内容不再输出
+                    self._closed = True
+                    self._line = ""
+                    break
+                # 开头的 ```python 标记
+                continue
+            if not self._started and not line.strip():
+                # 丢弃代码前的空行
+                continue
+            self._emit(line[emitted:] + "\n", out)
+        if not self._closed and not self._maybe_fence(self._line):
+            self._emit(self._line[self._emitted:], out)
+            self._emitted = len(self._line)
+        return "".join(out)
+
+    def finish(self):
+        """结束输入，返回去除代码块标记后的完整代码"""
+        if not self._closed and not self._line.strip().startswith("```"):
+            self._emit(self._line[self._emitted:], [])
+        self._line = ""
+        self._closed = True
+        return "".join(self.parts).strip()
+
+
+def strip_code_fences(text):
+    """去除完整回复中的代码块标记"""
+    stripper = CodeFenceStripper()
+    stripper.feed(text)
+    return stripper.finish()
+
+
+# 回复被截断时请模型续写的提示
+CONTINUE_PROMPT = "你的回复因长度限制被截断了。请从中断的位置继续输出剩余的内容，不要重复已经输出的部分，不要添加任何解释。"
+
+# 续写开头与已有结尾重叠至少这么多字符时才视为重复并去掉
+MIN_OVERLAP = 10
+
+
+def stitch_continuation(previous, continuation):
+    """返回续写内容中应当接在 previous 之后的部分
+
+    模型续写时常常重新打开代码块，或者重复已输出内容的最后一段（例如被截断的那一行），
+    这里去掉开头的代码块标记以及与 previous 结尾重叠的部分。
+    """
+    stripped = continuation.lstrip()
+    if stripped.startswith("```"):
+        newline = stripped.find("\n")
+        continuation = "" if newline == -1 else stripped[newline + 1:]
+    for size in range(min(len(previous), len(continuation)), MIN_OVERLAP - 1, -1):
+        if previous.endswith(continuation[:size]):
+            return continuation[size:]
+    return continuation
+
+
+class ContinuationStitcher:
+    """流式续写时先缓存开头一段，确定重叠部分后再放行"""
+
+    HEAD_CHARS = 512
+
+    def __init__(self, previous):
+        self.previous = previous[-self.HEAD_CHARS:]
+        self._head = ""
+        self._done = False
+
+    def feed(self, chunk):
+        """喂入一段续写内容，返回可以接在已有内容之后的部分"""
+        if self._done:
+            return chunk
+        self._head += chunk
+        if len(self._head) < self.HEAD_CHARS:
+            return ""
+        return self.finish()
+
+    def finish(self):
+        if self._done:
+            return ""
+        self._done = True
+        return stitch_continuation(self.previous, self._head)
+
+
+def _complete_once(client, messages, max_tokens, model, stream, cancel_event, on_text, params):
+    """发送一次请求，把回复文本逐段交给 on_text，返回 (finish_reason, usage, 首个token耗时)"""
+    from api_client import APIError
+
+    start = time.perf_counter()
+    if not stream:
+        try:
+            response = client.chat_completion(messages, model, max_tokens, cancel_event=cancel_event, **params)
+        except APIError:
+            # 取消发生在等待重试时
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled("生成已取消")
+            raise
+        choice = response["choices"][0]
+        on_text(choice["message"]["content"] or "")
+        return choice.get("finish_reason"), response.get("usage"), None
+
+    response = client.stream_chat_completion(messages, model, max_tokens, cancel_event=cancel_event, **params)
+    usage = None
+    finish_reason = None
+    first_token = None
+    try:
+        for chunk in response:
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled("生成已取消")
+            # 部分服务在最后一个数据块中返回 token 用量
+            usage = chunk.get("usage") or usage
+            if not chunk.get("choices"):
+                continue
+            finish_reason = chunk["choices"][0].get("finish_reason") or finish_reason
+            content = chunk["choices"][0].get("delta", {}).get("content")
+            if not content:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            on_text(content)
+    except APIError:
+        # 取消发生在等待重试时
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled("生成已取消")
+        raise
+    finally:
+        # 提前结束时关闭连接，停止继续消耗token
+        response.close()
+    return finish_reason, usage, first_token
+
+
+def request_completion(client, messages, max_tokens, model=MODEL, stream=False, on_delta=None, cancel_event=None,
+                       raw=False, instrumentation=None, on_finish=None, max_continuations=0, params=None):
+    """通过 client（api_client.APIClient）请求模型生成代码，返回去除代码块标记后的代码
+
+    stream 为 True 时按块接收回复，每收到一段可显示的代码就调用 on_delta；
+    cancel_event 被设置后立即停止接收并抛出 GenerationCancelled。
+    raw 为 True 时原样返回回复（例如修改块），不去除代码块标记。
+    回复因 max_tokens 被截断时最多续写 max_continuations 次，续写内容去掉重复部分后接在后面。
+    提供 instrumentation 时记录请求、首个token和去除代码块标记的耗时以及 token 用量。
+    on_finish 在收到完整回复后以 (finish_reason, 输出的 token 数) 调用，
+    finish_reason 为最后一次请求的结果（例如 "stop"，续写后仍被截断时为 "length"）。
+    params 为额外的请求参数，例如 {"temperature": 0.7}。
+    """
+    from instrumentation import SPAN_API_REQUEST, SPAN_FENCE_STRIP, SPAN_FIRST_TOKEN, cached_tokens
+    from token_budget import approx_tokens
+
+    stripper = CodeFenceStripper()
+    parts = []
+    strip_time = 0.0
+
+    def on_text(text):
+        nonlocal strip_time
+        if not text:
+            return
+        parts.append(text)
+        if raw:
+            visible = text
+        else:
+            strip_start = time.perf_counter()
+            visible = stripper.feed(text)
+            strip_time += time.perf_counter() - strip_start
+        if visible and on_delta:
+            on_delta(visible)
+
+    completion_tokens = 0
+    request_messages = messages
+    for continuation in range(max_continuations + 1):
+        stitcher = None
+        if continuation:
+            stitcher = ContinuationStitcher("".join(parts))
+            request_messages = messages + [
+                {"role": "assistant", "content": "".join(parts)},
+                {"role": "user", "content": CONTINUE_PROMPT},
+            ]
+        received = []
+
+        def on_chunk(text):
+            received.append(text)
+            on_text(stitcher.feed(text) if stitcher else text)
+
+        start = time.perf_counter()
+        finish_reason, usage, first_token = _complete_once(
+            client, request_messages, max_tokens, model, stream, cancel_event, on_chunk, params or {}
+        )
+        if stitcher:
+            on_text(stitcher.finish())
+        elapsed = time.perf_counter() - start
+
+        if usage and cached_tokens(usage):
+            print(f"提示前缀缓存命中 {cached_tokens(usage)}/{usage.get('prompt_tokens') or 0} tokens")
+        # 服务没有返回用量时按文本长度估计
+        if usage and usage.get("completion_tokens"):
+            completion_tokens += usage["completion_tokens"]
+        else:
+            completion_tokens += approx_tokens("".join(received))
+        if instrumentation is not None:
+            instrumentation.record(SPAN_API_REQUEST, elapsed, model=model, stream=stream, continuation=continuation)
+            if first_token is not None and not continuation:
+                instrumentation.record(SPAN_FIRST_TOKEN, first_token, model=model)
+            instrumentation.record_usage(model, usage, elapsed)
+        if finish_reason != "length" or continuation == max_continuations:
+            break
+        print(f"回复达到 max_tokens 上限被截断，正在续写（第 {continuation + 1} 次）")
+
+    if on_finish:
+        on_finish(finish_reason, completion_tokens)
+    strip_start = time.perf_counter()
+    code = "".join(parts) if raw else stripper.finish()
+    if instrumentation is not None:
+        instrumentation.record(SPAN_FENCE_STRIP, strip_time + time.perf_counter() - strip_start)
+    return code
@@ -0,0 +1,78 @@
+import queue
+import threading
+
+from api_client import CancelEvent
+from generation import GenerationCancelled
+
+# 等待候选结果时检查用户取消的间隔（秒）
+_POLL_INTERVAL = 0.1
+
+
+def candidate_settings(count, model, models=(), temperatures=()):
+    """返回每个候选使用的 (模型, 额外请求参数)，模型和温度按顺序循环使用"""
+    settings = []
+    for index in range(count):
+        params = {}
+        if temperatures:
+            params["temperature"] = temperatures[index % len(temperatures)]
+        settings.append((models[index % len(models)] if models else model, params))
+    return settings
+
+
+def first_valid(tasks, cancel_event=None, delay=0.0):
+    """并行执行多个候选，返回第一个通过校验的结果
+
+    tasks 为 task(stop_event) 的列表，每个任务请求并校验一个候选，返回 (结果, 问题列表)，
+    stop_event（api_client.CancelEvent）被设置时候选的连接立即中断，任务应随即以 GenerationCancelled 结束。第 i 个候选在 i * delay 秒后才开始，
+    期间已有候选通过时不再发出。返回 (候选序号, 结果, 问题列表)：有候选通过时问题列表为空，
+    全部未通过时返回最先完成的未通过的候选；全部出错时抛出第一个错误。
+    用户取消（cancel_event）时取消全部候选并抛出 GenerationCancelled。
+    """
+    stop = CancelEvent()
+    results = queue.Queue()
+
+    def run(index, task):
+        if index and delay and stop.wait(index * delay):
+            results.put((index, None, None, None))
+            return
+        try:
+            result, problems = task(stop)
+        except GenerationCancelled:
+            results.put((index, None, None, None))
+        except Exception as e:
+            results.put((index, None, None, e))
+        else:
+            results.put((index, result, problems, None))
+
+    for index, task in enumerate(tasks):
+        threading.Thread(target=run, args=(index, task), daemon=True, name=f"candidate-{index + 1}").start()
+
+    fallback = None
+    error = None
+    pending = len(tasks)
+    try:
+        while pending:
+            try:
+                index, result, problems, exc = results.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise GenerationCancelled("生成已取消")
+                continue
+            pending -= 1
+            if exc is not None:
+                print(f"候选 {index + 1} 请求失败: {str(exc)}")
+                error = error or exc
+            elif problems == []:
+                return index, result, problems
+            elif problems is not None:
+                print(f"候选 {index + 1} 未通过校验: {'；'.join(problems)}")
+                fallback = fallback or (index, result, problems)
+    finally:
+        # 取消仍在进行的候选：立即中断它们的连接（包括还在等待响应头或下一个数据块的），服务端停止生成
+        stop.set()
+
+    if fallback is not None:
+        return fallback
+    if error is not None:
+        raise error
+    raise GenerationCancelled("生成已取消")
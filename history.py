@@ -0,0 +1,310 @@
+import os
+import json
+import zlib
+import difflib
+import hashlib
+import threading
+from datetime import datetime
+
+HISTORY_DIRNAME = ".history"
+
+# 每个工具最多保留的版本数，超过后在记录时裁掉最旧的版本
+MAX_REVISIONS = 100
+
+# 差量链的最大长度，超过后保存完整内容，读取任意版本最多解压这么多个对象
+MAX_CHAIN = 16
+
+# 差量不小于完整内容的这个比例时直接保存完整内容
+MAX_DELTA_RATIO = 0.8
+
+# 裁掉的版本累计到这么多时才清理不再引用的对象
+GC_THRESHOLD = 200
+
+# 版本记录中的操作
+ACTION_LABELS = {
+    "original": "原始版本",
+    "generate": "生成",
+    "patch": "修改（修改块）",
+    "modify": "修改（重新生成）",
+    "edit_info": "更改信息",
+    "restore": "恢复",
+}
+
+_FULL = b"F"
+_DELTA = b"D"
+
+
+class HistoryError(Exception):
+    """版本不存在或历史对象损坏"""
+    pass
+
+
+def make_delta(base, content):
+    """计算从 base 得到 content 的差量：[[起始行, 结束行]（复制 base 中的行）或 "文本"（插入）]"""
+    base_lines = base.splitlines(keepends=True)
+    lines = content.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(lines[j1:j2]))
+    return ops
+
+
+def apply_delta(base, ops):
+    base_lines = base.splitlines(keepends=True)
+    return "".join(op if isinstance(op, str) else "".join(base_lines[op[0]:op[1]]) for op in ops)
+
+
+class ToolHistory:
+    """工具代码的版本历史，位于工具目录下的 .history
+
+    objects/ 按内容的 sha256 保存每个版本的代码，相同的内容只保存一次；对象是 zlib 压缩的
+    完整内容，或者相对另一个对象（通常是上一个版本）的行级差量，差量链长度不超过 MAX_CHAIN。
+    logs/<工具名称>.jsonl 按顺序记录工具的每个版本（版本号、时间、操作、提示、模型和对象），
+    列出版本只需读取这一个文件。可以在多个线程中使用。
+    """
+
+    def __init__(self, tools_dir, max_revisions=MAX_REVISIONS):
+        self.root = os.path.join(tools_dir, HISTORY_DIRNAME)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.logs_dir = os.path.join(self.root, "logs")
+        self.state_file = os.path.join(self.root, "state.json")
+        self.max_revisions = max_revisions
+        self._lock = threading.RLock()
+
+    # ---- 对象 ----
+
+    def _object_path(self, sha):
+        return os.path.join(self.objects_dir, sha[:2], sha)
+
+    def _read_object(self, sha):
+        """返回 (类型, 内容)：完整内容为字符串，差量为 {"base", "depth", "ops"}"""
+        try:
+            with open(self._object_path(sha), "rb") as f:
+                data = f.read()
+            payload = zlib.decompress(data[1:]).decode("utf-8")
+        except (OSError, zlib.error, UnicodeDecodeError) as e:
+            raise HistoryError(f"读取历史对象 {sha[:12]} 失败: {str(e)}")
+        if data[:1] == _FULL:
+            return _FULL, payload
+        return _DELTA, json.loads(payload)
+
+    def _depth(self, sha):
+        kind, payload = self._read_object(sha)
+        return 0 if kind == _FULL else payload["depth"]
+
+    def read(self, sha):
+        """读取对象对应的完整代码"""
+        chain = []
+        kind, payload = self._read_object(sha)
+        while kind == _DELTA:
+            chain.append(payload["ops"])
+            kind, payload = self._read_object(payload["base"])
+        content = payload
+        for ops in reversed(chain):
+            content = apply_delta(content, ops)
+        return content
+
+    def _write_object(self, content, base_sha=None):
+        """保存内容，已存在相同内容时直接返回；有 base_sha 且差量足够小时保存为差量"""
+        sha = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        path = self._object_path(sha)
+        if os.path.exists(path):
+            return sha
+
+        data = _FULL + zlib.compress(content.encode("utf-8"))
+        if base_sha:
+            try:
+                depth = self._depth(base_sha) + 1
+                if depth <= MAX_CHAIN:
+                    delta = {"base": base_sha, "depth": depth, "ops": make_delta(self.read(base_sha), content)}
+                    delta_data = _DELTA + zlib.compress(json.dumps(delta, ensure_ascii=False).encode("utf-8"))
+                    if len(delta_data) < len(data) * MAX_DELTA_RATIO:
+                        data = delta_data
+            except HistoryError as e:
+                # 基础版本损坏时保存完整内容
+                print(f"计算差量失败: {str(e)}")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return sha
+
+    # ---- 版本记录 ----
+
+    def _log_path(self, tool_name):
+        return os.path.join(self.logs_dir, f"{tool_name}.jsonl")
+
+    def revisions(self, tool_name):
+        """返回工具的版本列表（从旧到新），每个版本为 {"rev", "sha", "time", "action", "prompt", "model", "size"}"""
+        path = self._log_path(tool_name)
+        if not os.path.exists(path):
+            return []
+        revisions = []
+        with self._lock, open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    revisions.append(json.loads(line))
+                except ValueError:
+                    # 写到一半的最后一行
+                    break
+        return revisions
+
+    def get_revision(self, tool_name, rev):
+        for revision in self.revisions(tool_name):
+            if revision["rev"] == rev:
+                return revision
+        raise HistoryError(f"工具 '{tool_name}' 没有版本 {rev}")
+
+    def read_revision(self, tool_name, rev):
+        """读取工具某个版本的代码"""
+        return self.read(self.get_revision(tool_name, rev)["sha"])
+
+    def record(self, tool_name, content, action, prompt=None, model=None):
+        """记录工具的新版本，返回版本记录；与最新版本内容相同时不记录，返回 None"""
+        with self._lock:
+            revisions = self.revisions(tool_name)
+            latest = revisions[-1] if revisions else None
+            sha = self._write_object(content, latest["sha"] if latest else None)
+            if latest and latest["sha"] == sha:
+                return None
+            revision = {
+                "rev": latest["rev"] + 1 if latest else 1,
+                "sha": sha,
+                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "action": action,
+                "prompt": prompt,
+                "model": model,
+                "size": len(content.encode("utf-8")),
+            }
+            os.makedirs(self.logs_dir, exist_ok=True)
+            revisions.append(revision)
+            if len(revisions) > self.max_revisions:
+                self._rewrite_log(tool_name, revisions[-self.max_revisions:])
+                self._add_garbage(len(revisions) - self.max_revisions)
+            else:
+                with open(self._log_path(tool_name), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(revision, ensure_ascii=False) + "\n")
+            return revision
+
+    def _rewrite_log(self, tool_name, revisions):
+        path = self._log_path(tool_name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for revision in revisions:
+                f.write(json.dumps(revision, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+    def exists(self, tool_name):
+        """工具是否有版本记录"""
+        return os.path.exists(self._log_path(tool_name))
+
+    def rename(self, tool_name, new_name):
+        """工具改名时移动它的版本记录，新名称已有版本记录时抛出 FileExistsError"""
+        with self._lock:
+            path = self._log_path(tool_name)
+            if not os.path.exists(path):
+                return
+            new_path = self._log_path(new_name)
+            if os.path.exists(new_path):
+                raise FileExistsError(f"工具 '{new_name}' 已有版本历史")
+            os.rename(path, new_path)
+
+    def remove(self, tool_name):
+        """删除工具时删除它的版本记录，不再引用的对象在下次清理时删除"""
+        with self._lock:
+            revisions = self.revisions(tool_name)
+            try:
+                os.remove(self._log_path(tool_name))
+            except FileNotFoundError:
+                return
+            if revisions:
+                self._add_garbage(len(revisions))
+
+    def diff(self, tool_name, old, new, old_label=None, new_label=None):
+        """返回两段代码的统一格式差异，old 和 new 为版本号或代码文本"""
+        if isinstance(old, int):
+            old_label = old_label or f"{tool_name} 版本 {old}"
+            old = self.read_revision(tool_name, old)
+        if isinstance(new, int):
+            new_label = new_label or f"{tool_name} 版本 {new}"
+            new = self.read_revision(tool_name, new)
+        return "".join(difflib.unified_diff(
+            old.splitlines(keepends=True), new.splitlines(keepends=True),
+            fromfile=old_label or "旧版本", tofile=new_label or "新版本"
+        ))
+
+    # ---- 清理 ----
+
+    def _add_garbage(self, count):
+        state = self._read_state()
+        state["garbage"] = state.get("garbage", 0) + count
+        if state["garbage"] >= GC_THRESHOLD:
+            self.compact()
+            return
+        self._write_state(state)
+
+    def _read_state(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, state):
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    def compact(self):
+        """把每个工具裁到最多 max_revisions 个版本，删除不再被引用的对象，返回 (裁掉的版本数, 删除的对象数)"""
+        with self._lock:
+            removed_revisions = 0
+            live = set()
+            if os.path.isdir(self.logs_dir):
+                for filename in os.listdir(self.logs_dir):
+                    if not filename.endswith(".jsonl"):
+                        continue
+                    tool_name = filename[:-6]
+                    revisions = self.revisions(tool_name)
+                    if len(revisions) > self.max_revisions:
+                        removed_revisions += len(revisions) - self.max_revisions
+                        revisions = revisions[-self.max_revisions:]
+                        self._rewrite_log(tool_name, revisions)
+                    live.update(revision["sha"] for revision in revisions)
+
+            # 差量依赖的基础对象同样需要保留
+            pending = list(live)
+            while pending:
+                try:
+                    kind, payload = self._read_object(pending.pop())
+                except HistoryError:
+                    continue
+                if kind == _DELTA and payload["base"] not in live:
+                    live.add(payload["base"])
+                    pending.append(payload["base"])
+
+            removed_objects = 0
+            if os.path.isdir(self.objects_dir):
+                for prefix in os.listdir(self.objects_dir):
+                    prefix_dir = os.path.join(self.objects_dir, prefix)
+                    for sha in os.listdir(prefix_dir):
+                        if sha not in live:
+                            os.remove(os.path.join(prefix_dir, sha))
+                            removed_objects += 1
+            if os.path.isdir(self.root):
+                self._write_state({"garbage": 0})
+            return removed_revisions, removed_objects
+
+    def disk_usage(self):
+        """历史对象占用的字节数"""
+        total = 0
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                total += sum(os.path.getsize(os.path.join(prefix_dir, sha)) for sha in os.listdir(prefix_dir))
+        return total
@@ -0,0 +1,139 @@
+import json
+import math
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# 耗时统计的阶段名称
+SPAN_API_REQUEST = "api_request"
+SPAN_FIRST_TOKEN = "first_token"
+SPAN_FENCE_STRIP = "fence_strip"
+SPAN_NAME_EXTRACT = "name_extract"
+SPAN_FILE_WRITE = "file_write"
+SPAN_CATALOG_SCAN = "catalog_scan"
+SPAN_TREE_RENDER = "tree_render"
+SPAN_SEARCH_INDEX = "search_index"
+SPAN_SEARCH_QUERY = "search_query"
+SPAN_VALIDATE = "validate"
+SPAN_DUPLICATE_CHECK = "duplicate_check"
+SPAN_HEDGE = "hedged_generation"
+
+SPAN_LABELS = {
+    SPAN_API_REQUEST: "接口请求",
+    SPAN_FIRST_TOKEN: "首个token",
+    SPAN_FENCE_STRIP: "去除代码块标记",
+    SPAN_NAME_EXTRACT: "提取工具名称",
+    SPAN_FILE_WRITE: "写入文件",
+    SPAN_CATALOG_SCAN: "扫描工具目录",
+    SPAN_TREE_RENDER: "刷新工具列表",
+    SPAN_SEARCH_INDEX: "建立搜索索引",
+    SPAN_SEARCH_QUERY: "搜索工具",
+    SPAN_VALIDATE: "校验代码",
+    SPAN_DUPLICATE_CHECK: "查找相似工具",
+    SPAN_HEDGE: "多候选生成",
+}
+
+
+def percentile(values, fraction):
+    """返回已排序列表的百分位数（最近秩法）"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def cached_tokens(usage):
+    """接口返回的用量中命中前缀缓存的输入 token 数（DeepSeek 和 OpenAI 的字段不同）"""
+    return usage.get("prompt_cache_hit_tokens") or (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+
+class Instrumentation:
+    """热点路径的耗时记录
+
+    每条记录为 {"type": "span"|"usage", "name", "ts", "duration", ...}，保存在固定大小的
+    环形缓冲区中，log_file 不为空时同时追加到 JSON Lines 文件。可以在多个线程中使用。
+    """
+
+    def __init__(self, capacity=2000, log_file=None):
+        self.log_file = log_file
+        self._records = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def _add(self, record):
+        with self._lock:
+            self._records.append(record)
+            if not self.log_file:
+                return
+            try:
+                with open(self.log_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"写入性能日志失败: {str(e)}")
+
+    def record(self, name, duration, **attrs):
+        """记录一个已经测得的耗时（秒）"""
+        self._add(dict(attrs, type="span", name=name, ts=time.time(), duration=duration))
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """用 with 语句测量一段代码的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **attrs)
+
+    def record_usage(self, model, usage, duration):
+        """记录一次请求的 token 用量，duration 为整个请求的耗时（秒）"""
+        if not usage:
+            return
+        self._add({
+            "type": "usage",
+            "name": model,
+            "ts": time.time(),
+            "duration": duration,
+            "prompt_tokens": usage.get("prompt_tokens") or 0,
+            "completion_tokens": usage.get("completion_tokens") or 0,
+            "cached_tokens": cached_tokens(usage),
+        })
+
+    def records(self, record_type=None):
+        with self._lock:
+            return [r for r in self._records if record_type is None or r["type"] == record_type]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def span_stats(self):
+        """按阶段汇总耗时：{阶段: {count, p50_ms, p95_ms, mean_ms}}"""
+        durations = {}
+        for record in self.records("span"):
+            durations.setdefault(record["name"], []).append(record["duration"])
+        stats = {}
+        for name, values in durations.items():
+            values.sort()
+            stats[name] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.5) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+            }
+        return stats
+
+    def usage_stats(self):
+        """按模型汇总 token 用量和输出速度：{模型: {requests, prompt_tokens, completion_tokens, cached_tokens, tokens_per_second}}"""
+        stats = {}
+        for record in self.records("usage"):
+            model = stats.setdefault(record["name"], {
+                "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "seconds": 0.0,
+            })
+            model["requests"] += 1
+            model["prompt_tokens"] += record["prompt_tokens"]
+            model["completion_tokens"] += record["completion_tokens"]
+            model["cached_tokens"] += record["cached_tokens"]
+            model["seconds"] += record["duration"]
+        for model in stats.values():
+            seconds = model.pop("seconds")
+            model["tokens_per_second"] = round(model["completion_tokens"] / seconds, 1) if seconds else 0.0
+        return stats
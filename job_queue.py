@@ -0,0 +1,206 @@
+import time
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# 并发数上限，也是线程池的大小；实际并发数由 GenerationQueue 的闸门控制，可以随时修改
+MAX_CONCURRENCY = 32
+
+JOB_STATUS_LABELS = {
+    JOB_QUEUED: "排队中",
+    JOB_RUNNING: "生成中",
+    JOB_DONE: "已完成",
+    JOB_FAILED: "失败",
+}
+
+
+class RateLimiter:
+    """按分钟限制请求数和token数（滑动窗口），限制为 0 表示不限"""
+
+    WINDOW = 60.0
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, clock=time.monotonic, sleep=time.sleep):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._events = deque()  # (时间, token数)
+        self._lock = threading.Lock()
+
+    def _wait_time(self, now, tokens):
+        """返回还需等待的秒数，0 表示可以立即发出请求"""
+        while self._events and now - self._events[0][0] >= self.WINDOW:
+            self._events.popleft()
+        if not self._events:
+            # 窗口为空时总是放行，避免单个请求超过 token 限制时永远等待
+            return 0
+        wait = 0
+        if self.requests_per_minute and len(self._events) >= self.requests_per_minute:
+            wait = self._events[-self.requests_per_minute][0] + self.WINDOW - now
+        if self.tokens_per_minute:
+            used = sum(count for _, count in self._events)
+            for start, count in self._events:
+                if used + tokens <= self.tokens_per_minute:
+                    break
+                used -= count
+                wait = max(wait, start + self.WINDOW - now)
+        return max(wait, 0)
+
+    def acquire(self, tokens=0, cancel_event=None):
+        """阻塞直到可以发出一个预计消耗 tokens 个token的请求，返回 True
+
+        等待期间 cancel_event 被设置时放弃这个请求并返回 False。
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self._events.append((now, tokens))
+                    return True
+            if cancel_event is None:
+                self._sleep(wait)
+            elif cancel_event.wait(wait):
+                return False
+
+
+class GenerationJob:
+    """批量生成中的单个任务"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, request_text, allow_duplicate=False):
+        self.job_id = next(self._ids)
+        self.request_text = request_text
+        self.allow_duplicate = allow_duplicate  # 已有相似的工具时仍然生成
+        self.status = JOB_QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def status_label(self):
+        return JOB_STATUS_LABELS[self.status]
+
+
+class GenerationQueue:
+    """有界线程池的批量生成队列
+
+    worker(job) 在工作线程中执行实际的生成并返回结果，抛出异常即视为失败；
+    每次任务状态变化都会调用 on_update(job)（在工作线程中调用）。
+    限速不在这里处理：一个任务可能发出多个请求（校验重试、续写、多个候选），
+    由 api_client.APIClient 的 rate_limiter 按每个请求计算。
+    线程池固定为 MAX_CONCURRENCY 个线程，同时运行的任务数由闸门限制为 concurrency，
+    任务按提交顺序开始；修改并发数时立即对排队中的任务生效，运行中的任务不受影响。
+    """
+
+    def __init__(self, worker, concurrency=3, on_update=None):
+        self.worker = worker
+        self.on_update = on_update
+        self.jobs = []
+        self._lock = threading.Lock()
+        self._concurrency = min(max(1, concurrency), MAX_CONCURRENCY)
+        self._executor = None
+        self._gate = threading.Condition()
+        self._running = 0
+        self._next_ticket = 0  # 下一个进入闸门的任务取得的序号
+        self._serving = 0      # 轮到开始的任务序号
+        self._epoch = 0        # 不等待的关闭后加一，之前提交的任务不再开始
+
+    @property
+    def concurrency(self):
+        return self._concurrency
+
+    def set_concurrency(self, concurrency):
+        """修改并发数（不超过 MAX_CONCURRENCY），排队中的任务按新的并发数开始"""
+        with self._gate:
+            self._concurrency = min(max(1, concurrency), MAX_CONCURRENCY)
+            self._gate.notify_all()
+
+    def submit(self, request_text, allow_duplicate=False):
+        """提交一个生成任务"""
+        job = GenerationJob(request_text, allow_duplicate)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY,
+                                                    thread_name_prefix="generation")
+            self.jobs.append(job)
+            self._notify(job)
+            self._executor.submit(self._run, job, self._epoch)
+        return job
+
+    def submit_many(self, request_texts, allow_duplicate=False):
+        """批量提交生成任务"""
+        return [self.submit(text, allow_duplicate) for text in request_texts]
+
+    def _notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                print(f"更新任务状态失败: {str(e)}")
+
+    def _enter(self, epoch):
+        """等待轮到自己并且运行中的任务数低于并发数，提交后队列被关闭时返回 False"""
+        with self._gate:
+            if epoch != self._epoch:
+                return False
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while epoch == self._epoch and (ticket != self._serving or self._running >= self._concurrency):
+                self._gate.wait()
+            if epoch != self._epoch:
+                return False
+            self._serving += 1
+            self._running += 1
+            self._gate.notify_all()
+            return True
+
+    def _leave(self):
+        with self._gate:
+            self._running -= 1
+            self._gate.notify_all()
+
+    def _run(self, job, epoch):
+        if not self._enter(epoch):
+            return
+        try:
+            job.status = JOB_RUNNING
+            job.started = time.time()
+            self._notify(job)
+            try:
+                job.result = self.worker(job)
+                job.status = JOB_DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = JOB_FAILED
+            finally:
+                job.finished = time.time()
+                self._notify(job)
+        finally:
+            self._leave()
+
+    def pending_count(self):
+        """尚未结束的任务数"""
+        return sum(1 for job in self.jobs if job.status in (JOB_QUEUED, JOB_RUNNING))
+
+    def shutdown(self, wait=False):
+        """关闭线程池，wait 为 False 时还没开始的任务不再运行"""
+        if not wait:
+            with self._gate:
+                self._epoch += 1
+                self._next_ticket = self._serving = 0
+                self._gate.notify_all()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+                self._executor = None
@@ -1,88 +1,59 @@
-import os 
-import json 
-import importlib 
 import subprocess 
 import threading 
 import sys 
-import re 
-from datetime import datetime 
-import openai 
 import tkinter as tk 
 from tkinter import ttk, messagebox, filedialog, scrolledtext 
- 
-# 准备系统提示 
-def get_system_prompt():
-    current_time = datetime.now().strftime("%Y-%m-%d  %H:%M:%S")
-    return f"""你是一个专业的Python开发助手，专注于为Windows环境编写实用工具脚本。请根据用户需求编写完整的Python工具脚本，遵循以下规范：
- 
-1. 提供完整的、可直接运行的Python代码 
-2. 必须包含main()函数作为程序入口点 
-3. 包含清晰的功能描述和使用方法注释 
-4. 包含元数据注释，格式为：# metadata = {{"name": "工具名称", "description": "工具描述", "created": "创建时间"}}
-5. 必须处理潜在错误并提供用户友好的反馈 
-6. 优先使用Python标准库，第三方库需在脚本内自动安装 
-7. 代码需有良好的注释，结构清晰易读 
-8. 聚焦于解决用户描述的具体问题，不引入无关功能 
-9. 使用标准输入输出方式，避免使用sys.argv 和非必要的图形界面 
-10. 创建临时或配置文件时，在脚本所在目录创建同名子目录 
-11. 除非用户明确要求，否则不要将输出文件保存到脚本子目录 
-12. 脚本末尾需包含阻塞语句，防止控制台窗口自动关闭 
- 
-请仅返回完整的Python代码，不要包含任何解释或额外的文本。
-当前时间：{current_time}"""
+from core import ToolBoxCore
+from api_client import CancelEvent
+from dedup import SimilarToolExists
+from history import ACTION_LABELS
+from generation import GenerationCancelled
+from job_queue import JOB_DONE
+from tool_tree import ToolTreeView
+from instrumentation import SPAN_LABELS, SPAN_TREE_RENDER
  
 class ToolBoxApp:
     def __init__(self, root):
         self.root  = root 
         self.root.title(" 智能工具箱")
-        self.root.geometry("900x750")   # 增加高度以适应新按钮 
+        self.root.geometry("900x900")   # 增加高度以适应实时预览 
         
-        # 配置 
-        self.config_file  = "toolbox_config.json"  
-        self.tools_dir  = "tools"
-        self.api_key  = ""
-        self.base_url  = "https://api.deepseek.com"  
-        self.max_tokens  = 2000  # 默认值 
+        # 核心逻辑（配置、工具目录、生成等），与界面无关 
+        self.core = ToolBoxCore()
         
-        # 创建工具目录 
-        if not os.path.exists(self.tools_dir):  
-            os.makedirs(self.tools_dir)  
+        # 批量生成队列 
+        self.generation_queue = self.core.create_generation_queue(
+            on_update=lambda job: self.root.after(0, lambda: self._on_job_update(job))
+        )
+        self.batch_window = None
+        self.stats_window = None
         
-        # 加载配置 
-        self.load_config()  
+        # 后台运行的工具进程 
+        self.process_manager = self.core.create_process_manager(
+            on_output=lambda run, stream, text: self.root.after(0, lambda: self._on_run_output(run, stream, text)),
+            on_exit=lambda run: self.root.after(0, lambda: self._update_run_row(run))
+        )
+        self.run_window = None
         
         # 初始化工具列表 
-        self.tools  = {}
         self.load_tools()  
         
         # 创建UI 
         self.create_ui()  
         
+        # 监视工具目录，外部的增删改（git pull、外部编辑器等）会自动反映到工具列表 
+        self.watcher = None
+        if self.core.watch_tools_dir:
+            self.watcher = self.core.watch_tools(
+                lambda changes: self.root.after(0, lambda: self._on_tools_changed(changes))
+            )
+        
         # 初始化OpenAI客户端 
         self.init_openai_client()  
     
-    def load_config(self):
-        """加载配置文件"""
-        if os.path.exists(self.config_file):  
-            with open(self.config_file,  "r") as f:
-                config = json.load(f)  
-                self.api_key  = config.get("api_key",  "")
-                self.base_url  = config.get("base_url",  self.base_url)  
-                self.max_tokens  = config.get("max_tokens",  2000)  # 加载max_tokens 
-    
-    def save_config(self):
-        """保存配置文件"""
-        config = {
-            "api_key": self.api_key,  
-            "base_url": self.base_url, 
-            "max_tokens": self.max_tokens   # 保存max_tokens 
-        }
-        with open(self.config_file,  "w") as f:
-            json.dump(config,  f, indent=4)
-    
     def init_openai_client(self):
         """初始化OpenAI客户端"""
-        if self.api_key: 
+        if self.core.api_key: 
             return True 
         return False 
     
@@ -99,19 +70,20 @@ class ToolBoxApp:
         ttk.Label(config_frame, text="API Key:").grid(row=0, column=0, sticky=tk.W)
         self.api_key_entry  = ttk.Entry(config_frame, width=50)
         self.api_key_entry.grid(row=0,  column=1, sticky=tk.W)
-        self.api_key_entry.insert(0,  self.api_key)  
+        self.api_key_entry.insert(0,  self.core.api_key)  
         
         ttk.Label(config_frame, text="Base URL:").grid(row=1, column=0, sticky=tk.W)
         self.base_url_entry  = ttk.Entry(config_frame, width=50)
         self.base_url_entry.grid(row=1,  column=1, sticky=tk.W)
-        self.base_url_entry.insert(0,  self.base_url) 
+        self.base_url_entry.insert(0,  self.core.base_url) 
  
         ttk.Label(config_frame, text="Max Tokens:").grid(row=2, column=0, sticky=tk.W)
         self.max_tokens_entry  = ttk.Entry(config_frame, width=10)
         self.max_tokens_entry.grid(row=2,  column=1, sticky=tk.W)
-        self.max_tokens_entry.insert(0,  str(self.max_tokens))   # 使用配置中的值 
+        self.max_tokens_entry.insert(0,  str(self.core.max_tokens))   # 使用配置中的值 
         
         ttk.Button(config_frame, text="保存配置", command=self.save_api_config).grid(row=1,  column=2, padx=5)
+        ttk.Button(config_frame, text="性能统计", command=self.open_stats_window).grid(row=2, column=2, padx=5)
         
         # 工具创建器 
         creator_frame = ttk.LabelFrame(self.main_frame,  text="工具创建器", padding="10")
@@ -121,25 +93,68 @@ class ToolBoxApp:
         self.tool_request_entry  = scrolledtext.ScrolledText(creator_frame, height=5, width=80)
         self.tool_request_entry.pack(fill=tk.X,  pady=5)
         
-        self.generate_button  = ttk.Button(creator_frame, text="生成工具", command=self.generate_tool) 
-        self.generate_button.pack(pady=5)  
+        action_frame = ttk.Frame(creator_frame)
+        action_frame.pack(pady=5)
+        
+        self.generate_button  = ttk.Button(action_frame, text="生成工具", command=self.generate_tool) 
+        self.generate_button.pack(side=tk.LEFT, padx=5)
+        
+        # 取消按钮只在流式生成过程中可用 
+        self.generate_cancel_event = None
+        self.cancel_button = ttk.Button(action_frame, text="取消生成", command=self.cancel_generation, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        
+        self.stream_var = tk.BooleanVar(value=self.core.stream)
+        ttk.Checkbutton(action_frame, text="流式生成", variable=self.stream_var, command=self.toggle_stream).pack(side=tk.LEFT, padx=5)
+        
+        # 勾选后跳过缓存，强制重新请求模型 
+        self.bypass_cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(action_frame, text="忽略缓存", variable=self.bypass_cache_var).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(action_frame, text="批量生成", command=self.open_batch_window).pack(side=tk.LEFT, padx=5)
+        
+        # 实时预览 
+        ttk.Label(creator_frame, text="实时预览:").pack(anchor=tk.W)
+        self.preview_text = scrolledtext.ScrolledText(creator_frame, height=8, width=80, state=tk.DISABLED)
+        self.preview_text.pack(fill=tk.X, pady=5)
         
         # 工具管理 
         management_frame = ttk.LabelFrame(self.main_frame,  text="工具管理", padding="10")
         management_frame.pack(fill=tk.BOTH,  expand=True, pady=5)
         
+        # 搜索框，输入时按名称、描述和源代码过滤工具列表 
+        search_frame = ttk.Frame(management_frame)
+        search_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        ttk.Label(search_frame, text="搜索:").pack(side=tk.LEFT)
+        self.search_var = tk.StringVar()
+        self.search_after_id = None
+        ttk.Entry(search_frame, textvariable=self.search_var, width=50).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.search_var.trace_add("write", lambda *args: self._schedule_search())
+        self.search_status = ttk.Label(search_frame, text="")
+        self.search_status.pack(side=tk.LEFT)
+        
         # 工具列表 
         self.tool_tree  = ttk.Treeview(management_frame, columns=("name", "description", "created"), show="headings")
         self.tool_tree.heading("#0",  text="工具ID")
-        self.tool_tree.heading("name",  text="工具名称")
+        self.tool_tree.heading("name",  text="工具名称", command=lambda: self.tool_view.sort_by("name"))
         self.tool_tree.heading("description",  text="描述")
-        self.tool_tree.heading("created",  text="创建时间")
+        self.tool_tree.heading("created",  text="创建时间", command=lambda: self.tool_view.sort_by("created"))
         self.tool_tree.column("#0",  width=100)
         self.tool_tree.column("name",  width=200)
         self.tool_tree.column("description",  width=400)
         self.tool_tree.column("created",  width=150)
         self.tool_tree.pack(side=tk.LEFT,  fill=tk.BOTH, expand=True)
         
+        # 增量渲染，滚动到底部时加载下一页 
+        self.tool_view = ToolTreeView(self.tool_tree)
+        tree_scrollbar = ttk.Scrollbar(management_frame, orient=tk.VERTICAL, command=self.tool_tree.yview)
+        tree_scrollbar.pack(side=tk.LEFT, fill=tk.Y)
+        
+        def on_tree_scroll(first, last):
+            tree_scrollbar.set(first, last)
+            self.tool_view.on_scroll(first, last)
+        self.tool_tree.configure(yscrollcommand=on_tree_scroll)
+        
         # 工具操作按钮 
         button_frame = ttk.Frame(management_frame)
         button_frame.pack(side=tk.RIGHT,  fill=tk.Y, padx=5)
@@ -151,25 +166,41 @@ class ToolBoxApp:
         ttk.Button(button_frame, text="导入工具", command=self.import_tool).pack(fill=tk.X,  pady=5)
         ttk.Button(button_frame, text="更改信息", command=self.edit_tool_info).pack(fill=tk.X,  pady=5)
         ttk.Button(button_frame, text="修改工具", command=self.modify_tool).pack(fill=tk.X,  pady=5)
+        ttk.Button(button_frame, text="历史版本", command=self.open_history_window).pack(fill=tk.X,  pady=5)
         
         # 刷新工具列表 
         self.refresh_tool_list()  
+        
+        # 在后台建立搜索索引，第一次搜索时不用等待 
+        threading.Thread(target=self._build_search_index, daemon=True).start()
+    
+    def _build_search_index(self):
+        try:
+            self.core.search_index
+        except Exception as e:
+            print(f"建立搜索索引失败: {str(e)}")
+        try:
+            self.core.duplicate_index
+        except Exception as e:
+            print(f"建立相似工具索引失败: {str(e)}")
     
     def save_api_config(self):
         """保存API配置"""
-        self.api_key  = self.api_key_entry.get().strip()  
-        self.base_url  = self.base_url_entry.get().strip()  
+        self.core.api_key = self.api_key_entry.get().strip()
+        self.core.base_url = self.base_url_entry.get().strip()
         
         try:
-            self.max_tokens  = int(self.max_tokens_entry.get().strip()) 
-            if self.max_tokens  <= 0:
+            max_tokens = int(self.max_tokens_entry.get().strip())
+            if max_tokens <= 0:
                 messagebox.showerror(" 错误", "max_tokens 必须是正整数")
                 return 
         except ValueError:
             messagebox.showerror(" 错误", "max_tokens 必须是数字")
             return 
         
-        self.save_config()  
+        self.core.max_tokens = max_tokens
+        self.core.stream = self.stream_var.get()
+        self.core.save_config()
         
         # 重新初始化客户端 
         if self.init_openai_client():  
@@ -179,81 +210,58 @@ class ToolBoxApp:
     
     def load_tools(self):
         """加载所有工具"""
-        self.tools  = {}
-        if os.path.exists(self.tools_dir):  
-            for filename in os.listdir(self.tools_dir):  
-                if filename.endswith(".py"):  
-                    tool_name = filename[:-3]
-                    tool_path = os.path.join(self.tools_dir,  filename)
-                    
-                    # 读取工具元数据 
-                    metadata = self.get_tool_metadata(tool_path)  
-                    if metadata:
-                        self.tools[tool_name]  = {
-                            "path": tool_path,
-                            "name": metadata.get("name",  tool_name), 
-                            "description": metadata.get("description",  "无描述"),
-                            "created": metadata.get("created",  "未知")
-                        }
-    
-    def get_tool_metadata(self, tool_path):
-        """从工具文件中提取元数据"""
-        try:
-            with open(tool_path, "r", encoding="utf-8") as f:
-                content = f.read() 
-                
-                # 查找元数据注释 
-                metadata_start = content.find('#  metadata = {')
-                if metadata_start != -1:
-                    metadata_end = content.find('}',  metadata_start)
-                    if metadata_end != -1:
-                        metadata_str = content[metadata_start:metadata_end + 1]
-                        try:
-                            # 将字符串格式的元数据转换为字典 
-                            metadata = eval(metadata_str.replace('=  ', ': ', 1))
-                            if isinstance(metadata, dict):
-                                return metadata 
-                        except:
-                            pass 
-                
-                # 如果标准元数据格式不存在，尝试兼容旧版格式 
-                metadata = {}
-
-                # 提取name
-                name_match = re.search(r'"name":\s*"([^"]+)"',  content)
-                if name_match:
-                    metadata["description"] = name_match.group(1)
-                
-                # 提取description 
-                desc_match = re.search(r'"description":\s*"([^"]+)"',  content)
-                if desc_match:
-                    metadata["description"] = desc_match.group(1) 
-                
-                # 提取created 
-                created_match = re.search(r'"created":\s*"([^"]+)"',  content)
-                if created_match:
-                    metadata["created"] = created_match.group(1) 
-                
-                return metadata 
-        except Exception as e:
-            print(f"读取工具元数据失败: {str(e)}")
-            return None 
+        return self.core.load_tools()
     
     def refresh_tool_list(self):
         """刷新工具列表"""
         self.load_tools()  
-        self.tool_tree.delete(*self.tool_tree.get_children())  
         
-        # 确保工具名称正确显示 
-        for tool_name, tool_info in self.tools.items():  
-            # 确保tool_name是字符串 
-            display_name = str(tool_name) if tool_name else "未命名工具"
-            self.tool_tree.insert("",  tk.END, text=tool_name,  # 使用tool_name作为ID 
-                                values=(display_name, tool_info["description"], tool_info["created"]))
+        # 与上一次的工具列表比较，只更新发生变化的行 
+        self._render_tools()
+        
+    def _render_tools(self):
+        """按当前的搜索条件重新渲染工具列表"""
+        query = self.search_var.get().strip()
+        if query:
+            self.tool_view.matches = self.core.search_tools(query)
+            self.search_status.config(text=f"找到 {len(self.tool_view.matches)} 个工具")
+        with self.core.instrumentation.span(SPAN_TREE_RENDER):
+            self.tool_view.update(self.core.tools)
+    
+    def _schedule_search(self):
+        """输入停顿后再搜索，避免每次按键都刷新列表"""
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(150, self.search_tools)
+    
+    def search_tools(self):
+        """按搜索框的内容过滤工具列表"""
+        self.search_after_id = None
+        query = self.search_var.get().strip()
+        if query:
+            try:
+                matches = self.core.search_tools(query)
+            except Exception as e:
+                messagebox.showerror(" 错误", f"搜索工具失败: {str(e)}")
+                return 
+            self.tool_view.set_filter(matches)
+            self.search_status.config(text=f"找到 {len(matches)} 个工具")
+        else:
+            self.tool_view.set_filter(None)
+            self.search_status.config(text="")
+        with self.core.instrumentation.span(SPAN_TREE_RENDER):
+            self.tool_view.render()
         
+    def _on_tools_changed(self, changes):
+        """工具目录发生变化时增量更新工具列表"""
+        if changes is None:
+            self.refresh_tool_list()
+        elif self.core.apply_file_changes(changes):
+            self._render_tools()
+    
     def generate_tool(self):
         """生成新工具"""
-        if not self.api_key:  
+        if not self.core.api_key:  
             messagebox.showerror(" 错误", "请先配置API Key")
             return 
         
@@ -271,109 +279,499 @@ class ToolBoxApp:
             messagebox.showerror(" 错误", "max_tokens 必须是数字")
             return 
         
+        # 输入的 max_tokens 作为单次请求的上限，实际值按历史自动估计 
+        self.core.max_tokens = max_tokens
+        self._start_generation(request_text, self.bypass_cache_var.get())
+    
+    def _start_generation(self, request_text, bypass_cache, allow_duplicate=False):
+        """在后台线程中开始生成工具"""
         # 禁用生成按钮 
         self.generate_button.config(state=tk.DISABLED) 
         
-        messagebox.showinfo(" 正在生成工具", "工具已开始生成")
+        stream = self.stream_var.get()
+        if stream:
+            # 流式模式下直接在预览区显示进度，并允许中途取消；取消时立即中断连接，不必等到下一个数据块 
+            self.generate_cancel_event = CancelEvent()
+            self.cancel_button.config(state=tk.NORMAL)
+            self.set_preview_text(self.preview_text, "")
+        else:
+            messagebox.showinfo(" 正在生成工具", "工具已开始生成")
  
         # 在新线程中生成工具，避免阻塞UI 
-        threading.Thread(target=self._generate_tool_in_thread, args=(request_text, max_tokens)).start()
+        threading.Thread(
+            target=self._generate_tool_in_thread,
+            args=(request_text, None, stream, bypass_cache, allow_duplicate)
+        ).start()
  
-    def _generate_tool_in_thread(self, request_text, _max_tokens):
+    def cancel_generation(self):
+        """取消正在进行的流式生成"""
+        if self.generate_cancel_event is not None:
+            self.generate_cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+    
+    def toggle_stream(self):
+        """切换流式生成模式"""
+        self.core.stream = self.stream_var.get()
+    
+    def set_preview_text(self, widget, text):
+        """替换预览区内容"""
+        widget.config(state=tk.NORMAL)
+        widget.delete("1.0", tk.END)
+        widget.insert(tk.END, text)
+        widget.config(state=tk.DISABLED)
+    
+    def append_preview_text(self, widget, text):
+        """向预览区追加内容（可在工作线程中调用）"""
+        def _append():
+            if not widget.winfo_exists():
+                return
+            widget.config(state=tk.NORMAL)
+            widget.insert(tk.END, text)
+            widget.see(tk.END)
+            widget.config(state=tk.DISABLED)
+        self.root.after(0, _append)
+
+    def _generate_tool_in_thread(self, request_text, _max_tokens, stream=False, bypass_cache=False, allow_duplicate=False):
         """在新线程中生成工具"""
         try:
-            openai.api_key  = self.api_key   
-            openai.api_base  = "https://api.deepseek.com/v1"  
-            
-            response = openai.ChatCompletion.create(  
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": get_system_prompt()},
-                    {"role": "user", "content": request_text},
-                ],
-                max_tokens=_max_tokens 
+            # 请求模型并去除代码块标记，流式模式下同时更新预览 
+            tool_name = self.core.generate_tool(
+                request_text, _max_tokens,
+                stream=stream,
+                bypass_cache=bypass_cache,
+                on_delta=(lambda text: self.append_preview_text(self.preview_text, text)) if stream else None,
+                cancel_event=self.generate_cancel_event if stream else None,
+                on_retry=(lambda problems: self.append_preview_text(
+                    self.preview_text, f"\n\n# 代码未通过校验（{'；'.join(problems)}），正在重新生成...\n\n"
+                )) if stream else None,
+                allow_duplicate=allow_duplicate
             )
             
-            tool_code = response.choices[0].message.content   
- 
-            # 去除代码块标记 
-            if tool_code.startswith("```python"):  
-                tool_code = tool_code[9:]
-            if tool_code.endswith("```"):  
-                tool_code = tool_code[:-3]
-            tool_code = tool_code.strip()  
-            
-            # 提取工具名称 
-            tool_name = self.extract_tool_name(tool_code)  
-            if not tool_name:
-                tool_name = f"tool_{datetime.now().strftime('%Y%m%d_%H%M%S')}"  
-            
-            # 保存工具文件 
-            tool_path = os.path.join(self.tools_dir,  f"{tool_name}.py")
-            with open(tool_path, "w", encoding="utf-8") as f:
-                f.write(tool_code)  
-            
             # 使用主线程更新UI，因为tkinter的UI更新必须在主线程中进行 
             self.root.after(0,  lambda: messagebox.showinfo(" 成功", f"工具 '{tool_name}' 已生成并保存"))
+            threading.Thread(target=self._prefetch_dependencies, args=([tool_name],), daemon=True).start()
             self.root.after(0,  self.refresh_tool_list)  
             
+        except GenerationCancelled:
+            self.root.after(0, lambda: messagebox.showinfo(" 已取消", "工具生成已取消"))
+        except SimilarToolExists as e:
+            # 已有相似的工具，没有请求模型 
+            matches = e.matches
+            self.root.after(0, lambda: self._ask_similar_tool(matches, request_text, bypass_cache))
         except Exception as e:
             # 使用主线程更新UI 
-            self.root.after(0,  lambda: messagebox.showerror(" 错误", f"生成工具失败: {str(e)}"))
+            error = str(e)
+            self.root.after(0,  lambda: messagebox.showerror(" 错误", f"生成工具失败: {error}"))
         finally:
             # 无论成功或失败，都重新启用生成按钮 
             self.root.after(0,  lambda: self.generate_button.config(state=tk.NORMAL)) 
+            self.root.after(0, lambda: self.cancel_button.config(state=tk.DISABLED))
     
-    def extract_tool_name(self, code):
-        """从代码中提取工具名称"""
-        try:
-            # 优先尝试从main函数的docstring中提取 
-            main_func_match = re.search(r'def\s+main\s*\(\s*\):\s*\"\"\"\s*(.*?)\s*\"\"\"',  code, re.DOTALL)
-            if main_func_match:
-                docstring = main_func_match.group(1).strip() 
-                first_line = docstring.split('\n')[0].strip() 
-                if first_line:
-                    return re.sub(r'[^a-zA-Z0-9_]',  '', first_line.replace('  ', '_')).lower() or f"tool_{datetime.now().strftime('%Y%m%d_%H%M%S')}" 
- 
-            # 尝试从描述中提取 
-            desc_match = re.search(r'"description":\s*"([^"]+)"',  code)
-            if desc_match:
-                desc = desc_match.group(1).strip() 
-                if desc:
-                    return re.sub(r'[^a-zA-Z0-9_]',  '', desc.split()[0].replace('  ', '_')).lower()
- 
-            # 如果以上方法都失败，使用随机名称 
-            return f"tool_{datetime.now().strftime('%Y%m%d_%H%M%S')}" 
-        except:
-            return f"tool_{datetime.now().strftime('%Y%m%d_%H%M%S')}" 
+    def _ask_similar_tool(self, matches, request_text, bypass_cache):
+        """已有相似工具时，让用户选择打开、运行或修改已有工具，或者仍然生成新工具"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title(" 已有相似的工具")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        ttk.Label(dialog, text="以下已有工具与需求相似，可以直接使用:").pack(anchor=tk.W, padx=15, pady=(10, 5))
+        match_list = tk.Listbox(dialog, height=min(len(matches), 5), width=60)
+        match_list.pack(fill=tk.X, padx=15)
+        for tool_name, score in matches:
+            description = self.core.tools.get(tool_name, {}).get("description") or ""
+            match_list.insert(tk.END, f"{tool_name}（相似度 {score:.0%}）  {description}")
+        match_list.selection_set(0)
+        
+        def use(action):
+            selection = match_list.curselection()
+            tool_name = matches[selection[0] if selection else 0][0]
+            dialog.destroy()
+            action(tool_name)
+        
+        def generate_anyway():
+            dialog.destroy()
+            self._start_generation(request_text, bypass_cache, allow_duplicate=True)
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="打开", command=lambda: use(self.edit_tool)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="运行", command=lambda: use(self.run_tool)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="修改", command=lambda: use(self.modify_tool)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="仍然生成", command=generate_anyway).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
     
-    def run_tool(self):
-        """运行选中的工具"""
-        selected_item = self.tool_tree.focus()  
-        if not selected_item:
-            messagebox.showerror(" 错误", "请先选择一个工具")
-            return 
+    def open_batch_window(self):
+        """打开批量生成窗口"""
+        if self.batch_window is not None and self.batch_window.winfo_exists():
+            self.batch_window.lift()
+            return
         
-        tool_name = self.tool_tree.item(selected_item,  "text")
-        tool_path = os.path.join(self.tools_dir,  f"{tool_name}.py")
+        batch_window = tk.Toplevel(self.root)
+        batch_window.title(" 批量生成")
+        batch_window.geometry("750x550")
+        self.batch_window = batch_window
+        
+        ttk.Label(batch_window, text="工具需求描述（每行一个）:").pack(anchor=tk.W, padx=10, pady=5)
+        requests_entry = scrolledtext.ScrolledText(batch_window, height=8, width=80)
+        requests_entry.pack(fill=tk.X, padx=10, pady=5)
+        
+        # 并发与限速设置 
+        settings_frame = ttk.Frame(batch_window)
+        settings_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(settings_frame, text="并发数:").pack(side=tk.LEFT)
+        concurrency_entry = ttk.Entry(settings_frame, width=5)
+        concurrency_entry.pack(side=tk.LEFT, padx=5)
+        concurrency_entry.insert(0, str(self.core.concurrency))
+        ttk.Label(settings_frame, text="每分钟请求数:").pack(side=tk.LEFT)
+        rpm_entry = ttk.Entry(settings_frame, width=6)
+        rpm_entry.pack(side=tk.LEFT, padx=5)
+        rpm_entry.insert(0, str(self.core.requests_per_minute))
+        ttk.Label(settings_frame, text="每分钟Token数:").pack(side=tk.LEFT)
+        tpm_entry = ttk.Entry(settings_frame, width=8)
+        tpm_entry.pack(side=tk.LEFT, padx=5)
+        tpm_entry.insert(0, str(self.core.tokens_per_minute))
+        allow_duplicate_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="已有相似工具时仍然生成", variable=allow_duplicate_var).pack(side=tk.LEFT, padx=5)
+        
+        def submit_jobs():
+            if not self.core.api_key:
+                messagebox.showerror(" 错误", "请先配置API Key")
+                return
+            request_texts = [line.strip() for line in requests_entry.get("1.0", tk.END).splitlines() if line.strip()]
+            if not request_texts:
+                messagebox.showerror(" 错误", "请输入工具需求描述")
+                return
+            try:
+                concurrency = int(concurrency_entry.get().strip())
+                requests_per_minute = int(rpm_entry.get().strip())
+                tokens_per_minute = int(tpm_entry.get().strip())
+                if concurrency <= 0 or requests_per_minute < 0 or tokens_per_minute < 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror(" 错误", "并发数必须是正整数，限速必须是非负整数")
+                return
+            
+            # 保存设置，之后提交的任务按新设置执行 
+            self.core.set_batch_limits(self.generation_queue, concurrency, requests_per_minute, tokens_per_minute)
+            
+            self.generation_queue.submit_many(request_texts, allow_duplicate=allow_duplicate_var.get())
+            requests_entry.delete("1.0", tk.END)
+        
+        ttk.Button(settings_frame, text="提交任务", command=submit_jobs).pack(side=tk.RIGHT)
+        
+        # 任务列表 
+        self.job_tree = ttk.Treeview(batch_window, columns=("request", "status", "result"), show="headings")
+        self.job_tree.heading("request", text="需求")
+        self.job_tree.heading("status", text="状态")
+        self.job_tree.heading("result", text="结果")
+        self.job_tree.column("request", width=350)
+        self.job_tree.column("status", width=80)
+        self.job_tree.column("result", width=250)
+        self.job_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        for job in self.generation_queue.jobs:
+            self._update_job_row(job)
+    
+    def _on_job_update(self, job):
+        """任务状态变化时更新任务列表，任务完成后刷新工具列表"""
+        self._update_job_row(job)
+        if job.status == JOB_DONE:
+            self.refresh_tool_list()
+    
+    def _update_job_row(self, job):
+        """在任务列表中显示任务的最新状态"""
+        if self.batch_window is None or not self.batch_window.winfo_exists():
+            return
+        result = job.result or job.error or ""
+        values = (job.request_text, job.status_label, result)
+        iid = f"job{job.job_id}"
+        if self.job_tree.exists(iid):
+            self.job_tree.item(iid, values=values)
+        else:
+            self.job_tree.insert("", tk.END, iid=iid, values=values)
+    
+    def open_stats_window(self):
+        """打开性能统计窗口，显示各阶段耗时和各模型的 token 用量"""
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.lift()
+            return
+        
+        stats_window = tk.Toplevel(self.root)
+        stats_window.title(" 性能统计")
+        stats_window.geometry("650x450")
+        self.stats_window = stats_window
+        
+        ttk.Label(stats_window, text="各阶段耗时（毫秒）:").pack(anchor=tk.W, padx=10, pady=5)
+        span_tree = ttk.Treeview(stats_window, columns=("count", "p50", "p95", "mean"), height=8)
+        span_tree.heading("#0", text="阶段")
+        span_tree.heading("count", text="次数")
+        span_tree.heading("p50", text="p50")
+        span_tree.heading("p95", text="p95")
+        span_tree.heading("mean", text="平均")
+        span_tree.column("#0", width=200)
+        for column in ("count", "p50", "p95", "mean"):
+            span_tree.column(column, width=90, anchor=tk.E)
+        span_tree.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Label(stats_window, text="各模型Token用量:").pack(anchor=tk.W, padx=10, pady=5)
+        usage_columns = ("requests", "prompt", "completion", "cached", "speed")
+        usage_tree = ttk.Treeview(stats_window, columns=usage_columns, height=5)
+        usage_tree.heading("#0", text="模型")
+        usage_tree.heading("requests", text="请求数")
+        usage_tree.heading("prompt", text="输入Token")
+        usage_tree.heading("completion", text="输出Token")
+        usage_tree.heading("cached", text="缓存命中Token")
+        usage_tree.heading("speed", text="输出Token/秒")
+        usage_tree.column("#0", width=150)
+        for column in usage_columns:
+            usage_tree.column(column, width=90, anchor=tk.E)
+        usage_tree.pack(fill=tk.X, padx=10, pady=5)
+        
+        def refresh():
+            if not stats_window.winfo_exists():
+                return
+            instrumentation = self.core.instrumentation
+            span_tree.delete(*span_tree.get_children())
+            for name, stats in sorted(instrumentation.span_stats().items()):
+                span_tree.insert("", tk.END, text=SPAN_LABELS.get(name, name), values=(
+                    stats["count"], stats["p50_ms"], stats["p95_ms"], stats["mean_ms"]
+                ))
+            usage_tree.delete(*usage_tree.get_children())
+            for model, stats in sorted(instrumentation.usage_stats().items()):
+                usage_tree.insert("", tk.END, text=model, values=(
+                    stats["requests"], stats["prompt_tokens"], stats["completion_tokens"],
+                    stats["cached_tokens"], stats["tokens_per_second"]
+                ))
+            # 窗口打开期间每秒刷新一次 
+            self.root.after(1000, refresh)
+        
+        def clear():
+            self.core.instrumentation.clear()
+        
+        button_frame = ttk.Frame(stats_window)
+        button_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(button_frame, text="清空", command=clear).pack(side=tk.RIGHT)
+        
+        refresh()
+    
+    def run_tool(self, tool_name=None):
+        """运行工具（默认为选中的工具）"""
+        if tool_name is None:
+            selected_item = self.tool_tree.focus()  
+            if not selected_item:
+                messagebox.showerror(" 错误", "请先选择一个工具")
+                return 
+            
+            tool_name = self.tool_tree.item(selected_item,  "text")
+        
+        # 第一次运行前需要安装依赖时在后台安装，完成后自动运行，不阻塞界面 
+        if self.core.auto_install_dependencies:
+            try:
+                missing = self.core.missing_dependencies([tool_name])
+            except Exception as e:
+                messagebox.showerror(" 错误", f"检查工具依赖失败: {str(e)}")
+                return 
+            if missing:
+                messagebox.showinfo(" 正在安装依赖", f"正在安装 {', '.join(sorted(missing))}，完成后自动运行工具")
+                threading.Thread(target=self._install_then_run, args=(tool_name,), daemon=True).start()
+                return 
         
         try:
-            if sys.platform  == "win32":
-                os.startfile(tool_path)  
-            else:
-                subprocess.run(["python",  tool_path])
+            # 在后台进程中运行，输出显示在运行管理窗口中，不阻塞界面 
+            run = self.core.start_tool(self.process_manager, tool_name)
         except Exception as e:
             messagebox.showerror(" 错误", f"启动工具失败: {str(e)}")
-    
-    def edit_tool(self):
-        """编辑选中的工具"""
-        selected_item = self.tool_tree.focus()  
-        if not selected_item:
-            messagebox.showerror(" 错误", "请先选择一个工具")
             return 
         
-        tool_name = self.tool_tree.item(selected_item,  "text")
-        tool_path = os.path.join(self.tools_dir,  f"{tool_name}.py")
+        self.open_run_window()
+        self._update_run_row(run)
+        self.run_tree.selection_set(f"run{run.run_id}")
+    
+    def _install_then_run(self, tool_name):
+        """在后台线程中安装工具缺少的依赖，然后回到主线程运行工具"""
+        try:
+            result = self.core.install_dependencies([tool_name])
+        except Exception as e:
+            error = str(e)
+            self.root.after(0, lambda: messagebox.showerror(" 错误", f"安装工具依赖失败: {error}"))
+            return
+        if result["failed"]:
+            failed = "\n".join(f"{package}: {reason}" for package, reason in result["failed"].items())
+            self.root.after(0, lambda: messagebox.showwarning(" 部分依赖安装失败", failed))
+        self.root.after(0, lambda: self.run_tool(tool_name))
+    
+    def _prefetch_dependencies(self, tool_names):
+        """新生成或导入的工具在后台提前安装依赖，第一次运行时无需等待"""
+        if not self.core.auto_install_dependencies:
+            return
+        try:
+            self.core.install_dependencies(tool_names)
+        except Exception as e:
+            print(f"安装工具依赖失败: {str(e)}")
+    
+    def open_run_window(self):
+        """打开运行管理窗口"""
+        if self.run_window is not None and self.run_window.winfo_exists():
+            self.run_window.lift()
+            return
+        
+        run_window = tk.Toplevel(self.root)
+        run_window.title(" 运行管理")
+        run_window.geometry("900x550")
+        self.run_window = run_window
+        
+        # 左侧：运行列表 
+        list_frame = ttk.Frame(run_window, padding="5")
+        list_frame.pack(side=tk.LEFT, fill=tk.Y)
+        
+        self.run_tree = ttk.Treeview(list_frame, columns=("tool", "status", "duration", "returncode"), show="headings", selectmode="browse")
+        self.run_tree.heading("tool", text="工具")
+        self.run_tree.heading("status", text="状态")
+        self.run_tree.heading("duration", text="用时(秒)")
+        self.run_tree.heading("returncode", text="退出码")
+        self.run_tree.column("tool", width=150)
+        self.run_tree.column("status", width=60)
+        self.run_tree.column("duration", width=70)
+        self.run_tree.column("returncode", width=50)
+        self.run_tree.pack(fill=tk.Y, expand=True)
+        self.run_tree.bind("<<TreeviewSelect>>", lambda event: self._show_run_output())
+        
+        control_frame = ttk.Frame(list_frame)
+        control_frame.pack(fill=tk.X, pady=5)
+        ttk.Button(control_frame, text="终止", command=self.kill_selected_run).pack(side=tk.LEFT, padx=2)
+        ttk.Button(control_frame, text="清除已结束", command=self.clear_finished_runs).pack(side=tk.LEFT, padx=2)
+        
+        timeout_frame = ttk.Frame(list_frame)
+        timeout_frame.pack(fill=tk.X)
+        ttk.Label(timeout_frame, text="超时(秒，0为不限):").pack(side=tk.LEFT)
+        timeout_entry = ttk.Entry(timeout_frame, width=6)
+        timeout_entry.pack(side=tk.LEFT, padx=2)
+        timeout_entry.insert(0, str(self.core.run_timeout))
+        
+        def save_timeout():
+            try:
+                timeout = float(timeout_entry.get().strip())
+                if timeout < 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror(" 错误", "超时必须是非负数")
+                return
+            self.core.run_timeout = timeout
+            self.core.save_config()
+        ttk.Button(timeout_frame, text="应用", command=save_timeout).pack(side=tk.LEFT)
+        
+        # 右侧：输出与输入 
+        output_frame = ttk.Frame(run_window, padding="5")
+        output_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.run_output_text = scrolledtext.ScrolledText(output_frame, state=tk.DISABLED)
+        self.run_output_text.tag_configure("stderr", foreground="red")
+        self.run_output_text.pack(fill=tk.BOTH, expand=True)
+        
+        input_frame = ttk.Frame(output_frame)
+        input_frame.pack(fill=tk.X, pady=5)
+        self.run_input_entry = ttk.Entry(input_frame)
+        self.run_input_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.run_input_entry.bind("<Return>", lambda event: self.send_run_input())
+        ttk.Button(input_frame, text="发送", command=self.send_run_input).pack(side=tk.LEFT, padx=2)
+        ttk.Button(input_frame, text="结束输入", command=self.close_run_input).pack(side=tk.LEFT, padx=2)
+        
+        for run in self.process_manager.runs.values():
+            self._update_run_row(run)
+        self._tick_run_durations()
+    
+    def _selected_run(self):
+        """返回运行管理窗口中选中的运行"""
+        selection = self.run_tree.selection()
+        if not selection:
+            return None
+        return self.process_manager.get(int(selection[0][3:]))
+    
+    def _update_run_row(self, run):
+        """在运行列表中显示运行的最新状态"""
+        if self.run_window is None or not self.run_window.winfo_exists():
+            return
+        returncode = "" if run.returncode is None else run.returncode
+        values = (run.tool_name, run.status_label, f"{run.duration:.1f}", returncode)
+        iid = f"run{run.run_id}"
+        if self.run_tree.exists(iid):
+            self.run_tree.item(iid, values=values)
+        else:
+            self.run_tree.insert("", 0, iid=iid, values=values)
+    
+    def _tick_run_durations(self):
+        """每秒刷新正在运行的工具的用时"""
+        if self.run_window is None or not self.run_window.winfo_exists():
+            return
+        for run in self.process_manager.running():
+            self._update_run_row(run)
+        self.run_window.after(1000, self._tick_run_durations)
+    
+    def _show_run_output(self):
+        """显示选中运行的全部输出"""
+        run = self._selected_run()
+        self.run_output_text.config(state=tk.NORMAL)
+        self.run_output_text.delete("1.0", tk.END)
+        if run is not None:
+            for stream, text in list(run.output):
+                self.run_output_text.insert(tk.END, text, stream)
+            self.run_output_text.see(tk.END)
+        self.run_output_text.config(state=tk.DISABLED)
+    
+    def _on_run_output(self, run, stream, text):
+        """工具有新输出时追加到输出面板（仅当该运行被选中）"""
+        if self.run_window is None or not self.run_window.winfo_exists():
+            return
+        if self._selected_run() is not run:
+            return
+        self.run_output_text.config(state=tk.NORMAL)
+        self.run_output_text.insert(tk.END, text, stream)
+        self.run_output_text.see(tk.END)
+        self.run_output_text.config(state=tk.DISABLED)
+    
+    def send_run_input(self):
+        """把输入框的内容发送到选中运行的标准输入"""
+        run = self._selected_run()
+        if run is None:
+            messagebox.showerror(" 错误", "请先选择一个运行")
+            return
+        text = self.run_input_entry.get()
+        try:
+            run.write_stdin(text + "\n")
+        except Exception as e:
+            messagebox.showerror(" 错误", f"发送输入失败: {str(e)}")
+            return
+        self.run_input_entry.delete(0, tk.END)
+    
+    def close_run_input(self):
+        """关闭选中运行的标准输入"""
+        run = self._selected_run()
+        if run is not None:
+            run.close_stdin()
+    
+    def kill_selected_run(self):
+        """终止选中的运行"""
+        run = self._selected_run()
+        if run is not None:
+            run.kill()
+            self._update_run_row(run)
+    
+    def clear_finished_runs(self):
+        """从列表中清除已经结束的运行"""
+        for run_id in self.process_manager.clear_finished():
+            if self.run_tree.exists(f"run{run_id}"):
+                self.run_tree.delete(f"run{run_id}")
+        self._show_run_output()
+    
+    def edit_tool(self, tool_name=None):
+        """编辑工具（默认为选中的工具）"""
+        if tool_name is None:
+            selected_item = self.tool_tree.focus()  
+            if not selected_item:
+                messagebox.showerror(" 错误", "请先选择一个工具")
+                return 
+            
+            tool_name = self.tool_tree.item(selected_item,  "text")
+        tool_path = self.core.tool_path(tool_name)
         
         try:
             # 使用 subprocess 启动记事本而不显示 CMD 窗口 
@@ -399,71 +797,204 @@ class ToolBoxApp:
         tool_name = self.tool_tree.item(selected_item,  "text")
         
         if messagebox.askyesno(" 确认", f"确定要删除工具 '{tool_name}' 吗?"):
-            tool_path = os.path.join(self.tools_dir,  f"{tool_name}.py")
             try:
-                os.remove(tool_path)  
+                self.core.delete_tool(tool_name)
                 self.refresh_tool_list()  
                 messagebox.showinfo(" 成功", f"工具 '{tool_name}' 已删除")
             except Exception as e:
                 messagebox.showerror(" 错误", f"删除工具失败: {str(e)}")
     
     def export_tool(self):
-        """导出选中的工具"""
-        selected_item = self.tool_tree.focus()  
-        if not selected_item:
+        """导出选中的工具，选中多个工具时导出为一个工具包"""
+        tool_names = [self.tool_tree.item(item, "text") for item in self.tool_tree.selection()]
+        if not tool_names:
             messagebox.showerror(" 错误", "请先选择一个工具")
             return 
         
-        tool_name = self.tool_tree.item(selected_item,  "text")
-        tool_path = os.path.join(self.tools_dir,  f"{tool_name}.py")
-        
-        export_path = filedialog.asksaveasfilename(  
-            title="导出工具",
-            initialfile=f"{tool_name}.py",
-            defaultextension=".py",
-            filetypes=[("Python Files", "*.py"), ("All Files", "*.*")]
-        )
+        if len(tool_names) == 1:
+            tool_name = tool_names[0]
+            export_path = filedialog.asksaveasfilename(  
+                title="导出工具",
+                initialfile=f"{tool_name}.py",
+                defaultextension=".py",
+                filetypes=[("Python Files", "*.py"), ("工具包", "*.zip"), ("All Files", "*.*")]
+            )
+        else:
+            export_path = filedialog.asksaveasfilename(
+                title=f"导出 {len(tool_names)} 个工具",
+                initialfile="tools.zip",
+                defaultextension=".zip",
+                filetypes=[("工具包", "*.zip"), ("All Files", "*.*")]
+            )
         
         if export_path:
             try:
-                with open(tool_path, "r", encoding="utf-8") as src, \
-                     open(export_path, "w", encoding="utf-8") as dst:
-                    dst.write(src.read())  
-                messagebox.showinfo(" 成功", f"工具 '{tool_name}' 已导出到 {export_path}")
+                if export_path.lower().endswith(".zip"):
+                    count = self.core.export_tools(tool_names, export_path)
+                    messagebox.showinfo(" 成功", f"{count} 个工具已导出到 {export_path}")
+                else:
+                    self.core.export_tool(tool_names[0], export_path)
+                    messagebox.showinfo(" 成功", f"工具 '{tool_names[0]}' 已导出到 {export_path}")
             except Exception as e:
                 messagebox.showerror(" 错误", f"导出工具失败: {str(e)}")
     
+    def _ask_conflict_policy(self, conflicts):
+        """询问同名工具的处理方式，返回 overwrite/rename/skip，取消时返回 None"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title(" 工具已存在")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        shown = "\n".join(conflicts[:10])
+        if len(conflicts) > 10:
+            shown += f"\n... 等 {len(conflicts)} 个工具"
+        ttk.Label(dialog, text=f"以下工具已存在:\n{shown}\n\n请选择处理方式:").pack(padx=15, pady=10)
+        
+        choice = {"policy": None}
+        def choose(policy):
+            choice["policy"] = policy
+            dialog.destroy()
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="覆盖", command=lambda: choose("overwrite")).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="重命名", command=lambda: choose("rename")).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="跳过", command=lambda: choose("skip")).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        self.root.wait_window(dialog)
+        return choice["policy"]
+    
     def import_tool(self):
-        """导入工具"""
-        import_path = filedialog.askopenfilename(  
+        """导入工具，可以同时选择多个 .py 文件或工具包"""
+        import_paths = filedialog.askopenfilenames(  
             title="导入工具",
-            filetypes=[("Python Files", "*.py"), ("All Files", "*.*")]
+            filetypes=[("Python Files", "*.py"), ("工具包", "*.zip"), ("All Files", "*.*")]
         )
         
-        if import_path:
+        if import_paths:
             try:
-                # 获取工具名称 
-                tool_name = os.path.basename(import_path)[:-3]  
-                if not tool_name:
-                    raise ValueError("无效的文件名")
-                
-                # 检查是否已存在 
-                tool_path = os.path.join(self.tools_dir,  f"{tool_name}.py")
-                if os.path.exists(tool_path):  
-                    if not messagebox.askyesno(" 确认", f"工具 '{tool_name}' 已存在，是否覆盖?"):
+                # 检查是否有同名工具 
+                policy = "skip"
+                conflicts = self.core.find_import_conflicts(import_paths)
+                if conflicts:
+                    policy = self._ask_conflict_policy(conflicts)
+                    if policy is None:
                         return 
                 
-                # 复制文件 
-                with open(import_path, "r", encoding="utf-8") as src, \
-                     open(tool_path, "w", encoding="utf-8") as dst:
-                    dst.write(src.read())  
+                # 复制文件，完成后一次性更新工具列表 
+                result = self.core.import_tools(import_paths, policy=policy)
+                self._render_tools()
+                threading.Thread(target=self._prefetch_dependencies, args=(result["imported"],), daemon=True).start()
                 
-                self.refresh_tool_list()  
-                messagebox.showinfo(" 成功", f"工具 '{tool_name}' 已导入")
+                message = f"已导入 {len(result['imported'])} 个工具"
+                if result["skipped"]:
+                    message += f"，跳过 {len(result['skipped'])} 个"
+                if result["renamed"]:
+                    message += f"，重命名 {len(result['renamed'])} 个"
+                if result["failed"]:
+                    failed = "\n".join(f"{name}: {reason}" for name, reason in result["failed"].items())
+                    messagebox.showwarning(" 部分失败", f"{message}\n\n以下工具导入失败:\n{failed}")
+                else:
+                    messagebox.showinfo(" 成功", message)
                 
             except Exception as e:
+                self._render_tools()
                 messagebox.showerror(" 错误", f"导入工具失败: {str(e)}")
     
+    def open_history_window(self, tool_name=None):
+        """查看工具的历史版本，可以比较差异并恢复到任意版本"""
+        if tool_name is None:
+            selected_item = self.tool_tree.focus()
+            if not selected_item:
+                messagebox.showerror(" 错误", "请先选择一个工具")
+                return 
+            tool_name = self.tool_tree.item(selected_item, "text")
+        
+        history_window = tk.Toplevel(self.root)
+        history_window.title(f" 历史版本 - {tool_name}")
+        history_window.geometry("800x600")
+        
+        # 版本列表 
+        revision_tree = ttk.Treeview(history_window, columns=("time", "action", "prompt"), height=8)
+        revision_tree.heading("#0", text="版本")
+        revision_tree.heading("time", text="时间")
+        revision_tree.heading("action", text="操作")
+        revision_tree.heading("prompt", text="提示")
+        revision_tree.column("#0", width=60)
+        revision_tree.column("time", width=140)
+        revision_tree.column("action", width=110)
+        revision_tree.column("prompt", width=450)
+        revision_tree.pack(fill=tk.X, padx=10, pady=5)
+        
+        # 差异预览 
+        diff_text = scrolledtext.ScrolledText(history_window, height=20, state=tk.DISABLED)
+        diff_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        def load_revisions():
+            revision_tree.delete(*revision_tree.get_children())
+            try:
+                revisions = self.core.tool_revisions(tool_name)
+            except Exception as e:
+                messagebox.showerror(" 错误", f"读取历史版本失败: {str(e)}", parent=history_window)
+                return 
+            for revision in reversed(revisions):
+                prompt = (revision.get("prompt") or "").replace("\n", " ")
+                revision_tree.insert("", tk.END, iid=str(revision["rev"]), text=str(revision["rev"]), values=(
+                    revision["time"], ACTION_LABELS.get(revision["action"], revision["action"]), prompt
+                ))
+            if not revisions:
+                self.set_preview_text(diff_text, "这个工具还没有历史版本，生成、修改或更改信息后会自动记录。")
+        
+        def selected_rev():
+            selection = revision_tree.selection()
+            return int(selection[0]) if selection else None
+        
+        def show_diff(against_previous=False):
+            rev = selected_rev()
+            if rev is None:
+                return 
+            try:
+                if against_previous:
+                    revs = [revision["rev"] for revision in self.core.tool_revisions(tool_name)]
+                    index = revs.index(rev)
+                    if index == 0:
+                        text = self.core.history.read_revision(tool_name, rev)
+                    else:
+                        text = self.core.diff_revision(tool_name, revs[index - 1], rev)
+                else:
+                    text = self.core.diff_revision(tool_name, rev)
+            except Exception as e:
+                messagebox.showerror(" 错误", f"比较版本失败: {str(e)}", parent=history_window)
+                return 
+            self.set_preview_text(diff_text, text or "与当前代码相同")
+        
+        def restore():
+            rev = selected_rev()
+            if rev is None:
+                messagebox.showerror(" 错误", "请先选择一个版本", parent=history_window)
+                return 
+            if not messagebox.askyesno(" 确认", f"确定要把工具 '{tool_name}' 恢复到版本 {rev} 吗?", parent=history_window):
+                return 
+            try:
+                self.core.restore_revision(tool_name, rev)
+            except Exception as e:
+                messagebox.showerror(" 错误", f"恢复版本失败: {str(e)}", parent=history_window)
+                return 
+            self._render_tools()
+            load_revisions()
+            messagebox.showinfo(" 成功", f"已恢复到版本 {rev}", parent=history_window)
+        
+        revision_tree.bind("<<TreeviewSelect>>", lambda event: show_diff())
+        
+        button_frame = ttk.Frame(history_window)
+        button_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(button_frame, text="与当前代码比较", command=show_diff).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="与上一版本比较", command=lambda: show_diff(True)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="恢复此版本", command=restore).pack(side=tk.RIGHT, padx=5)
+        
+        load_revisions()
+    
     def edit_tool_info(self):
         """编辑工具信息"""
         selected_item = self.tool_tree.focus() 
@@ -472,7 +1003,7 @@ class ToolBoxApp:
             return 
         
         tool_name = self.tool_tree.item(selected_item,  "text")
-        tool_info = self.tools.get(tool_name) 
+        tool_info = self.core.tools.get(tool_name) 
         if not tool_info:
             messagebox.showerror(" 错误", "无法获取工具信息")
             return 
@@ -504,35 +1035,7 @@ class ToolBoxApp:
                 return 
             
             try:
-                # 如果名称改变了，需要重命名文件 
-                if new_name != tool_name:
-                    old_path = os.path.join(self.tools_dir,  f"{tool_name}.py")
-                    new_path = os.path.join(self.tools_dir,  f"{new_name}.py")
-                    
-                    if os.path.exists(new_path): 
-                        messagebox.showerror(" 错误", f"工具 '{new_name}' 已存在")
-                        return 
-                    
-                    os.rename(old_path,  new_path)
-                
-                # 更新元数据 
-                tool_path = os.path.join(self.tools_dir,  f"{new_name}.py")
-                with open(tool_path, "r+", encoding="utf-8") as f:
-                    content = f.read() 
-                    
-                    # 查找并更新元数据 
-                    metadata_start = content.find('#  metadata = {')
-                    if metadata_start != -1:
-                        metadata_end = content.find('}',  metadata_start)
-                        if metadata_end != -1:
-                            # 构造新的元数据字符串 
-                            new_metadata = f'# metadata = {{"description": "{new_desc}", "created": "{tool_info["created"]}"}}'
-                            new_content = content[:metadata_start] + new_metadata + content[metadata_end+1:]
-                            
-                            # 写回文件 
-                            f.seek(0) 
-                            f.write(new_content) 
-                            f.truncate() 
+                self.core.update_tool_info(tool_name, new_name, new_desc)
                 
                 # 刷新工具列表 
                 self.refresh_tool_list() 
@@ -544,15 +1047,16 @@ class ToolBoxApp:
         
         ttk.Button(edit_window, text="保存", command=save_changes).grid(row=2, column=1, padx=5, pady=5, sticky=tk.E)
     
-    def modify_tool(self):
-        """修改工具代码"""
-        selected_item = self.tool_tree.focus() 
-        if not selected_item:
-            messagebox.showerror(" 错误", "请先选择一个工具")
-            return 
-        
-        tool_name = self.tool_tree.item(selected_item,  "text")
-        tool_info = self.tools.get(tool_name) 
+    def modify_tool(self, tool_name=None):
+        """修改工具代码（默认为选中的工具）"""
+        if tool_name is None:
+            selected_item = self.tool_tree.focus() 
+            if not selected_item:
+                messagebox.showerror(" 错误", "请先选择一个工具")
+                return 
+            
+            tool_name = self.tool_tree.item(selected_item,  "text")
+        tool_info = self.core.tools.get(tool_name) 
         if not tool_info:
             messagebox.showerror(" 错误", "无法获取工具信息")
             return 
@@ -560,7 +1064,7 @@ class ToolBoxApp:
         # 创建修改对话框 
         modify_window = tk.Toplevel(self.root) 
         modify_window.title(" 修改工具")
-        modify_window.geometry("600x400") 
+        modify_window.geometry("600x650") 
         
         # 显示当前工具信息 
         ttk.Label(modify_window, text=f"工具: {tool_name}").pack(pady=5)
@@ -586,53 +1090,65 @@ class ToolBoxApp:
                 messagebox.showerror(" 错误", f"读取工具代码失败: {str(e)}")
                 return 
             
+            stream = self.stream_var.get()
+            cancel_event = CancelEvent() if stream else None
+            
             # 在新线程中修改工具 
             def _modify_tool_in_thread():
                 try:
-                    openai.api_key  = self.api_key   
-                    openai.api_base  = "https://api.deepseek.com/v1"  
-                    
-                    # 构造修改请求 
-                    modify_request = f"请根据以下提示修改以下Python工具代码:\n\n修改提示: {modify_prompt}\n\n当前代码:\n```python\n{current_code}\n```"
-                    
-                    response = openai.ChatCompletion.create(  
-                        model="deepseek-chat",
-                        messages=[
-                            {"role": "system", "content": get_system_prompt()},
-                            {"role": "user", "content": modify_request},
-                        ],
-                        max_tokens=self.max_tokens  
+                    # 请求模型修改代码并保存，流式模式下同时更新预览 
+                    self.core.modify_tool(
+                        tool_name, modify_prompt,
+                        current_code=current_code,
+                        stream=stream,
+                        on_delta=lambda text: self.append_preview_text(preview_text, text),
+                        cancel_event=cancel_event,
+                        on_fallback=lambda reason: self.append_preview_text(
+                            preview_text, f"\n\n# 修改块无法应用（{reason}），正在重新生成完整代码...\n\n"
+                        ),
+                        on_retry=lambda problems: self.append_preview_text(
+                            preview_text, f"\n\n# 代码未通过校验（{'；'.join(problems)}），正在重新生成...\n\n"
+                        )
                     )
                     
-                    modified_code = response.choices[0].message.content   
- 
-                    # 去除代码块标记 
-                    if modified_code.startswith("```python"):  
-                        modified_code = modified_code[9:]
-                    if modified_code.endswith("```"):  
-                        modified_code = modified_code[:-3]
-                    modified_code = modified_code.strip() 
-                    
-                    # 保存修改后的代码 
-                    with open(tool_info["path"], "w", encoding="utf-8") as f:
-                        f.write(modified_code) 
-                    
                     # 使用主线程更新UI 
                     self.root.after(0,  lambda: messagebox.showinfo(" 成功", "工具已成功修改"))
                     self.root.after(0,  self.refresh_tool_list) 
                     self.root.after(0,  modify_window.destroy) 
                     
+                except GenerationCancelled:
+                    self.root.after(0, lambda: messagebox.showinfo(" 已取消", "工具修改已取消"))
                 except Exception as e:
                     # 使用主线程更新UI 
-                    self.root.after(0,  lambda: messagebox.showerror(" 错误", f"修改工具失败: {str(e)}"))
+                    error = str(e)
+                    self.root.after(0,  lambda: messagebox.showerror(" 错误", f"修改工具失败: {error}"))
+                finally:
+                    self.root.after(0, lambda: submit_button.winfo_exists() and submit_button.config(state=tk.NORMAL))
+                    self.root.after(0, lambda: cancel_button.winfo_exists() and cancel_button.config(state=tk.DISABLED))
             
-            # 显示进度信息 
-            messagebox.showinfo(" 正在修改工具", "工具修改中，请稍候...")
+            submit_button.config(state=tk.DISABLED)
+            if stream:
+                # 流式模式下在预览区显示进度，并允许中途取消 
+                cancel_button.config(command=cancel_event.set, state=tk.NORMAL)
+                self.set_preview_text(preview_text, "")
+            else:
+                # 显示进度信息 
+                messagebox.showinfo(" 正在修改工具", "工具修改中，请稍候...")
             
             # 启动新线程 
             threading.Thread(target=_modify_tool_in_thread).start()
         
-        ttk.Button(modify_window, text="提交修改", command=submit_modification).pack(pady=10)
+        button_frame = ttk.Frame(modify_window)
+        button_frame.pack(pady=10)
+        submit_button = ttk.Button(button_frame, text="提交修改", command=submit_modification)
+        submit_button.pack(side=tk.LEFT, padx=5)
+        cancel_button = ttk.Button(button_frame, text="取消修改", state=tk.DISABLED)
+        cancel_button.pack(side=tk.LEFT, padx=5)
+        
+        # 实时预览 
+        ttk.Label(modify_window, text="实时预览:").pack(pady=5)
+        preview_text = scrolledtext.ScrolledText(modify_window, height=15, width=70, state=tk.DISABLED)
+        preview_text.pack(pady=5, fill=tk.BOTH, expand=True)
  
 if __name__ == "__main__":
     root = tk.Tk()
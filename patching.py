@@ -0,0 +1,132 @@
+import re
+
+PATCH_SYSTEM_PROMPT = """你是一个Python代码修改助手。用户会给出一个现有的Python工具脚本和修改要求。
+只输出需要修改的部分，不要输出完整代码，使用如下格式的修改块（可以有多个）：
+
+<<<<<<< SEARCH
+原代码中需要替换的连续若干行（必须与原代码逐字一致，包含缩进）
+=======
+替换后的代码
+>>>>>>> REPLACE
+
+要求：
+1. SEARCH 部分必须能在原代码中唯一定位，必要时多包含几行上下文
+2. 每个修改块尽量小，不要重复未修改的大段代码
+3. 删除代码时 REPLACE 部分留空；在文件末尾追加代码时 SEARCH 部分留空
+4. 不要输出修改块以外的解释说明"""
+
+_BLOCK_PATTERN = re.compile(
+    r"^<{5,9} ?SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} ?REPLACE[^\n]*$",
+    re.MULTILINE | re.DOTALL
+)
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@")
+
+
+class PatchError(Exception):
+    """补丁无法解析或应用"""
+    pass
+
+
+def build_patch_messages(modify_prompt, current_code):
+    """构造请求模型返回修改块的消息"""
+    request = f"修改要求: {modify_prompt}\n\n当前代码:\n```python\n{current_code}\n```"
+    return [
+        {"role": "system", "content": PATCH_SYSTEM_PROMPT},
+        {"role": "user", "content": request},
+    ]
+
+
+def _split_lines(text):
+    """按行拆分，忽略末尾的换行"""
+    if not text:
+        return []
+    if text.endswith("\n"):
+        text = text[:-1]
+    return text.split("\n")
+
+
+def parse_edit_blocks(text):
+    """解析 SEARCH/REPLACE 修改块，返回 [(原行列表, 新行列表, None)]"""
+    return [(_split_lines(search), _split_lines(replace), None) for search, replace in _BLOCK_PATTERN.findall(text)]
+
+
+def parse_unified_diff(text):
+    """解析统一格式的 diff，返回 [(原行列表, 新行列表, 原起始行号)]"""
+    hunks = []
+    current = None
+    for line in text.split("\n"):
+        header = _HUNK_HEADER.match(line)
+        if header:
+            # 原范围为空（-N,0）的块表示插入到第 N 行之后，否则 N 是第一行原行的行号
+            start = int(header.group(1))
+            current = ([], [], start if header.group(2) == "0" else start - 1)
+            hunks.append(current)
+            continue
+        if current is None or line.startswith(("---", "+++", "\\")):
+            continue
+        if line.startswith("```"):
+            current = None
+        elif line.startswith("-"):
+            current[0].append(line[1:])
+        elif line.startswith("+"):
+            current[1].append(line[1:])
+        elif line.startswith(" ") or line == "":
+            current[0].append(line[1:])
+            current[1].append(line[1:])
+    # 去掉 diff 末尾因换行产生的空上下文行
+    for old, new, _ in hunks:
+        while old and new and old[-1] == "" and new[-1] == "":
+            old.pop()
+            new.pop()
+    return hunks
+
+
+def _locate(lines, search, hint):
+    """在代码行中定位原行，先精确匹配，再忽略行尾空白匹配"""
+    n = len(search)
+    for normalize in (lambda line: line, lambda line: line.rstrip()):
+        target = [normalize(line) for line in search]
+        matches = [i for i in range(len(lines) - n + 1)
+                   if normalize(lines[i]) == target[0] and [normalize(line) for line in lines[i:i + n]] == target]
+        if len(matches) == 1:
+            return matches[0]
+        if len(matches) > 1:
+            if hint is None:
+                raise PatchError(f"修改块匹配到 {len(matches)} 处，无法确定位置:\n" + "\n".join(search[:3]))
+            return min(matches, key=lambda i: abs(i - hint))
+    raise PatchError("修改块在原代码中找不到:\n" + "\n".join(search[:3]))
+
+
+def apply_edits(code, edits):
+    """依次应用修改，返回修改后的代码"""
+    lines = _split_lines(code)
+    offset = 0
+    for search, replace, hint in edits:
+        if not search:
+            # 没有原行的 diff 按行号插入，空 SEARCH 表示追加到文件末尾
+            index = len(lines) if hint is None else min(max(hint + offset, 0), len(lines))
+            lines[index:index] = replace
+            offset += len(replace)
+            continue
+        index = _locate(lines, search, None if hint is None else hint + offset)
+        lines[index:index + len(search)] = replace
+        offset += len(replace) - len(search)
+    return "\n".join(lines) + "\n"
+
+
+def apply_patch(code, response):
+    """把模型返回的修改块或 diff 应用到代码上，并检查修改后的代码能否编译
+
+    无法解析、无法应用或修改后有语法错误时抛出 PatchError。
+    """
+    edits = parse_edit_blocks(response)
+    if not edits:
+        edits = parse_unified_diff(response)
+    if not edits:
+        raise PatchError("回复中没有可用的修改块")
+    patched = apply_edits(code, edits)
+    try:
+        compile(patched, "<patched>", "exec")
+    except SyntaxError as e:
+        raise PatchError(f"修改后的代码有语法错误: 第{e.lineno}行 {e.msg}")
+    return patched
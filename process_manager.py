@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import codecs
+import itertools
+import threading
+import subprocess
+
+# 工具启动器，源文件未变化时直接加载预编译的字节码
+TOOL_RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tool_runner.py")
+
+# 运行状态
+RUN_RUNNING = "running"
+RUN_EXITED = "exited"
+RUN_KILLED = "killed"
+RUN_TIMEOUT = "timeout"
+
+RUN_STATUS_LABELS = {
+    RUN_RUNNING: "运行中",
+    RUN_EXITED: "已退出",
+    RUN_KILLED: "已终止",
+    RUN_TIMEOUT: "超时",
+}
+
+
+class ToolRun:
+    """一次工具运行"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, tool_name, tool_path, process, timeout=None):
+        self.run_id = next(self._ids)
+        self.tool_name = tool_name
+        self.tool_path = tool_path
+        self.process = process
+        self.timeout = timeout
+        self.status = RUN_RUNNING
+        self.returncode = None
+        self.started = time.time()
+        self.finished = None
+        self.output = []  # [(stream, text)]
+        self._lock = threading.Lock()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    @property
+    def status_label(self):
+        return RUN_STATUS_LABELS[self.status]
+
+    @property
+    def is_running(self):
+        return self.status == RUN_RUNNING
+
+    @property
+    def duration(self):
+        """运行时长（秒）"""
+        return (self.finished or time.time()) - self.started
+
+    def output_text(self):
+        """到目前为止的全部输出"""
+        with self._lock:
+            return "".join(text for _, text in self.output)
+
+    def write_stdin(self, text):
+        """向工具的标准输入写入文本"""
+        if not self.is_running or self.process.stdin is None or self.process.stdin.closed:
+            raise RuntimeError("工具已经结束或输入已关闭")
+        self.process.stdin.write(text.encode("utf-8"))
+        self.process.stdin.flush()
+
+    def close_stdin(self):
+        """关闭标准输入（工具读取输入时会收到 EOF）"""
+        if self.process.stdin is not None and not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+
+    def kill(self, status=RUN_KILLED):
+        """终止工具进程"""
+        if not self.is_running or self.process.poll() is not None:
+            return
+        self.status = status
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+
+    def to_record(self):
+        """运行记录（写入历史文件）"""
+        return {
+            "tool": self.tool_name,
+            "path": self.tool_path,
+            "started": self.started,
+            "duration": round(self.duration, 3),
+            "returncode": self.returncode,
+            "status": self.status,
+        }
+
+
+class ProcessManager:
+    """管理后台运行的工具进程
+
+    每次运行都在独立的子进程中执行，标准输出和标准错误由后台线程持续读取，
+    通过 on_output(run, stream, text) 回调；进程结束时调用 on_exit(run)，
+    并把运行时长和退出码追加到 history_file（JSON Lines）。回调都在后台线程中调用。
+    提供 warm_pool（warm_pool.WarmPool）时优先从预热解释器池启动，失败时退回普通子进程。
+    env 为额外传给工具的环境变量。
+    """
+
+    def __init__(self, history_file=None, on_output=None, on_exit=None, warm_pool=None, env=None):
+        self.history_file = history_file
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.warm_pool = warm_pool
+        self.env = env or {}
+        self.runs = {}
+        self._lock = threading.Lock()
+
+    def _command(self, tool_path):
+        # -u 关闭输出缓冲，保证输出实时显示；通过启动器运行以使用字节码缓存
+        return [sys.executable, "-u", TOOL_RUNNER, tool_path]
+
+    def start(self, tool_name, tool_path, timeout=None):
+        """启动工具，返回 ToolRun；timeout 秒后仍未结束的工具会被终止"""
+        env = dict(os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8", **self.env)
+        process = None
+        if self.warm_pool is not None:
+            try:
+                process = self.warm_pool.popen(tool_path, env=env)
+            except (OSError, RuntimeError) as e:
+                print(f"预热池启动工具失败，改用普通方式: {str(e)}")
+        if process is None:
+            kwargs = {}
+            if sys.platform == "win32":
+                kwargs["creationflags"] = subprocess.CREATE_NO_WINDOW
+            process = subprocess.Popen(
+                self._command(tool_path),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=env,
+                **kwargs
+            )
+        run = ToolRun(tool_name, tool_path, process, timeout)
+        with self._lock:
+            self.runs[run.run_id] = run
+
+        readers = [
+            threading.Thread(target=self._read_stream, args=(run, "stdout", process.stdout), daemon=True),
+            threading.Thread(target=self._read_stream, args=(run, "stderr", process.stderr), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        threading.Thread(target=self._wait, args=(run, readers), daemon=True).start()
+        return run
+
+    def _read_stream(self, run, stream_name, pipe):
+        """持续读取子进程输出，按 UTF-8 增量解码后回调"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        fd = pipe.fileno()
+        try:
+            while True:
+                data = os.read(fd, 4096)
+                text = decoder.decode(data, final=not data)
+                if text:
+                    with run._lock:
+                        run.output.append((stream_name, text))
+                    if self.on_output:
+                        self.on_output(run, stream_name, text)
+                if not data:
+                    break
+        except OSError:
+            pass
+        finally:
+            pipe.close()
+
+    def _wait(self, run, readers):
+        """等待进程结束（超时则终止），然后记录运行结果"""
+        try:
+            run.process.wait(timeout=run.timeout)
+        except subprocess.TimeoutExpired:
+            run.kill(RUN_TIMEOUT)
+            run.process.wait()
+        for reader in readers:
+            reader.join()
+        run.close_stdin()
+        run.returncode = run.process.returncode
+        run.finished = time.time()
+        if run.status == RUN_RUNNING:
+            run.status = RUN_EXITED
+        self._append_history(run)
+        if self.on_exit:
+            self.on_exit(run)
+
+    def _append_history(self, run):
+        if not self.history_file:
+            return
+        try:
+            with self._lock, open(self.history_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(run.to_record(), ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"写入运行记录失败: {str(e)}")
+
+    def get(self, run_id):
+        return self.runs.get(run_id)
+
+    def running(self):
+        """正在运行的工具"""
+        return [run for run in self.runs.values() if run.is_running]
+
+    def kill(self, run_id):
+        run = self.runs.get(run_id)
+        if run:
+            run.kill()
+
+    def kill_all(self):
+        for run in self.running():
+            run.kill()
+
+    def close(self):
+        """终止所有运行并关闭预热池"""
+        self.kill_all()
+        if self.warm_pool is not None:
+            self.warm_pool.close()
+
+    def clear_finished(self):
+        """移除已经结束的运行，返回被移除的运行ID"""
+        with self._lock:
+            finished = [run_id for run_id, run in self.runs.items() if not run.is_running]
+            for run_id in finished:
+                del self.runs[run_id]
+        return finished
+
+    def load_history(self, limit=None):
+        """读取运行记录，最新的在最后"""
+        if not self.history_file or not os.path.exists(self.history_file):
+            return []
+        with open(self.history_file, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return records[-limit:] if limit else records
@@ -0,0 +1,77 @@
+"""请求消息的组装
+
+支持前缀缓存的接口只对与之前请求完全相同（逐字节一致）的开头部分计费打折并加速，
+因此消息按“固定前缀 + 可变部分”的顺序组装：系统提示和示例工具在每次请求中保持不变，
+当前日期等会变化的内容放在最后一条用户消息的末尾，且只精确到天。
+"""
+from datetime import datetime
+
+SYSTEM_PROMPT = """你是一个专业的Python开发助手，专注于为Windows环境编写实用工具脚本。请根据用户需求编写完整的Python工具脚本，遵循以下规范：
+
+1. 提供完整的、可直接运行的Python代码
+2. 必须包含main()函数作为程序入口点
+3. 包含清晰的功能描述和使用方法注释
+4. 包含元数据注释，格式为：# metadata = {"name": "工具名称", "description": "工具描述", "created": "创建时间"}
+5. 必须处理潜在错误并提供用户友好的反馈
+6. 优先使用Python标准库，需要第三方库时直接在文件开头导入，由工具箱统一安装，不要在脚本内检查或安装依赖
+7. 代码需有良好的注释，结构清晰易读
+8. 聚焦于解决用户描述的具体问题，不引入无关功能
+9. 使用标准输入输出方式，避免使用sys.argv 和非必要的图形界面
+10. 创建临时或配置文件时，在脚本所在目录创建同名子目录
+11. 除非用户明确要求，否则不要将输出文件保存到脚本子目录
+12. 脚本末尾需包含阻塞语句，防止控制台窗口自动关闭
+
+请仅返回完整的Python代码，不要包含任何解释或额外的文本。"""
+
+# 超过这个大小的工具不作为示例，避免每次请求都附带过长的前缀
+MAX_EXAMPLE_BYTES = 8 * 1024
+
+
+def load_examples(tools):
+    """读取示例工具，tools 为按顺序排列的工具记录，返回 [(描述, 代码)]
+
+    示例按给定顺序排列且原样读取文件内容，只要工具没有修改，组装出的前缀就保持不变。
+    """
+    examples = []
+    for tool_info in tools:
+        try:
+            with open(tool_info["path"], "r", encoding="utf-8") as f:
+                code = f.read(MAX_EXAMPLE_BYTES + 1)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"读取示例工具失败: {str(e)}")
+            continue
+        if len(code.encode("utf-8")) > MAX_EXAMPLE_BYTES:
+            print(f"示例工具 '{tool_info['name']}' 过大，已忽略")
+            continue
+        examples.append((tool_info.get("description") or tool_info["name"], code))
+    return examples
+
+
+def prefix_messages(examples=()):
+    """固定前缀：系统提示，以及每个示例对应的一问一答"""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    for description, code in examples:
+        messages.append({"role": "user", "content": description})
+        messages.append({"role": "assistant", "content": f"```python\n{code}\n```"})
+    return messages
+
+
+def volatile_context(now=None):
+    """放在请求末尾的可变内容，时间只精确到天，同一天内的请求完全一致"""
+    now = now or datetime.now()
+    return f"当前日期：{now.strftime('%Y-%m-%d')}"
+
+
+def build_generate_messages(request_text, examples=(), now=None):
+    """构造生成新工具的消息"""
+    return prefix_messages(examples) + [
+        {"role": "user", "content": f"{request_text}\n\n{volatile_context(now)}"},
+    ]
+
+
+def build_modify_messages(modify_prompt, current_code, examples=(), now=None):
+    """构造完整重新生成（修改）工具的消息，与生成新工具共用同一个前缀"""
+    modify_request = f"请根据以下提示修改以下Python工具代码:\n\n修改提示: {modify_prompt}\n\n当前代码:\n```python\n{current_code}\n```"
+    return prefix_messages(examples) + [
+        {"role": "user", "content": f"{modify_request}\n\n{volatile_context(now)}"},
+    ]
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+CACHE_DIRNAME = "toolbox_cache"
+INDEX_FILENAME = "index.json"
+
+
+def normalize_request(request_text):
+    """规范化需求文本：去掉首尾空白并合并连续空白"""
+    return " ".join(request_text.split())
+
+
+def make_cache_key(request_text, model, base_url, max_tokens):
+    """根据规范化的需求、模型、base_url 和 max_tokens 计算缓存键"""
+    payload = json.dumps(
+        [normalize_request(request_text), model, base_url.rstrip("/"), int(max_tokens)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """按内容寻址的生成结果缓存
+
+    每个条目单独保存为一个文件，索引记录大小和最近访问时间，
+    条目数或总大小超出限制时按最近最少使用的顺序淘汰。
+    """
+
+    def __init__(self, cache_dir, max_entries=200, max_bytes=20 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.index_file = os.path.join(cache_dir, INDEX_FILENAME)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # 缓存键 -> {"size": ..., "atime": ...}
+        self.index = {}
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        """加载缓存索引，并丢弃已经没有对应文件的条目"""
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取缓存索引失败: {str(e)}")
+            return
+        self.index = {key: entry for key, entry in index.items()
+                      if os.path.exists(self._entry_path(key))}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_file, self.index_file)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.py")
+
+    def get(self, key):
+        """读取缓存的代码，未命中时返回 None"""
+        with self._lock:
+            if key not in self.index:
+                return None
+            try:
+                with open(self._entry_path(key), "r", encoding="utf-8") as f:
+                    code = f.read()
+            except OSError:
+                del self.index[key]
+                self._save_index()
+                return None
+            self.index[key]["atime"] = time.time()
+            self._save_index()
+            return code
+
+    def put(self, key, code):
+        """写入缓存并按需淘汰旧条目"""
+        data = code.encode("utf-8")
+        if self.max_entries <= 0 or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._entry_path(key), "wb") as f:
+                f.write(data)
+            self.index[key] = {"size": len(data), "atime": time.time()}
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        """按最近最少使用的顺序淘汰，直到条目数和总大小都在限制之内"""
+        total = sum(entry["size"] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]["atime"]):
+            if len(self.index) <= self.max_entries and total <= self.max_bytes:
+                break
+            total -= self.index.pop(key)["size"]
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for key in list(self.index):
+                try:
+                    os.remove(self._entry_path(key))
+                except OSError:
+                    pass
+            self.index = {}
+            self._save_index()
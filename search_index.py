@@ -0,0 +1,332 @@
+import os
+import re
+import math
+import json
+import bisect
+import keyword
+import builtins
+import threading
+
+SEARCH_INDEX_VERSION = 1
+SEARCH_INDEX_FILENAME = ".search_index.json"
+
+# 增量更新先追加到日志，日志超过这么多条（且超过文档数的四分之一）时才重写整个索引文件
+JOURNAL_MIN_ENTRIES = 1000
+
+# 各字段命中时的权重
+FIELD_WEIGHTS = {"name": 4.0, "description": 2.0, "source": 1.0}
+
+# 源代码只读取前面这么多字节
+SOURCE_BYTES = 256 * 1024
+
+# 前缀匹配的最短长度，太短的前缀会展开出大量词项
+MIN_PREFIX = 2
+
+_TOKEN = re.compile(r"[A-Za-z0-9_]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_WORD_PART = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+# 源代码只索引定义的函数、类名和导入的模块名，局部变量对搜索意义不大
+_DEFINITION = re.compile(r"^[ \t]*(?:async[ \t]+)?(?:def|class)[ \t]+(\w+)", re.MULTILINE)
+_IMPORT = re.compile(r"^[ \t]*(?:from[ \t]+([\w.]+)[ \t]+)?import[ \t]+([\w., \t]+)", re.MULTILINE)
+
+# 源代码中几乎每个工具都有的名称，不建立索引
+_SOURCE_STOP_WORDS = {word.lower() for word in keyword.kwlist + dir(builtins)} | {
+    "self", "cls", "args", "kwargs", "main", "name", "os", "sys", "re", "json",
+    "utf", "encoding", "metadata", "description", "created", "none", "true", "false",
+}
+
+
+def _is_cjk(text):
+    return text[0] >= "\u3400"
+
+
+def _word_parts(word):
+    """拆分 snake_case 和 camelCase 标识符，返回小写的组成部分"""
+    return [part.lower() for piece in word.split("_") for part in _WORD_PART.findall(piece)]
+
+
+def tokenize(text):
+    """把文本切分为词项
+
+    英文和标识符按下划线、大小写和数字拆分，同时保留完整的标识符；
+    中文没有空格分词，按单字和相邻两字（bigram）切分。
+    """
+    tokens = []
+    for match in _TOKEN.finditer(text):
+        run = match.group()
+        if _is_cjk(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            continue
+        parts = _word_parts(run)
+        tokens.extend(parts)
+        whole = run.strip("_").lower()
+        if whole and (len(parts) != 1 or parts[0] != whole):
+            tokens.append(whole)
+    return tokens
+
+
+def _source_tokens(text):
+    """源代码中的词项：函数名、类名和导入的模块，去掉常见名称和纯数字"""
+    names = _DEFINITION.findall(text)
+    for module, imported in _IMPORT.findall(text):
+        names.append(module)
+        names.append(imported)
+    return sorted({
+        token for token in tokenize(" ".join(names))
+        if len(token) > 1 and not token.isdigit() and token not in _SOURCE_STOP_WORDS
+    })
+
+
+def _query_terms(query):
+    """把查询切分为必须全部命中的词项，返回 [(词项, 是否前缀匹配)]
+
+    查询末尾没有空格时，最后一个英文词按前缀匹配，便于边输入边搜索。
+    中文查询按 bigram 匹配（只有一个字时按单字匹配）。
+    """
+    terms = []
+    matches = list(_TOKEN.finditer(query))
+    for index, match in enumerate(matches):
+        run = match.group()
+        if _is_cjk(run):
+            if len(run) == 1:
+                terms.append((run, False))
+            else:
+                terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+            continue
+        parts = _word_parts(run)
+        is_last = index == len(matches) - 1 and match.end() == len(query)
+        for position, part in enumerate(parts):
+            prefix = is_last and position == len(parts) - 1 and len(part) >= MIN_PREFIX
+            terms.append((part, prefix))
+    # 去掉重复的词项，保持顺序
+    seen = set()
+    return [term for term in terms if not (term in seen or seen.add(term))]
+
+
+class SearchIndex:
+    """工具名称、描述和源代码标识符的倒排索引
+
+    每个文件记录 mtime、size、名称、描述和源代码词项，持久化到工具目录下的
+    .search_index.json；同步时只重新读取新增或发生变化的文件，变化追加到同名的
+    .journal 日志中，日志足够长时才重写索引文件。倒排表在内存中维护：
+    词项 -> {工具名称: 权重}。可以在多个线程中使用。
+    """
+
+    def __init__(self, tools_dir, index_file=None):
+        self.tools_dir = tools_dir
+        self.index_file = index_file or os.path.join(tools_dir, SEARCH_INDEX_FILENAME)
+        self.journal_file = self.index_file + ".journal"
+        self._journal_entries = 0
+        # 文件名 -> {"mtime", "size", "name", "description", "source": [词项]}
+        self.docs = {}
+        self.postings = {}
+        self._doc_terms = {}  # 工具名称 -> {词项: 权重}，用于删除文档时清理倒排表
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    # ---- 持久化 ----
+
+    def load(self):
+        """从磁盘加载索引、重放日志并重建倒排表"""
+        with self._lock:
+            self._loaded = True
+            if not os.path.exists(self.index_file):
+                return
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取搜索索引失败: {str(e)}")
+                return
+            if data.get("version") != SEARCH_INDEX_VERSION:
+                # 旧版本的索引直接丢弃，同步时全部重建
+                return
+            for filename, doc in data.get("docs", {}).items():
+                self._add_doc(filename, doc)
+            self._replay_journal()
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_file):
+            return
+        try:
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        change = json.loads(line)
+                    except ValueError:
+                        # 写到一半的最后一行
+                        break
+                    self._remove_doc(change["file"])
+                    if change["doc"] is not None:
+                        self._add_doc(change["file"], change["doc"])
+                    self._journal_entries += 1
+        except OSError as e:
+            print(f"读取搜索索引日志失败: {str(e)}")
+
+    def save(self):
+        """重写整个索引文件（先写临时文件再替换）并清空日志"""
+        with self._lock:
+            data = {"version": SEARCH_INDEX_VERSION, "docs": self.docs}
+            tmp_file = self.index_file + ".tmp"
+            try:
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_file, self.index_file)
+                if os.path.exists(self.journal_file):
+                    os.remove(self.journal_file)
+                self._journal_entries = 0
+            except OSError as e:
+                print(f"保存搜索索引失败: {str(e)}")
+
+    def _persist(self, filenames):
+        """保存发生变化的文件：少量变化追加到日志，日志过长或索引文件不存在时重写整个索引"""
+        if not filenames:
+            return
+        self._journal_entries += len(filenames)
+        if not os.path.exists(self.index_file) \
+                or self._journal_entries > max(JOURNAL_MIN_ENTRIES, len(self.docs) // 4):
+            self.save()
+            return
+        try:
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                for filename in filenames:
+                    change = {"file": filename, "doc": self.docs.get(filename)}
+                    f.write(json.dumps(change, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"保存搜索索引日志失败: {str(e)}")
+
+    # ---- 增量维护 ----
+
+    def sync(self, entries):
+        """与工具目录索引（ToolCatalog.snapshot()）全量同步，返回发生变化的文件数"""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            removed = {filename: None for filename in self.docs if filename not in entries}
+            removed.update(entries)
+            return self.update(removed)
+
+    def update(self, entries):
+        """只更新给定的文件，entries 为 {文件名: 目录索引条目或 None（已删除）}，返回发生变化的文件数
+
+        条目带有 "path"（分片存放的工具，见 catalog_db.SqliteCatalog）时从该路径读取源代码。
+        """
+        changed = []
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            for filename, entry in entries.items():
+                if not entry or not entry.get("metadata"):
+                    if self._remove_doc(filename):
+                        changed.append(filename)
+                    continue
+                metadata = entry["metadata"]
+                doc = self.docs.get(filename)
+                if doc and doc["mtime"] == entry["mtime"] and doc["size"] == entry["size"] \
+                        and doc["name"] == metadata.get("name") and doc["description"] == metadata.get("description"):
+                    continue
+                self._remove_doc(filename)
+                self._add_doc(filename, {
+                    "mtime": entry["mtime"],
+                    "size": entry["size"],
+                    "name": metadata.get("name"),
+                    "description": metadata.get("description"),
+                    "source": self._read_source_tokens(entry.get("path") or os.path.join(self.tools_dir, filename)),
+                })
+                changed.append(filename)
+            self._persist(changed)
+        return len(changed)
+
+    def _read_source_tokens(self, tool_path):
+        try:
+            with open(tool_path, "r", encoding="utf-8", errors="replace") as f:
+                return _source_tokens(f.read(SOURCE_BYTES))
+        except OSError as e:
+            print(f"读取工具源代码失败: {str(e)}")
+            return []
+
+    def _add_doc(self, filename, doc):
+        tool_name = filename[:-3]
+        terms = {}
+        fields = (
+            ("name", tokenize(tool_name) + tokenize(doc.get("name") or "")),
+            ("description", tokenize(doc.get("description") or "")),
+            ("source", doc.get("source") or []),
+        )
+        for field, tokens in fields:
+            weight = FIELD_WEIGHTS[field]
+            for token in set(tokens):
+                terms[token] = terms.get(token, 0.0) + weight
+        for token, weight in terms.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                self._vocabulary_dirty = True
+            posting[tool_name] = weight
+        self.docs[filename] = doc
+        self._doc_terms[tool_name] = terms
+
+    def _remove_doc(self, filename):
+        if self.docs.pop(filename, None) is None:
+            return False
+        tool_name = filename[:-3]
+        for token in self._doc_terms.pop(tool_name, {}):
+            posting = self.postings[token]
+            del posting[tool_name]
+            if not posting:
+                del self.postings[token]
+                self._vocabulary_dirty = True
+        return True
+
+    # ---- 查询 ----
+
+    def _expand(self, term, prefix):
+        """返回词项（前缀匹配时为所有以它开头的词项）合并后的 {工具名称: 权重}"""
+        if not prefix:
+            return self.postings.get(term, {})
+        if self._vocabulary_dirty:
+            # 带下划线的完整标识符由它的各个部分覆盖，不参与前缀展开
+            self._vocabulary = sorted(token for token in self.postings if not _is_cjk(token) and "_" not in token)
+            self._vocabulary_dirty = False
+        merged = dict(self.postings.get(term, {}))
+        start = bisect.bisect_right(self._vocabulary, term)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            # 不完整的词命中时打折扣
+            for tool_name, weight in self.postings[token].items():
+                weight *= 0.8
+                if weight > merged.get(tool_name, 0.0):
+                    merged[tool_name] = weight
+        return merged
+
+    def search(self, query, limit=None):
+        """返回同时命中全部查询词项的工具名称，按相关度从高到低排列"""
+        terms = _query_terms(query)
+        if not terms:
+            return []
+        with self._lock:
+            total = len(self.docs) or 1
+            matched = [self._expand(term, prefix) for term, prefix in terms]
+            matched.sort(key=len)
+            if not matched[0]:
+                return []
+            # 从最短的倒排表开始求交集，得分为各词项权重乘以 idf 之和
+            first, rest = matched[0], matched[1:]
+            first_idf = math.log(1 + total / len(first))
+            rest = [(posting, math.log(1 + total / len(posting))) for posting in rest]
+            scores = {}
+            for tool_name, weight in first.items():
+                score = weight * first_idf
+                for posting, idf in rest:
+                    weight = posting.get(tool_name)
+                    if weight is None:
+                        break
+                    score += weight * idf
+                else:
+                    scores[tool_name] = score
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+        return ranked[:limit] if limit else ranked
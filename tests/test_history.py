@@ -0,0 +1,124 @@
+import os
+import json
+
+import pytest
+
+import history
+from history import HistoryError, ToolHistory
+
+
+def make_versions(count):
+    """逐步修改的一系列版本，相邻版本只差几行，保存时大多成为差量"""
+    lines = [f"line_{i} = {i}\n" for i in range(200)]
+    versions = []
+    for rev in range(count):
+        lines[rev * 7 % len(lines)] = f"line_{rev} = 'changed in {rev}'\n"
+        lines.insert(rev % 50, f"# 第 {rev} 次修改\n")
+        versions.append("".join(lines))
+    return versions
+
+
+def object_kinds(store):
+    kinds = []
+    for prefix in os.listdir(store.objects_dir):
+        for sha in os.listdir(os.path.join(store.objects_dir, prefix)):
+            kinds.append(store._read_object(sha)[0])
+    return kinds
+
+
+def test_record_then_read_every_revision(tmp_path):
+    store = ToolHistory(str(tmp_path))
+    versions = make_versions(history.MAX_CHAIN * 2 + 5)
+    for content in versions:
+        store.record("tool", content, "modify", prompt="改一下", model="m")
+
+    revisions = store.revisions("tool")
+    assert [revision["rev"] for revision in revisions] == list(range(1, len(versions) + 1))
+    for revision, content in zip(revisions, versions):
+        assert store.read_revision("tool", revision["rev"]) == content
+        assert revision["size"] == len(content.encode("utf-8"))
+    # 差量链超过上限后重新保存完整内容
+    kinds = object_kinds(store)
+    assert kinds.count(history._DELTA) > kinds.count(history._FULL) > 1
+
+
+def test_identical_content_is_not_recorded(tmp_path):
+    store = ToolHistory(str(tmp_path))
+    assert store.record("tool", "a = 1\n", "generate")["rev"] == 1
+    assert store.record("tool", "a = 1\n", "modify") is None
+    assert len(store.revisions("tool")) == 1
+
+
+def test_exact_text_round_trip(tmp_path):
+    store = ToolHistory(str(tmp_path))
+    versions = ["print('你好')\r\n", "print('你好')\r\nprint(1)", "\ttabs  \n\n\n", ""]
+    for content in versions:
+        store.record("tool", content, "modify")
+    for rev, content in enumerate(versions, 1):
+        assert store.read_revision("tool", rev) == content
+
+
+def test_compact_keeps_delta_bases(tmp_path):
+    store = ToolHistory(str(tmp_path), max_revisions=100)
+    versions = make_versions(40)
+    for content in versions:
+        store.record("tool", content, "modify")
+    store.max_revisions = 5
+    removed_revisions, removed_objects = store.compact()
+    assert removed_revisions == 35
+    assert removed_objects > 0
+    revisions = store.revisions("tool")
+    assert [revision["rev"] for revision in revisions] == list(range(36, 41))
+    for revision in revisions:
+        assert store.read_revision("tool", revision["rev"]) == versions[revision["rev"] - 1]
+
+
+def test_rename_refuses_existing_history(tmp_path):
+    store = ToolHistory(str(tmp_path))
+    store.record("a", "a = 1\n", "generate")
+    store.record("b", "b = 1\n", "generate")
+    with pytest.raises(FileExistsError):
+        store.rename("a", "b")
+    assert store.read_revision("b", 1) == "b = 1\n"
+
+    store.remove("b")
+    assert not store.exists("b")
+    store.rename("a", "b")
+    assert store.read_revision("b", 1) == "a = 1\n"
+    with pytest.raises(HistoryError):
+        store.get_revision("a", 1)
+
+
+def test_diff_between_revisions(tmp_path):
+    store = ToolHistory(str(tmp_path))
+    store.record("tool", "a = 1\nb = 2\n", "generate")
+    store.record("tool", "a = 1\nb = 3\n", "modify")
+    diff = store.diff("tool", 1, 2)
+    assert "-b = 2\n" in diff and "+b = 3\n" in diff
+
+
+def test_core_restore_writes_exact_revision(tmp_path):
+    from core import ToolBoxCore, format_metadata_comment
+
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({"api_key": "test", "watch_tools_dir": False}), encoding="utf-8")
+    core = ToolBoxCore(config_file=str(config_file), tools_dir=str(tmp_path / "tools"))
+
+    header = format_metadata_comment("tool", "测试工具", "2026-01-01 00:00:00")
+    first = header + "\nprint('第一版')\n"
+    second = header + "\nprint('第二版')\n"
+    tool_name, tool_path = core.catalog.reserve("tool")
+    with open(tool_path, "w", encoding="utf-8") as f:
+        f.write(first)
+    core.apply_file_changes([f"{tool_name}.py"])
+    core.record_revision(tool_name, first, "generate")
+    core._write_tool(tool_path, second)
+    core.record_revision(tool_name, second, "modify", previous_code=first)
+
+    assert core.restore_revision(tool_name, 1) == first
+    with open(tool_path, "rb") as f:
+        # 工具文件以文本方式写入，换行符为平台默认
+        assert f.read() == first.replace("\n", os.linesep).encode("utf-8")
+    revisions = core.history.revisions(tool_name)
+    assert [revision["action"] for revision in revisions] == ["generate", "modify", "restore"]
+    assert core.history.read_revision(tool_name, 3) == first
@@ -0,0 +1,90 @@
+import difflib
+
+import pytest
+
+from patching import PatchError, apply_patch, parse_edit_blocks, parse_unified_diff
+
+ORIGINAL = '''import os
+
+
+def list_files(directory):
+    for name in os.listdir(directory):
+        print(name)
+
+
+def main():
+    list_files(".")
+    input("按回车键退出")
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+
+def block(search, replace):
+    return f"<<<<<<< SEARCH\n{search}=======\n{replace}>>>>>>> REPLACE\n"
+
+
+def test_edit_blocks_round_trip():
+    response = (
+        "说明文字会被忽略\n"
+        + block("    for name in os.listdir(directory):\n        print(name)\n",
+                "    for name in sorted(os.listdir(directory)):\n        print(name)\n")
+        + block('    list_files(".")\n', '    list_files(os.getcwd())\n')
+    )
+    expected = ORIGINAL.replace("in os.listdir(directory)", "in sorted(os.listdir(directory))") \
+        .replace('list_files(".")', "list_files(os.getcwd())")
+    assert apply_patch(ORIGINAL, response) == expected
+
+
+def test_empty_search_appends_and_empty_replace_deletes():
+    response = block("", "\n\ndef extra():\n    return 1\n") + block('    input("按回车键退出")\n', "")
+    patched = apply_patch(ORIGINAL, response)
+    assert "input(" not in patched
+    assert patched.endswith("\n\ndef extra():\n    return 1\n")
+
+
+def test_search_matches_despite_trailing_whitespace():
+    code = ORIGINAL.replace("        print(name)\n", "        print(name)   \n")
+    patched = apply_patch(code, block("        print(name)\n", "        print(name.upper())\n"))
+    assert "print(name.upper())" in patched
+
+
+def test_ambiguous_or_missing_search_raises():
+    code = "x = 1\nx = 1\n"
+    with pytest.raises(PatchError):
+        apply_patch(code, block("x = 1\n", "x = 2\n"))
+    with pytest.raises(PatchError):
+        apply_patch(ORIGINAL, block("not in the file\n", "y = 2\n"))
+
+
+def test_patch_with_syntax_error_raises():
+    with pytest.raises(PatchError):
+        apply_patch(ORIGINAL, block("def main():\n", "def main(:\n"))
+
+
+def test_no_blocks_raises():
+    with pytest.raises(PatchError):
+        apply_patch(ORIGINAL, "这里没有修改块")
+
+
+@pytest.mark.parametrize("context", [0, 1, 3])
+def test_unified_diff_round_trip(context):
+    modified = ORIGINAL.replace("import os\n", "import os\nimport sys\n") \
+        .replace("        print(name)\n", "        print(name, file=sys.stdout)\n") \
+        .replace('    input("按回车键退出")\n', "")
+    diff = "".join(difflib.unified_diff(
+        ORIGINAL.splitlines(keepends=True), modified.splitlines(keepends=True),
+        fromfile="a/tool.py", tofile="b/tool.py", n=context
+    ))
+    assert parse_edit_blocks(diff) == []
+    assert parse_unified_diff(diff)
+    assert apply_patch(ORIGINAL, f"```diff\n{diff}```\n") == modified
+
+
+def test_unified_diff_uses_line_numbers_for_repeated_context():
+    code = "def a():\n    return 1\n\n\ndef b():\n    return 1\n"
+    modified = "def a():\n    return 1\n\n\ndef b():\n    return 2\n"
+    diff = "".join(difflib.unified_diff(code.splitlines(keepends=True), modified.splitlines(keepends=True), n=0))
+    assert apply_patch(code, diff) == modified
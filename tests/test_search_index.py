@@ -0,0 +1,105 @@
+import os
+
+import search_index
+from search_index import SearchIndex, _query_terms, tokenize
+
+TOOLS = {
+    "rename_images": ("批量重命名图片", "import os\nfrom PIL import Image\n\ndef rename_images(folder):\n    pass\n"),
+    "pdfMerger": ("合并多个PDF文件", "import PyPDF2\n\nclass PdfMerger:\n    pass\n"),
+    "clean_temp": ("清理临时文件", "import shutil\n\ndef clean_temp_files():\n    pass\n"),
+}
+
+
+def write_tools(tools_dir, tools):
+    """写入工具文件，返回目录索引条目 {文件名: 条目}"""
+    entries = {}
+    for tool_name, (description, code) in tools.items():
+        path = os.path.join(tools_dir, f"{tool_name}.py")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(code)
+        st = os.stat(path)
+        entries[f"{tool_name}.py"] = {
+            "mtime": st.st_mtime_ns,
+            "size": st.st_size,
+            "metadata": {"name": tool_name, "description": description},
+        }
+    return entries
+
+
+def test_tokenize_cjk_bigrams_and_identifiers():
+    assert tokenize("重命名图片") == ["重", "命", "名", "图", "片", "重命", "命名", "名图", "图片"]
+    assert tokenize("renameImages") == ["rename", "images", "renameimages"]
+    assert tokenize("clean_temp_files") == ["clean", "temp", "files", "clean_temp_files"]
+    assert tokenize("HTTPServer 2") == ["http", "server", "httpserver", "2"]
+
+
+def test_query_terms():
+    assert _query_terms("图片") == [("图片", False)]
+    assert _query_terms("图") == [("图", False)]
+    assert _query_terms("合并PDF") == [("合并", False), ("pdf", True)]
+    assert _query_terms("rename ") == [("rename", False)]
+
+
+def test_search_fields_and_ranking(tmp_path):
+    index = SearchIndex(str(tmp_path))
+    index.sync(write_tools(str(tmp_path), TOOLS))
+    assert index.search("图片") == ["rename_images"]
+    assert index.search("重命名 图片") == ["rename_images"]
+    assert index.search("pdf") == ["pdfMerger"]
+    assert index.search("merg") == ["pdfMerger"]  # 最后一个词按前缀匹配
+    assert index.search("shutil") == ["clean_temp"]  # 导入的模块
+    assert sorted(index.search("文件")) == ["clean_temp", "pdfMerger"]
+    assert index.search("不存在的词") == []
+
+
+def test_reload_replays_journal(tmp_path):
+    tools_dir = str(tmp_path)
+    index = SearchIndex(tools_dir)
+    entries = write_tools(tools_dir, TOOLS)
+    index.sync(entries)
+    assert os.path.exists(index.index_file)
+
+    # 少量变化只追加到日志
+    changed = write_tools(tools_dir, {"clean_temp": ("删除过期日志", "import glob\n")})
+    index.update(changed)
+    index.update({"pdfMerger.py": None})
+    with open(index.journal_file, "r", encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+
+    reloaded = SearchIndex(tools_dir)
+    reloaded.load()
+    assert reloaded.docs == index.docs
+    assert reloaded.search("日志") == ["clean_temp"]
+    assert reloaded.search("临时") == []
+    assert reloaded.search("pdf") == []
+    assert reloaded.search("glob") == ["clean_temp"]
+    # 没有变化的文件不会重新读取
+    assert reloaded.sync({**entries, **changed, "pdfMerger.py": None}) == 0
+
+
+def test_journal_compacts_into_index_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(search_index, "JOURNAL_MIN_ENTRIES", 2)
+    tools_dir = str(tmp_path)
+    index = SearchIndex(tools_dir)
+    index.sync(write_tools(tools_dir, TOOLS))
+    for description in ("一", "二", "三"):
+        index.update(write_tools(tools_dir, {"clean_temp": (f"版本{description}", "x = 1\n")}))
+    assert not os.path.exists(index.journal_file)
+
+    reloaded = SearchIndex(tools_dir)
+    reloaded.load()
+    assert reloaded.search("版本三") == ["clean_temp"]
+    assert reloaded.search("版本一") == []
+
+
+def test_partial_journal_line_is_ignored(tmp_path):
+    tools_dir = str(tmp_path)
+    index = SearchIndex(tools_dir)
+    index.sync(write_tools(tools_dir, TOOLS))
+    index.update({"pdfMerger.py": None})
+    with open(index.journal_file, "a", encoding="utf-8") as f:
+        f.write('{"file": "rename_images.py", "doc"')
+
+    reloaded = SearchIndex(tools_dir)
+    reloaded.load()
+    assert sorted(reloaded.docs) == ["clean_temp.py", "rename_images.py"]
@@ -0,0 +1,97 @@
+import os
+import json
+import math
+import threading
+
+from instrumentation import percentile
+
+BUDGET_FILENAME = "token_budget.json"
+
+# 请求的种类：生成新工具、完整重新生成（修改）、只返回修改块
+KIND_GENERATE = "generate"
+KIND_MODIFY = "modify"
+KIND_PATCH = "patch"
+
+MIN_TOKENS = 512      # 估计值的下限
+ROUND_TO = 256        # 估计值按此取整
+MARGIN = 1.15         # 在历史分位数之上留出的余量
+NEIGHBORS = 20        # 参考的相似历史记录数
+MIN_SAMPLES = 5       # 历史记录少于此数时使用默认值
+MAX_RECORDS = 500     # 最多保存的历史记录数
+
+
+def approx_tokens(text):
+    """粗略估计文本的 token 数：英文约 4 个字符一个 token，中文约每个字一个 token"""
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return int(ascii_chars / 4 + (len(text) - ascii_chars) * 0.6) + 1
+
+
+class TokenBudget:
+    """根据请求大小和以往相似请求的实际输出估计 max_tokens
+
+    每次生成结束后用 record() 记录输入大小（token 估计值）和实际输出的 token 数，
+    estimate() 取输入大小最接近的若干条历史记录，以输出的 90 分位数加上余量作为预算；
+    修改（完整重新生成）的输出与现有代码大小成正比，按输出/输入的比例估计。
+    预算只是单次请求的上限，输出被截断时由续写补齐，因此宁可略少也不必过度预留。
+    """
+
+    def __init__(self, budget_file=None):
+        self.budget_file = budget_file
+        self.records = []  # [{"kind", "input", "output"}]
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.budget_file or not os.path.exists(self.budget_file):
+            return
+        try:
+            with open(self.budget_file, "r", encoding="utf-8") as f:
+                self.records = json.load(f).get("records", [])[-MAX_RECORDS:]
+        except (OSError, ValueError) as e:
+            print(f"读取 token 预算记录失败: {str(e)}")
+
+    def _save(self):
+        if not self.budget_file:
+            return
+        tmp_file = self.budget_file + ".tmp"
+        try:
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"records": self.records}, f)
+            os.replace(tmp_file, self.budget_file)
+        except OSError as e:
+            print(f"保存 token 预算记录失败: {str(e)}")
+
+    def record(self, kind, input_tokens, output_tokens):
+        """记录一次请求的输入大小和实际输出的 token 数（包括续写部分）"""
+        if not output_tokens:
+            return
+        with self._lock:
+            self.records.append({"kind": kind, "input": int(input_tokens), "output": int(output_tokens)})
+            del self.records[:-MAX_RECORDS]
+            self._save()
+
+    def estimate(self, kind, input_tokens, ceiling):
+        """估计本次请求需要的 max_tokens，不超过 ceiling"""
+        with self._lock:
+            samples = [record for record in self.records if record["kind"] == kind]
+        if len(samples) < MIN_SAMPLES:
+            if kind == KIND_MODIFY:
+                # 没有历史时，完整重新生成至少需要与现有代码相当的输出
+                return self._clamp(input_tokens * 1.3 + ROUND_TO, ceiling)
+            return ceiling
+
+        # 按输入大小的对数距离选出最相似的记录
+        size = math.log(input_tokens + 1)
+        samples.sort(key=lambda record: abs(math.log(record["input"] + 1) - size))
+        neighbors = samples[:NEIGHBORS]
+        if kind == KIND_MODIFY:
+            ratios = sorted(record["output"] / max(record["input"], 1) for record in neighbors)
+            needed = percentile(ratios, 0.9) * input_tokens
+        else:
+            needed = percentile(sorted(record["output"] for record in neighbors), 0.9)
+        return self._clamp(needed * MARGIN, ceiling)
+
+    @staticmethod
+    def _clamp(tokens, ceiling):
+        tokens = int(math.ceil(tokens / ROUND_TO) * ROUND_TO)
+        return max(min(tokens, ceiling), min(MIN_TOKENS, ceiling))
@@ -0,0 +1,149 @@
+"""工具的启动器：像 python script.py 一样执行工具脚本，但会使用字节码缓存
+
+直接运行脚本时解释器每次都重新编译，不会读写 __pycache__；通过启动器运行时，
+源文件未变化就直接加载保存工具时预编译的字节码，变化后重新编译并更新缓存。
+示例：
+    python tool_runner.py tools/rename_images.py
+"""
+import os
+import re
+import sys
+import types
+import traceback
+import importlib.util
+import importlib.machinery
+
+# 工具共用的第三方库目录（dependencies.DependencyManager.site_dir），由工具箱通过环境变量传入
+SITE_ENV_VAR = "TOOLBOX_SITE_PACKAGES"
+
+# 使用 SQLite 目录（catalog_db.SqliteCatalog）时的数据库文件，工具分散在各分片目录中，
+# 工具之间互相导入时通过它查找其他工具的文件
+CATALOG_ENV_VAR = "TOOLBOX_CATALOG_DB"
+
+# 批量运行时设置，工具结尾“按任意键退出”之类的阻塞语句直接返回（见 disable_pauses）
+BATCH_ENV_VAR = "TOOLBOX_BATCH"
+
+# os.system 执行的暂停命令：Windows 的 pause 和 shell 的 read
+_PAUSE_COMMAND = re.compile(r"^\s*(pause\b|read(\s|$))", re.IGNORECASE)
+
+
+def disable_pauses():
+    """去掉工具结尾的阻塞语句，使其在没有人操作的批量运行中正常结束
+
+    标准输入读完后第一次调用 input() 返回空字符串（用于“按回车键退出”），之后再读仍抛出 EOFError；
+    os.system("pause") 之类的暂停命令和 msvcrt.getch() 不再等待按键。
+    """
+    import builtins
+
+    original_input = builtins.input
+    reached_eof = []
+
+    def batch_input(prompt=""):
+        try:
+            return original_input(prompt)
+        except EOFError:
+            if reached_eof:
+                raise
+            reached_eof.append(True)
+            print()
+            return ""
+
+    original_system = os.system
+
+    def batch_system(command):
+        if _PAUSE_COMMAND.match(command):
+            return 0
+        return original_system(command)
+
+    builtins.input = batch_input
+    os.system = batch_system
+    try:
+        import msvcrt
+    except ImportError:
+        return
+    msvcrt.getch = lambda: b"\r"
+    msvcrt.getwch = lambda: "\r"
+
+
+class CatalogToolFinder:
+    """按工具名从 SQLite 目录中查找其他工具，使分片存放的工具可以像同一目录下一样互相导入
+
+    放在 sys.meta_path 末尾，只处理其他位置都找不到的顶层模块。
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    def find_spec(self, fullname, path=None, target=None):
+        if path is not None or "." in fullname:
+            return None
+        import sqlite3
+
+        try:
+            conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True)
+            try:
+                row = conn.execute("SELECT file FROM tools WHERE name = ?", (fullname,)).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        tool_path = os.path.join(os.path.dirname(self.db_file), *row[0].split("/"))
+        if not os.path.isfile(tool_path):
+            return None
+        return importlib.util.spec_from_file_location(fullname, tool_path)
+
+
+def run_script(path, args=()):
+    """在当前进程中以 __main__ 身份执行脚本"""
+    path = os.path.abspath(path)
+    loader = importlib.machinery.SourceFileLoader("__main__", path)
+    # 字节码缓存有效时直接加载，否则编译并写回缓存
+    code = loader.get_code("__main__")
+
+    module = types.ModuleType("__main__")
+    module.__file__ = path
+    module.__loader__ = loader
+    sys.modules["__main__"] = module
+    sys.argv = [path] + list(args)
+    # 与 python script.py 一致：脚本所在目录位于模块搜索路径首位
+    sys.path[0] = os.path.dirname(path)
+    # 预先安装好的第三方库紧随其后，工具运行时无需再检查或安装
+    site_dir = os.environ.get(SITE_ENV_VAR)
+    if site_dir and site_dir not in sys.path:
+        sys.path.insert(1, site_dir)
+    catalog_db = os.environ.get(CATALOG_ENV_VAR)
+    if catalog_db:
+        sys.meta_path.append(CatalogToolFinder(catalog_db))
+    if os.environ.get(BATCH_ENV_VAR):
+        disable_pauses()
+    exec(code, module.__dict__)
+
+
+def print_exception(exc, path):
+    """打印工具抛出的异常，省略启动器自身的调用栈"""
+    path = os.path.abspath(path)
+    tb = exc.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename != path:
+        tb = tb.tb_next
+    traceback.print_exception(type(exc), exc, tb)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python tool_runner.py 工具路径 [参数...]", file=sys.stderr)
+        return 2
+    path = sys.argv[1]
+    try:
+        run_script(path, sys.argv[2:])
+    except SystemExit:
+        raise
+    except BaseException as e:
+        print_exception(e, path)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+from catalog import SORT_KEYS
+
+
+class ToolTreeView:
+    """工具列表的增量渲染
+
+    记住已经显示在 Treeview 中的行，刷新时与新的工具记录做差异比较，
+    只插入、删除、更新或移动发生变化的行。工具很多时按页懒加载，
+    滚动到底部时再加载下一页；排序通过移动已有行完成，不重建列表。
+    设置过滤条件（搜索结果）后只显示匹配的工具，默认按相关度排列。
+    """
+
+    PAGE_SIZE = 200
+
+    def __init__(self, tree, page_size=PAGE_SIZE):
+        self.tree = tree
+        self.page_size = page_size
+        self.records = {}
+        self.rows = {}    # 行ID（工具名称）-> 当前显示的值
+        self.order = []   # 当前显示顺序
+        self.sort_column = "name"
+        self.sort_reverse = False
+        self.visible_count = page_size
+        self.matches = None  # 搜索结果（按相关度排序的工具名称），None 表示显示全部
+        self.rank_order = False
+        self.total = 0
+        self._load_more_pending = False
+
+    @staticmethod
+    def _values(tool_name, tool_info):
+        # 确保tool_name是字符串
+        display_name = str(tool_name) if tool_name else "未命名工具"
+        return (display_name, tool_info["description"], tool_info["created"])
+
+    def update(self, records):
+        """用新的工具记录刷新列表"""
+        self.records = records
+        self.render()
+
+    def set_filter(self, tool_names):
+        """只显示指定的工具并按给定顺序排列，None 表示取消过滤；需要调用 render() 或 update() 生效"""
+        self.matches = tool_names
+        self.rank_order = tool_names is not None
+        self.visible_count = self.page_size
+
+    def sort_by(self, column):
+        """按指定列排序，重复点击同一列时切换升序/降序"""
+        if self.rank_order:
+            # 搜索结果原本按相关度排列，第一次点击列标题时改为按该列升序
+            self.rank_order = False
+            self.sort_column = column
+            self.sort_reverse = False
+        elif column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        self.render()
+
+    def load_more(self):
+        """加载下一页"""
+        self._load_more_pending = False
+        if not self.has_more():
+            return
+        self.visible_count += self.page_size
+        self.render()
+
+    def has_more(self):
+        return self.visible_count < self.total
+
+    def on_scroll(self, first, last):
+        """Treeview 的 yscrollcommand，滚动到接近底部时加载下一页"""
+        if float(last) >= 0.95 and self.has_more() and not self._load_more_pending:
+            self._load_more_pending = True
+            self.tree.after_idle(self.load_more)
+
+    def sorted_ids(self):
+        """返回排序后的全部工具名称（有过滤条件时只包括匹配的工具）"""
+        if self.matches is not None:
+            tool_names = [tool_name for tool_name in self.matches if tool_name in self.records]
+            if self.rank_order:
+                return tool_names
+        else:
+            tool_names = self.records
+        # 与 catalog.page() 相同的排序规则，命令行和界面中的顺序一致
+        key = SORT_KEYS[self.sort_column]
+        return sorted(tool_names, key=lambda name: key((name, self.records[name])), reverse=self.sort_reverse)
+
+    def render(self):
+        """把 Treeview 调整为当前页应有的内容"""
+        ordered = self.sorted_ids()
+        self.total = len(ordered)
+        visible = ordered[:self.visible_count]
+        desired = {tool_name: self._values(tool_name, self.records[tool_name]) for tool_name in visible}
+
+        # 删除不再显示的行
+        removed = [iid for iid in self.order if iid not in desired]
+        if removed:
+            self.tree.delete(*removed)
+            for iid in removed:
+                del self.rows[iid]
+        current = [iid for iid in self.order if iid in desired]
+
+        # 按目标顺序逐行比较，只对新增、变化或位置不对的行调用 Tk
+        for index, iid in enumerate(visible):
+            values = desired[iid]
+            if iid not in self.rows:
+                self.tree.insert("", index, iid=iid, text=iid, values=values)
+                current.insert(index, iid)
+                self.rows[iid] = values
+                continue
+            if self.rows[iid] != values:
+                self.tree.item(iid, values=values)
+                self.rows[iid] = values
+            if current[index] != iid:
+                self.tree.move(iid, "", index)
+                current.remove(iid)
+                current.insert(index, iid)
+
+        self.order = current
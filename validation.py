@@ -0,0 +1,113 @@
+import os
+import types
+import py_compile
+import importlib.util
+
+from catalog import HEADER_BYTES, metadata_from_text
+
+# finish_reason 为这些值时说明回复没有正常结束，代码不完整
+TRUNCATED_FINISH_REASONS = {"length"}
+
+# 待校验的文件超过这个数量时才使用多进程
+PARALLEL_THRESHOLD = 16
+
+
+class ToolValidationError(Exception):
+    """重新生成若干次后代码仍未通过校验"""
+
+    def __init__(self, problems, code=None):
+        super().__init__("代码未通过校验: " + "；".join(problems))
+        self.problems = problems
+        self.code = code
+
+
+def validate_tool_code(code, finish_reason=None, filename="<tool>"):
+    """在保存之前校验工具代码，返回发现的问题列表，为空表示通过
+
+    依次检查：回复是否被截断、能否编译、是否定义了 main() 以及文件头部是否有元数据注释。
+    """
+    problems = []
+    if finish_reason in TRUNCATED_FINISH_REASONS:
+        problems.append("输出达到 max_tokens 上限被截断，代码不完整，请精简代码")
+    if not code.strip():
+        problems.append("没有返回任何代码")
+        return problems
+
+    try:
+        # 直接编译为字节码，部分错误（例如函数外的 return）只在这一步才会发现
+        module_code = compile(code, filename, "exec", dont_inherit=True)
+    except SyntaxError as e:
+        problems.append(f"语法错误（第 {e.lineno} 行）: {e.msg}")
+        return problems
+    except ValueError as e:
+        problems.append(f"无法编译: {str(e)}")
+        return problems
+
+    # 模块顶层定义的函数以代码对象的形式保存在常量中
+    if not any(isinstance(const, types.CodeType) and const.co_name == "main" for const in module_code.co_consts) \
+            or "main" not in module_code.co_names:
+        problems.append("缺少 main() 函数")
+
+    # 工具目录只在文件头部查找元数据，写在后面的元数据同样无效
+    header = code.encode("utf-8")[:HEADER_BYTES].decode("utf-8", "ignore")
+    metadata = metadata_from_text(header)
+    if metadata is None or not metadata.name:
+        problems.append('文件开头缺少元数据注释 # metadata = {"name": ..., "description": ..., "created": ...}')
+    return problems
+
+
+def build_fix_messages(messages, code, problems):
+    """在原有对话之后附上未通过校验的代码和问题，请模型返回修正后的完整代码"""
+    feedback = "\n".join(f"- {problem}" for problem in problems)
+    return messages + [
+        {"role": "assistant", "content": f"```python\n{code}\n```"},
+        {"role": "user", "content": f"上面的代码没有通过校验:\n{feedback}\n\n请修正这些问题，仅返回完整的Python代码，不要包含任何解释。"},
+    ]
+
+
+def precompile(tool_path):
+    """把工具编译为字节码缓存（__pycache__），通过 tool_runner 运行时无需再次编译"""
+    try:
+        return py_compile.compile(tool_path, doraise=True)
+    except (py_compile.PyCompileError, OSError) as e:
+        print(f"预编译工具失败: {str(e)}")
+        return None
+
+
+def remove_bytecode(tool_path):
+    """删除工具的字节码缓存"""
+    try:
+        os.remove(importlib.util.cache_from_source(tool_path))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"删除字节码缓存失败: {str(e)}")
+
+
+def _validate_file(tool_path, compile_bytecode):
+    try:
+        with open(tool_path, "r", encoding="utf-8-sig") as f:
+            code = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return [f"读取失败: {str(e)}"]
+    problems = validate_tool_code(code, filename=tool_path)
+    if not problems and compile_bytecode:
+        precompile(tool_path)
+    return problems
+
+
+def validate_files(tool_paths, compile_bytecode=True, max_workers=None):
+    """校验多个工具文件，通过的同时预编译，返回 {路径: 问题列表}
+
+    编译是 CPU 密集的操作，文件较多时分给多个进程并行处理。
+    """
+    tool_paths = list(tool_paths)
+    if len(tool_paths) <= PARALLEL_THRESHOLD:
+        return {tool_path: _validate_file(tool_path, compile_bytecode) for tool_path in tool_paths}
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        chunksize = max(1, len(tool_paths) // ((max_workers or os.cpu_count() or 1) * 4))
+        results = executor.map(_validate_file, tool_paths, [compile_bytecode] * len(tool_paths), chunksize=chunksize)
+        return dict(zip(tool_paths, results))
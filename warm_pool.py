@@ -0,0 +1,391 @@
+import os
+import sys
+import json
+import time
+import atexit
+import select
+import signal
+import socket
+import tempfile
+import threading
+import subprocess
+
+# 服务进程预先导入的模块
+PRELOAD_MODULES = [
+    "argparse", "base64", "collections", "configparser", "csv", "datetime", "decimal",
+    "fnmatch", "functools", "getpass", "glob", "hashlib", "io", "itertools", "json",
+    "logging", "math", "pathlib", "platform", "random", "re", "shutil", "socket",
+    "sqlite3", "statistics", "string", "struct", "subprocess", "tempfile", "textwrap",
+    "threading", "time", "traceback", "urllib.parse", "urllib.request", "uuid", "zipfile",
+]
+
+_MESSAGE_SIZE = 64 * 1024
+
+
+def is_supported():
+    """当前平台是否支持预热池"""
+    return hasattr(os, "fork") and hasattr(socket, "AF_UNIX") and hasattr(socket, "send_fds")
+
+
+# ---- 服务进程 ----
+
+def _preload():
+    import importlib
+
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+def _run_script(request):
+    """在 fork 出的子进程中执行工具脚本，返回退出码"""
+    import io
+    import tool_runner
+
+    sys.stdin = io.TextIOWrapper(io.FileIO(0, "r", closefd=False), encoding="utf-8", errors="replace")
+    sys.stdout = io.TextIOWrapper(io.FileIO(1, "w", closefd=False), encoding="utf-8", errors="replace",
+                                  line_buffering=True)
+    sys.stderr = io.TextIOWrapper(io.FileIO(2, "w", closefd=False), encoding="utf-8", errors="backslashreplace",
+                                  line_buffering=True)
+
+    path = os.path.abspath(request["path"])
+    os.chdir(request.get("cwd") or os.getcwd())
+    os.environ.clear()
+    os.environ.update(request.get("env") or {})
+
+    code = 0
+    try:
+        # 与 python script.py 一致地执行，并使用字节码缓存
+        tool_runner.run_script(path, request.get("args") or [])
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException as e:
+        tool_runner.print_exception(e, path)
+        code = 1
+
+    # 与正常退出的解释器一样，等待非守护线程并执行 atexit 回调
+    for thread in threading.enumerate():
+        if thread is not threading.current_thread() and not thread.daemon:
+            thread.join()
+    atexit._run_exitfuncs()
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+    return code
+
+
+def _fork_child(request, fds, close_fds):
+    """fork 一个子进程执行工具，返回子进程 pid"""
+    pid = os.fork()
+    if pid != 0:
+        return pid
+
+    code = 1
+    try:
+        for fd in close_fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        os.setsid()
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        for fd in fds:
+            if fd > 2:
+                os.close(fd)
+        code = _run_script(request)
+    finally:
+        os._exit(code)
+
+
+def serve(socket_path):
+    """服务进程主循环：单线程事件循环，避免在多线程进程中 fork"""
+    _preload()
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(64)
+
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    children = {}  # pid -> 连接
+    sys.stdout.write("ready\n")
+    sys.stdout.flush()
+
+    try:
+        while True:
+            # 父进程退出时标准输入会关闭，服务随之退出
+            readable, _, _ = select.select([listener, wakeup_r, sys.stdin], [], [])
+            if sys.stdin in readable and not os.read(sys.stdin.fileno(), 1024):
+                break
+
+            if listener in readable:
+                conn, _ = listener.accept()
+                fds = []
+                try:
+                    message, fds, _, _ = socket.recv_fds(conn, _MESSAGE_SIZE, 3)
+                    request = json.loads(message.decode("utf-8"))
+                    close_fds = [listener.fileno(), wakeup_r, wakeup_w, sys.stdin.fileno(), conn.fileno()]
+                    close_fds += [c.fileno() for c in children.values()]
+                    pid = _fork_child(request, fds, close_fds)
+                    conn.sendall(json.dumps({"pid": pid}).encode("utf-8") + b"\n")
+                    children[pid] = conn
+                except Exception as e:
+                    try:
+                        conn.sendall(json.dumps({"error": str(e)}).encode("utf-8") + b"\n")
+                    except OSError:
+                        pass
+                    conn.close()
+                finally:
+                    for fd in fds:
+                        os.close(fd)
+
+            if wakeup_r in readable:
+                try:
+                    while os.read(wakeup_r, 1024):
+                        pass
+                except BlockingIOError:
+                    pass
+            # 回收已经退出的子进程并把退出码发给对应的客户端
+            while children:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if pid == 0:
+                    break
+                conn = children.pop(pid, None)
+                if conn is None:
+                    continue
+                try:
+                    conn.sendall(json.dumps({"exit": os.waitstatus_to_exitcode(status)}).encode("utf-8") + b"\n")
+                except OSError:
+                    pass
+                conn.close()
+    finally:
+        listener.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+
+
+# ---- 客户端 ----
+
+class WarmProcess:
+    """预热池中运行的工具进程，接口与 subprocess.Popen 的常用部分一致
+
+    退出码由服务进程通过连接发回，poll/wait 可以在不同线程中同时调用。
+    """
+
+    def __init__(self, conn, pid, stdin=None, stdout=None, stderr=None, args=None):
+        self._conn = conn
+        self._buffer = b""
+        self.pid = pid
+        self.args = args
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = None
+        self._wait_lock = threading.Lock()
+
+    def _read_status(self, timeout):
+        """等待服务进程发来退出码，超时返回 False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while b"\n" not in self._buffer:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            readable, _, _ = select.select([self._conn], [], [], remaining)
+            if not readable:
+                return False
+            data = self._conn.recv(1024)
+            if not data:
+                # 服务进程意外退出，无法得知真实退出码
+                self.returncode = -1
+                self._conn.close()
+                return True
+            self._buffer += data
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        self.returncode = json.loads(line.decode("utf-8"))["exit"]
+        self._conn.close()
+        return True
+
+    def poll(self):
+        # 其他线程正在 wait 时不再读取连接，直接返回当前状态
+        if self.returncode is None and self._wait_lock.acquire(blocking=False):
+            try:
+                if self.returncode is None:
+                    self._read_status(0)
+            finally:
+                self._wait_lock.release()
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self.returncode is not None:
+            return self.returncode
+        if not self._wait_lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        try:
+            if self.returncode is None and not self._read_status(timeout):
+                raise subprocess.TimeoutExpired(self.args, timeout)
+        finally:
+            self._wait_lock.release()
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.returncode is not None:
+            return
+        try:
+            # 子进程是会话首进程，连同它启动的进程一起发送信号
+            os.killpg(self.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+
+class WarmPool:
+    """预热解释器池（forkserver 方式）
+
+    服务进程启动时预先导入生成的工具常用的标准库模块，之后每次运行工具都由服务进程
+    fork 出一个子进程执行，省去解释器启动和导入的时间。子进程有独立的会话、工作目录、
+    argv、环境变量和标准输入输出（文件描述符通过 Unix 域套接字传递）。
+    仅支持提供 fork 的 POSIX 系统，见 is_supported()。
+    """
+
+    def __init__(self, python=None):
+        self.python = python or sys.executable
+        self.server = None
+        self.socket_path = None
+        self._tmpdir = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        return self.server is not None and self.server.poll() is None
+
+    def start(self, timeout=10):
+        """启动服务进程，等待预导入完成"""
+        with self._lock:
+            if self.is_running:
+                return
+            self._start(timeout)
+
+    def _start(self, timeout):
+        self.close()
+        self._tmpdir = tempfile.mkdtemp(prefix="toolbox-warm-")
+        self.socket_path = os.path.join(self._tmpdir, "pool.sock")
+        self.server = subprocess.Popen(
+            [self.python, os.path.abspath(__file__), "serve", self.socket_path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            close_fds=True
+        )
+        readable, _, _ = select.select([self.server.stdout], [], [], timeout)
+        if not readable or self.server.stdout.readline().strip() != b"ready":
+            self.close()
+            raise RuntimeError("预热池启动失败")
+        atexit.register(self.close)
+
+    def spawn(self, path, args=(), cwd=None, env=None, stdin=None, stdout=None, stderr=None):
+        """运行工具，stdin/stdout/stderr 为文件描述符（默认沿用当前进程的），返回 WarmProcess"""
+        self.start()
+        request = {
+            "path": os.path.abspath(path),
+            "args": list(args),
+            "cwd": os.path.abspath(cwd or os.getcwd()),
+            "env": dict(os.environ if env is None else env),
+        }
+        fds = [
+            0 if stdin is None else stdin,
+            1 if stdout is None else stdout,
+            2 if stderr is None else stderr,
+        ]
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self.socket_path)
+            socket.send_fds(conn, [json.dumps(request).encode("utf-8")], fds)
+            buffer = b""
+            while b"\n" not in buffer:
+                data = conn.recv(1024)
+                if not data:
+                    raise RuntimeError("预热池没有响应")
+                buffer += data
+        except BaseException:
+            conn.close()
+            raise
+        line, rest = buffer.split(b"\n", 1)
+        reply = json.loads(line.decode("utf-8"))
+        if "error" in reply:
+            conn.close()
+            raise RuntimeError(f"预热池运行失败: {reply['error']}")
+        process = WarmProcess(conn, reply["pid"], args=[path] + list(args))
+        process._buffer = rest
+        return process
+
+    def popen(self, path, args=(), cwd=None, env=None):
+        """以管道方式运行工具，返回带 stdin/stdout/stderr 文件对象的 WarmProcess"""
+        stdin_r, stdin_w = os.pipe()
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        try:
+            process = self.spawn(path, args, cwd=cwd, env=env, stdin=stdin_r, stdout=stdout_w, stderr=stderr_w)
+        except BaseException:
+            for fd in (stdin_w, stdout_r, stderr_r):
+                os.close(fd)
+            raise
+        finally:
+            for fd in (stdin_r, stdout_w, stderr_w):
+                os.close(fd)
+        process.stdin = os.fdopen(stdin_w, "wb")
+        process.stdout = os.fdopen(stdout_r, "rb")
+        process.stderr = os.fdopen(stderr_r, "rb")
+        return process
+
+    def close(self):
+        """关闭服务进程"""
+        if self.server is not None:
+            try:
+                self.server.stdin.close()
+                self.server.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.server.kill()
+                self.server.wait()
+            self.server.stdout.close()
+            self.server = None
+        if self._tmpdir is not None:
+            try:
+                if self.socket_path and os.path.exists(self.socket_path):
+                    os.unlink(self.socket_path)
+                os.rmdir(self._tmpdir)
+            except OSError:
+                pass
+            self._tmpdir = None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "serve":
+        serve(sys.argv[2])
+    else:
+        print("用法: python warm_pool.py serve SOCKET_PATH", file=sys.stderr)
+        sys.exit(2)
@@ -0,0 +1,303 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+
+# 文件变化类型
+CREATED = "created"
+MODIFIED = "modified"
+DELETED = "deleted"
+
+# inotify 常量（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """通过 ctypes 调用 libc 的 inotify 接口"""
+
+    MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+    def __init__(self, directory):
+        import ctypes
+        import ctypes.util
+
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.directories = {}  # wd -> 目录
+        try:
+            self.root_wd = self.add_watch(directory)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def add_watch(self, directory):
+        """监视一个目录，返回 wd"""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(self._ctypes.get_errno(), "inotify_add_watch 失败")
+        self.directories[wd] = directory
+        return wd
+
+    def read_events(self):
+        """读取已到达的事件，返回 [(所在目录, 文件名, 变化类型, 是否为目录)]
+
+        队列溢出或工具目录本身被删除、移走时返回 None。
+        """
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if wd == self.root_wd:
+                    # 工具目录本身被删除或移走，需要整体重新扫描
+                    return None
+                # 子目录被删除时其中文件的删除事件已经单独发出
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if not name or directory is None:
+                continue
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                change = CREATED
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                change = DELETED
+            else:
+                change = MODIFIED
+            events.append((directory, name, change, bool(mask & IN_ISDIR)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class ToolsWatcher:
+    """监视工具目录的变化并把事件批量回调给调用方
+
+    Linux 上使用 inotify，其他系统（或 inotify 不可用时）退化为定期比较 stat 快照。
+    短时间内的连续事件会被合并：最后一个事件之后安静 debounce 秒才回调一次，
+    事件持续不断时最多延迟 max_delay 秒；
+    callback(changes) 在后台线程中调用，changes 为 {文件名: 变化类型}；
+    无法确定具体变化时（例如 inotify 队列溢出）changes 为 None，调用方应重新扫描整个目录。
+    shard_dir 为分片目录（例如 SqliteCatalog 的 shards），同时监视它的每个子目录（包括之后新建的）中的文件，
+    这些文件同样只以文件名报告。
+    """
+
+    def __init__(self, directory, callback, debounce=0.3, max_delay=2.0, poll_interval=1.0, suffix=".py",
+                 shard_dir=None):
+        self.directory = directory
+        self.shard_dir = os.path.normpath(shard_dir) if shard_dir else None
+        self.callback = callback
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.suffix = suffix
+        self.backend = None
+        self._pending = {}
+        self._rescan = False
+        self._first_event = None
+        self._last_event = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._wake_r = self._wake_w = None
+
+    def start(self):
+        """启动后台监视线程"""
+        if self._thread is not None:
+            return
+        inotify = None
+        if sys.platform.startswith("linux"):
+            try:
+                inotify = _Inotify(self.directory)
+            except (OSError, AttributeError) as e:
+                print(f"inotify 不可用，改用轮询: {str(e)}")
+        if inotify is not None:
+            self.backend = "inotify"
+            if self.shard_dir is not None and os.path.isdir(self.shard_dir):
+                self._watch_directory(inotify, self.shard_dir, report=False)
+            self._wake_r, self._wake_w = os.pipe()
+            target, args = self._run_inotify, (inotify,)
+        else:
+            self.backend = "polling"
+            target, args = self._run_polling, ()
+        self._thread = threading.Thread(target=target, args=args, name="tools-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止监视"""
+        self._stop.set()
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b"\0")
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _record(self, name, change):
+        """记录一个变化，先删除后创建的文件按修改处理"""
+        if not name.endswith(self.suffix):
+            return
+        previous = self._pending.get(name)
+        if previous == DELETED and change == CREATED:
+            change = MODIFIED
+        elif previous == CREATED and change == MODIFIED:
+            change = CREATED
+        self._pending[name] = change
+
+    def _mark_event(self):
+        now = time.monotonic()
+        if self._first_event is None:
+            self._first_event = now
+        self._last_event = now
+
+    def _flush_deadline(self):
+        """返回下一次合并回调的时间，没有待处理事件时返回 None"""
+        if self._last_event is None:
+            return None
+        return min(self._last_event + self.debounce, self._first_event + self.max_delay)
+
+    def _flush(self):
+        self._first_event = self._last_event = None
+        if not self._pending and not self._rescan:
+            return
+        changes = None if self._rescan else self._pending
+        self._pending = {}
+        self._rescan = False
+        try:
+            self.callback(changes)
+        except Exception as e:
+            print(f"处理工具目录变化失败: {str(e)}")
+
+    def _run_inotify(self, inotify):
+        try:
+            while not self._stop.is_set():
+                deadline = self._flush_deadline()
+                timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                readable, _, _ = select.select([inotify.fd, self._wake_r], [], [], timeout)
+                if self._wake_r in readable:
+                    break
+                if inotify.fd in readable:
+                    events = inotify.read_events()
+                    if events is None:
+                        self._rescan = True
+                    else:
+                        for directory, name, change, is_dir in events:
+                            if not is_dir:
+                                self._record(name, change)
+                            elif change == CREATED and self._is_shard_path(os.path.join(directory, name)):
+                                self._watch_directory(inotify, os.path.join(directory, name), report=True)
+                    self._mark_event()
+                deadline = self._flush_deadline()
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._flush()
+        finally:
+            inotify.close()
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = None
+
+    def _is_shard_path(self, path):
+        """path 是分片目录本身或它的直接子目录"""
+        if self.shard_dir is None:
+            return False
+        path = os.path.normpath(path)
+        return path == self.shard_dir or os.path.dirname(path) == self.shard_dir
+
+    def _watch_directory(self, inotify, directory, report):
+        """监视分片目录或其中的一个分片；report 为 True 时（新建的目录）把添加监视前已经写入的文件报告为新建"""
+        try:
+            inotify.add_watch(directory)
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError as e:
+            print(f"监视目录 {directory} 失败: {str(e)}")
+            return
+        for entry in entries:
+            if entry.is_dir() and os.path.normpath(directory) == self.shard_dir:
+                self._watch_directory(inotify, entry.path, report)
+            elif report and entry.name.endswith(self.suffix):
+                self._record(entry.name, CREATED)
+
+    def _snapshot_directories(self):
+        directories = [self.directory]
+        if self.shard_dir is not None and os.path.isdir(self.shard_dir):
+            try:
+                with os.scandir(self.shard_dir) as it:
+                    directories.extend(entry.path for entry in it if entry.is_dir())
+            except FileNotFoundError:
+                pass
+        return directories
+
+    def _snapshot(self):
+        """返回 {文件路径: (mtime, size)}"""
+        snapshot = {}
+        for directory in self._snapshot_directories():
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.name.endswith(self.suffix):
+                            try:
+                                st = entry.stat()
+                            except FileNotFoundError:
+                                continue
+                            snapshot[entry.path] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                pass
+        return snapshot
+
+    def _run_polling(self):
+        previous = self._snapshot()
+        while not self._stop.is_set():
+            timeout = self.poll_interval if self._last_event is None else min(self.poll_interval, self.debounce)
+            if self._stop.wait(timeout):
+                break
+            current = self._snapshot()
+            changed = False
+            for path, signature in current.items():
+                old = previous.get(path)
+                if old is None:
+                    self._record(os.path.basename(path), CREATED)
+                    changed = True
+                elif old != signature:
+                    self._record(os.path.basename(path), MODIFIED)
+                    changed = True
+            for path in previous.keys() - current.keys():
+                self._record(os.path.basename(path), DELETED)
+                changed = True
+            previous = current
+            if changed:
+                self._mark_event()
+            deadline = self._flush_deadline()
+            if deadline is not None and time.monotonic() >= deadline:
+                self._flush()